@@ -0,0 +1,205 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from logging_config import SAMPLED
+from openai_client import get_client
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд хранить ответы и сколько места они могут занимать
+DEFAULT_TTL = int(os.getenv('AI_CACHE_TTL', 7 * 24 * 60 * 60))
+DEFAULT_MAX_BYTES = int(float(os.getenv('AI_CACHE_MAX_MB', 64)) * 1024 * 1024)
+
+
+def completion_key(payload: Dict) -> str:
+    """
+    Ключ кэша — хэш всего тела запроса: модель, сообщения (промпт с данными товара
+    или base64 подготовленного изображения), max_tokens и temperature
+    """
+    canonical = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class DiskCache:
+    """Кэш ответов в SQLite с TTL и вытеснением давно не использованных записей по размеру"""
+
+    def __init__(self, path: Optional[str] = None, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path or os.getenv('AI_CACHE_DB', os.path.join(os.getcwd(), 'ai_cache.db'))
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM entries WHERE key = ? AND created_at >= ?', (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict):
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO entries (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload.encode('utf-8')), now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        self._conn.execute('DELETE FROM entries WHERE created_at < ?', (now - self.ttl,))
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Удаляем давно не использованные записи, пока не освободим 10% запаса
+        removed = 0
+        for key, size in self._conn.execute('SELECT key, size FROM entries ORDER BY last_access').fetchall():
+            if total <= self.max_bytes * 0.9:
+                break
+            self._conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            total -= size
+            removed += 1
+        logger.info(f"🧹 AI кэш: вытеснено записей {removed}")
+
+    def ping(self):
+        with self._lock:
+            self._conn.execute('SELECT 1 FROM entries LIMIT 1').fetchall()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        return {'backend': 'disk', 'entries': entries, 'bytes': size, 'max_bytes': self.max_bytes}
+
+
+class RedisCache:
+    """
+    Кэш ответов в Redis (общий для нескольких процессов backend).
+    TTL задается при записи; ограничение размера — политикой maxmemory
+    (allkeys-lru) самого Redis.
+    """
+
+    prefix = 'ai-cache:'
+
+    def __init__(self, url: str, ttl: float = DEFAULT_TTL):
+        import redis
+
+        self.ttl = ttl
+        # Короткие таймауты: недоступный Redis не должен задерживать запросы и /health/ready
+        self._client = redis.Redis.from_url(url, socket_connect_timeout=2, socket_timeout=2)
+
+    def get(self, key: str) -> Optional[Dict]:
+        value = self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Dict):
+        self._client.setex(self.prefix + key, int(self.ttl), json.dumps(value, ensure_ascii=False))
+
+    def ping(self):
+        self._client.ping()
+
+    def stats(self) -> Dict:
+        return {'backend': 'redis', 'entries': sum(1 for _ in self._client.scan_iter(self.prefix + '*'))}
+
+
+def create_cache():
+    """Redis, если задан AI_CACHE_REDIS_URL и установлен пакет redis, иначе SQLite на диске"""
+    url = os.getenv('AI_CACHE_REDIS_URL')
+    if url:
+        try:
+            return RedisCache(url)
+        except ImportError:
+            logger.error("❌ Модуль redis не установлен. Установите: pip install redis")
+    return DiskCache()
+
+
+class CompletionCache:
+    """
+    Кэш ответов OpenAI chat completions по хэшу запроса.
+    Повторный запрос с тем же товаром или изображением возвращается из кэша
+    за миллисекунды; в статистике учитываются сэкономленные токены.
+    """
+
+    def __init__(self, backend=None, client=None):
+        self.backend = backend or create_cache()
+        self.client = client or get_client()
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    def chat_completion(self, api_key: str, payload: Dict, timeout: float = 30, refresh: bool = False,
+                        endpoint: str = 'chat', wait: bool = False) -> Tuple[Dict, bool]:
+        """
+        Ответ OpenAI для payload и признак попадания в кэш.
+        refresh=True игнорирует сохраненный ответ и обновляет его.
+        endpoint и wait передаются в OpenAIClient.post (лимиты и метрики по эндпоинтам).
+        Ошибки запроса (requests.exceptions.RequestException, EndpointBusy) пробрасываются, они не кэшируются.
+        """
+        key = completion_key(payload)
+        if not refresh:
+            try:
+                cached = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"⚠️ AI кэш недоступен: {e}")
+                cached = None
+            if cached is not None:
+                tokens = (cached.get('usage') or {}).get('total_tokens', 0)
+                with self._lock:
+                    self.hits += 1
+                    self.tokens_saved += tokens
+                logger.info("💾 AI кэш: %s из кэша, сэкономлено токенов %s", payload.get('model'), tokens,
+                            extra=SAMPLED)
+                return cached, True
+
+        response = self.client.post(endpoint, '/chat/completions', api_key, payload, timeout=timeout, wait=wait)
+        result = response.json()
+
+        with self._lock:
+            self.misses += 1
+        try:
+            self.backend.set(key, result)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить ответ в AI кэш: {e}")
+        return result, False
+
+    def ping(self) -> Dict:
+        """Проверка доступности хранилища кэша для /health/ready"""
+        started = time.perf_counter()
+        try:
+            self.backend.ping()
+        except Exception as e:
+            return {'ok': False, 'backend': type(self.backend).__name__, 'error': str(e)}
+        return {'ok': True, 'backend': type(self.backend).__name__,
+                'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses, 'tokens_saved': self.tokens_saved}
+        try:
+            stats.update(self.backend.stats())
+        except Exception as e:
+            stats['error'] = str(e)
+        return stats
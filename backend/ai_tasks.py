@@ -0,0 +1,151 @@
+import concurrent.futures
+import functools
+import io
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import current_app, jsonify, request, url_for
+
+logger = logging.getLogger(__name__)
+
+# Сколько фоновых потоков выполняют отложенные AI запросы (запросы с Prefer: respond-async)
+DEFAULT_WORKERS = int(os.getenv('AI_TASK_WORKERS', 8))
+
+# Сколько секунд хранить результат задачи и сколько задач держать в памяти
+DEFAULT_TASK_TTL = int(os.getenv('AI_TASK_TTL', 15 * 60))
+MAX_TASKS = int(os.getenv('AI_TASK_MAX', 1000))
+
+# Через сколько секунд клиенту стоит снова спросить о незавершенной задаче
+POLL_INTERVAL = 2
+
+PENDING = 'pending'
+DONE = 'done'
+
+
+def wants_async() -> bool:
+    """Клиент просит не ждать ответа: заголовок Prefer: respond-async (RFC 7240)"""
+    return 'respond-async' in request.headers.get('Prefer', '').lower()
+
+
+class Task:
+    """Отложенный запрос к AI эндпоинту: ждет выполнения или хранит готовый ответ"""
+
+    def __init__(self, endpoint: str):
+        self.id = uuid.uuid4().hex
+        self.endpoint = endpoint
+        self.state = PENDING
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        # Готовый ответ: тело, код и заголовки (Response каждый раз строится заново,
+        # потому что after_request хуки, например сжатие, изменяют его на месте)
+        self.body = b''
+        self.status_code = 200
+        self.headers: Dict[str, str] = {}
+
+
+class TaskStore:
+    """
+    Отложенные AI запросы. Поток обработки HTTP запроса только ставит задачу
+    в очередь и сразу отвечает 202 с адресом задачи; сам запрос к OpenAI
+    выполняет фоновый поток, а клиент опрашивает /api/openai/tasks/<id>.
+    Готовые ответы хранятся ttl секунд, задач в памяти не больше max_tasks.
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, ttl: float = DEFAULT_TASK_TTL,
+                 max_tasks: int = MAX_TASKS):
+        self.ttl = ttl
+        self.max_tasks = max_tasks
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers),
+                                                               thread_name_prefix='ai-task')
+        self._tasks: 'OrderedDict[str, Task]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        for task_id in [task_id for task_id, task in self._tasks.items()
+                        if task.finished_at is not None and task.finished_at < now - self.ttl]:
+            del self._tasks[task_id]
+        # Сверх лимита удаляем самые старые завершенные задачи
+        for task_id in [task_id for task_id, task in self._tasks.items() if task.state == DONE]:
+            if len(self._tasks) < self.max_tasks:
+                break
+            del self._tasks[task_id]
+
+    def submit(self, endpoint: str, run: Callable[[], Tuple[bytes, int, Dict[str, str]]]) -> Optional[Task]:
+        """Ставит задачу в очередь; None, если в памяти уже max_tasks незавершенных задач"""
+        task = Task(endpoint)
+        with self._lock:
+            self._purge(time.time())
+            if len(self._tasks) >= self.max_tasks:
+                return None
+            self._tasks[task.id] = task
+        self._executor.submit(self._run, task, run)
+        return task
+
+    def _run(self, task: Task, run: Callable[[], Tuple[bytes, int, Dict[str, str]]]):
+        try:
+            body, status_code, headers = run()
+        except Exception as e:
+            logger.error(f"❌ AI задача {task.id} ({task.endpoint}) завершилась ошибкой: {e}")
+            body, status_code, headers = b'{"error": "Unexpected error"}\n', 500, {}
+        with self._lock:
+            task.body, task.status_code, task.headers = body, status_code, headers
+            task.finished_at = time.time()
+            task.state = DONE
+
+    def get(self, task_id: str) -> Optional[Task]:
+        with self._lock:
+            self._purge(time.time())
+            return self._tasks.get(task_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = sum(1 for task in self._tasks.values() if task.state == PENDING)
+            return {'pending': pending, 'done': len(self._tasks) - pending, 'max_tasks': self.max_tasks}
+
+
+def deferrable(store: TaskStore, endpoint: str):
+    """
+    Декоратор AI эндпоинта: с заголовком Prefer: respond-async эндпоинт выполняется
+    в фоне (TaskStore), а клиент сразу получает 202 и Location задачи.
+    Без заголовка эндпоинт работает как раньше и отвечает после запроса к OpenAI.
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not wants_async():
+                return view(*args, **kwargs)
+
+            # Тело читается сейчас: после ответа 202 поток запроса закрывается.
+            # Фоновый поток разбирает копию запроса (JSON, форма, файлы) заново
+            app = current_app._get_current_object()
+            body = request.get_data()
+            environ = {key: value for key, value in request.environ.items() if key != 'werkzeug.request'}
+            environ['wsgi.input'] = io.BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+
+            def run():
+                with app.request_context(environ):
+                    response = app.make_response(view(*args, **kwargs))
+                    headers = {name: value for name, value in response.headers.items()
+                               if name not in ('Content-Length', 'Content-Type')}
+                    headers['Content-Type'] = response.content_type
+                    return response.get_data(), response.status_code, headers
+
+            task = store.submit(endpoint, run)
+            if task is None:
+                response = jsonify({'error': 'Too many AI tasks in progress. Please try again shortly.'})
+                response.headers['Retry-After'] = str(POLL_INTERVAL)
+                return response, 503
+
+            location = url_for('openai_task', task_id=task.id)
+            response = jsonify({'task_id': task.id, 'status': PENDING, 'status_url': location})
+            response.headers['Location'] = location
+            response.headers['Retry-After'] = str(POLL_INTERVAL)
+            return response, 202
+        return wrapper
+    return decorator
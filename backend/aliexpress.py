@@ -8,6 +8,13 @@ from typing import List, Dict, Any
 from urllib.parse import quote_plus, urlencode
 from bs4 import BeautifulSoup
 import os
+import time
+
+from circuit_breaker import get_breaker
+from health import track_platform
+from logging_config import SAMPLED
+from metrics import span
+from retry_policy import RetryPolicy, is_retryable_error, is_retryable_status, retry_after_seconds
 
 
 logging.basicConfig(level=logging.INFO)
@@ -20,11 +27,19 @@ USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) " \
              "Chrome/115.0 Safari/537.36"
 HEADERS = {"User-Agent": USER_AGENT}
 
+# Повтор запроса к RapidAPI при 429/5xx и сетевых ошибках (одна повторная попытка)
+RETRY_POLICY = RetryPolicy('aliexpress', max_attempts=2, base_delay=1, max_delay=5,
+                           min_attempt_seconds=3, default_deadline=40)
+
 
+@track_platform('aliexpress')
 def search_aliexpress(query: str, limit: int = 20) -> List[Dict[str, Any]]:
     """
     Поиск товаров на AliExpress с fallback механизмом
     """
+    # Пока API отвечает ошибками, поиск сразу завершается CircuitOpen
+    get_breaker('aliexpress').check()
+
     results = []
     
     try:
@@ -53,6 +68,7 @@ def search_aliexpress_api(query: str, limit: int = 20) -> List[Dict[str, Any]]:
     api_key = "30fbd6eb3cmsh237fee1bd93a580p167775jsne5d2245df248"
     
     logger.info(f"🔑 Используем RapidAPI ключ: {api_key[:10]}...")
+    breaker = get_breaker('aliexpress')
 
     try:
         headers = {
@@ -69,7 +85,33 @@ def search_aliexpress_api(query: str, limit: int = 20) -> List[Dict[str, Any]]:
 
         logger.info(f"🔍 API запрос: {url} с параметрами {params}")
 
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        # Пробный запрос после отключения площадки — без повторов.
+        # Автомат защиты получает один итог на поиск, а не каждую попытку
+        retry = RETRY_POLICY.start(max_attempts=1 if breaker.is_probing else None)
+        while True:
+            request_started = time.perf_counter()
+            try:
+                with span('aliexpress.api_request'):
+                    response = requests.get(url, headers=headers, params=params, timeout=retry.timeout(30))
+            except requests.exceptions.RequestException as e:
+                delay = retry.next_delay(type(e).__name__) \
+                    if is_retryable_error(e) and not breaker.is_open else None
+                if delay is None:
+                    breaker.record_failure(type(e).__name__, time.perf_counter() - request_started)
+                    raise
+                logger.warning(f"🔄 Ошибка сети ({type(e).__name__}), повтор через {delay:.1f} сек...")
+            else:
+                request_time = time.perf_counter() - request_started
+                if response.status_code == 200:
+                    break
+                delay = retry.next_delay(f"HTTP {response.status_code}", retry_after_seconds(response.headers)) \
+                    if is_retryable_status(response.status_code) and not breaker.is_open else None
+                if delay is None:
+                    breaker.record_failure(f"HTTP {response.status_code}", request_time)
+                    break
+                logger.warning(f"🔄 API ответил {response.status_code}, повтор через {delay:.1f} сек...")
+            with span('aliexpress.retry_wait'):
+                time.sleep(delay)
         
         logger.info(f"📡 API ответ: {response.status_code}")
 
@@ -77,7 +119,8 @@ def search_aliexpress_api(query: str, limit: int = 20) -> List[Dict[str, Any]]:
             logger.error(f"❌ API вернул ошибку {response.status_code}: {response.text}")
             return []
 
-        data_json = response.json()
+        with span('aliexpress.decode_json'):
+            data_json = response.json()
         items = []
 
         logger.info(f"📦 Получены данные: {type(data_json)}")
@@ -88,6 +131,8 @@ def search_aliexpress_api(query: str, limit: int = 20) -> List[Dict[str, Any]]:
             # Проверяем статус
             status = result.get('status', {})
             status_code = status.get('code', 200)
+            if status_code == 200 or status_code in [5008, 404, 400]:
+                breaker.record_success(request_time)
             
             if status_code != 200:
                 logger.warning(f"⚠️ API статус: {status_code}, сообщение: {status.get('msg', {})}")
@@ -97,6 +142,7 @@ def search_aliexpress_api(query: str, limit: int = 20) -> List[Dict[str, Any]]:
                     logger.info(f"ℹ️ Товары для запроса '{query}' не найдены на AliExpress")
                     return []
                 else:
+                    breaker.record_failure(f"API status {status_code}", request_time)
                     logger.error(f"❌ Критическая ошибка API: {status_code}")
                     return []
 
@@ -144,10 +190,10 @@ def search_aliexpress_api(query: str, limit: int = 20) -> List[Dict[str, Any]]:
                             'relevance_score': 85,
                             'source': 'AliExpress'
                         })
-                        logger.info(f"✅ API товар: {name[:50]} - ${price}")
+                        logger.info("✅ API товар: %.50s - $%s", name, price, extra=SAMPLED)
 
                 except Exception as e:
-                    logger.error(f"Ошибка обработки товара: {e}")
+                    logger.error("Ошибка обработки товара: %s", e)
                     continue
 
         if items:
@@ -1,7 +1,10 @@
 import asyncio
+import glob
 import logging
 import os
 import random
+import re
+import sys
 import time
 from typing import List, Dict, Any, Optional
 from playwright.async_api import async_playwright, Page, Browser, BrowserContext
@@ -9,6 +12,12 @@ from dotenv import load_dotenv
 import requests
 from urllib.parse import quote_plus
 
+from circuit_breaker import CircuitOpen, get_breaker
+from health import Slots, track_platform
+from logging_config import SAMPLED
+from metrics import record, span, timed
+from retry_policy import RetryPolicy
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -16,6 +25,65 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Шаблоны цены в тексте карточки товара (компилируются один раз)
+PRICE_PATTERNS = [
+    re.compile(r'\d{1,3}(?:[\s\u00a0]\d{3})+(?:,\d{2})?\s*zł'),
+    re.compile(r'\d+[,.]?\d*\s*zł'),
+    re.compile(r'\d+[,\.]\d{2}\s*zł'),
+    re.compile(r'\d+\s*zł'),
+    re.compile(r'\d+[,.]?\d*\s*PLN'),
+]
+
+# Установленный Chrome используется вместо Chromium из Playwright
+CHROME_PATHS = [
+    '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',  # macOS
+    '/usr/bin/google-chrome',  # Linux
+    '/usr/bin/google-chrome-stable',  # Linux
+    'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe',  # Windows
+    'C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe'  # Windows 32-bit
+]
+
+# Повторы поиска (каждая попытка — новый браузер): паузы 5-15 сек,
+# следующая попытка только если до крайнего срока останется хотя бы 20 сек
+RETRY_POLICY = RetryPolicy('allegro', max_attempts=3, base_delay=5, max_delay=15,
+                           min_attempt_seconds=20, default_deadline=180)
+
+# Одновременно открытых браузеров (по одному на поиск); остальные поиски ждут слот
+browser_slots = Slots(int(os.getenv('BROWSER_POOL_SIZE', 3)))
+
+# Проверка установленного браузера кэшируется: /health/ready опрашивается часто
+BROWSER_CHECK_TTL = 60
+_browser_check = (0.0, False)
+
+
+def find_chrome() -> Optional[str]:
+    return next((path for path in CHROME_PATHS if os.path.exists(path)), None)
+
+
+def _playwright_browsers_path() -> str:
+    path = os.getenv('PLAYWRIGHT_BROWSERS_PATH')
+    if path == '0':
+        import playwright
+        return os.path.join(os.path.dirname(playwright.__file__), 'driver', 'package', '.local-browsers')
+    if path:
+        return path
+    if os.name == 'nt':
+        return os.path.join(os.getenv('LOCALAPPDATA', ''), 'ms-playwright')
+    if sys.platform == 'darwin':
+        return os.path.expanduser('~/Library/Caches/ms-playwright')
+    return os.path.expanduser('~/.cache/ms-playwright')
+
+
+def browser_available() -> bool:
+    """Есть ли браузер для поиска: установленный Chrome или Chromium из playwright install"""
+    global _browser_check
+    checked_at, available = _browser_check
+    if time.monotonic() - checked_at < BROWSER_CHECK_TTL:
+        return available
+    available = bool(find_chrome() or glob.glob(os.path.join(_playwright_browsers_path(), 'chromium-*')))
+    _browser_check = (time.monotonic(), available)
+    return available
+
 class AllegroEnhancedScraper:
     """
     Улучшенный скрапер для Allegro.pl с обходом защиты
@@ -36,6 +104,7 @@ class AllegroEnhancedScraper:
         """Возвращает случайный User-Agent"""
         return random.choice(self.user_agents)
     
+    @timed('allegro.human_delay')
     async def _human_like_behavior(self, page: Page):
         """Имитирует человеческое поведение на странице"""
         try:
@@ -47,6 +116,7 @@ class AllegroEnhancedScraper:
         except Exception as e:
             logger.debug(f"Ошибка имитации поведения: {e}")
     
+    @timed('allegro.consent')
     async def _handle_gdpr_consent(self, page: Page) -> bool:
         """Обрабатывает GDPR согласие"""
         try:
@@ -76,6 +146,7 @@ class AllegroEnhancedScraper:
             logger.error(f"Ошибка обработки GDPR: {e}")
             return False
     
+    @timed('allegro.captcha_check')
     async def _detect_captcha(self, page: Page) -> bool:
         """Обнаруживает наличие CAPTCHA на странице"""
         try:
@@ -113,6 +184,7 @@ class AllegroEnhancedScraper:
             logger.error(f"Ошибка обнаружения CAPTCHA: {e}")
             return False
     
+    @timed('allegro.captcha_solve')
     async def _solve_captcha(self, page: Page) -> bool:
         """Решает CAPTCHA используя 2captcha сервис"""
         try:
@@ -302,6 +374,7 @@ class AllegroEnhancedScraper:
         
         return query_lower
     
+    @timed('allegro.launch')
     async def _setup_browser_context(self) -> tuple[Browser, BrowserContext, Page]:
         """Настраивает браузер с обходом детекции ботов"""
         browser_args = [
@@ -335,19 +408,7 @@ class AllegroEnhancedScraper:
         playwright = await async_playwright().start()
 
         # Пытаемся найти Chrome автоматически
-        chrome_paths = [
-            '/Applications/Google Chrome.app/Contents/MacOS/Google Chrome',  # macOS
-            '/usr/bin/google-chrome',  # Linux
-            '/usr/bin/google-chrome-stable',  # Linux
-            'C:\\Program Files\\Google\\Chrome\\Application\\chrome.exe',  # Windows
-            'C:\\Program Files (x86)\\Google\\Chrome\\Application\\chrome.exe'  # Windows 32-bit
-        ]
-
-        chrome_path = None
-        for path in chrome_paths:
-            if os.path.exists(path):
-                chrome_path = path
-                break
+        chrome_path = find_chrome()
 
         if chrome_path:
             logger.info(f"🌐 Найден и используем установленный Chrome: {chrome_path}")
@@ -467,15 +528,8 @@ class AllegroEnhancedScraper:
             if not price:
                 try:
                     all_text = await product_element.text_content()
-                    import re
-                    price_patterns = [
-                        r'\d+[,.]?\d*\s*zł',
-                        r'\d+[,\.]\d{2}\s*zł',
-                        r'\d+\s*zł',
-                        r'\d+[,.]?\d*\s*PLN',
-                    ]
-                    for pattern in price_patterns:
-                        price_match = re.search(pattern, all_text)
+                    for pattern in PRICE_PATTERNS:
+                        price_match = pattern.search(all_text)
                         if price_match:
                             price = price_match.group()
                             break
@@ -559,98 +613,135 @@ class AllegroEnhancedScraper:
             }
 
         except Exception as e:
-            logger.debug(f"Ошибка извлечения данных товара: {e}")
+            logger.debug("Ошибка извлечения данных товара: %s", e)
             return None
 
-    async def search_products(self, query: str, max_pages: int = 1, max_retries: int = 3) -> List[Dict[str, Any]]:
+    async def search_products(self, query: str, max_pages: int = 1,
+                              max_retries: Optional[int] = None) -> List[Dict[str, Any]]:
         """Основной метод поиска товаров на Allegro"""
         products = []
         translated_query = self._translate_query(query)
+        breaker = get_breaker('allegro')
+        # Пробный запрос после блокировки — одна попытка
+        retry = RETRY_POLICY.start(max_attempts=1 if breaker.is_probing else max_retries)
 
         logger.info(f"🔍 Начинаем поиск на Allegro: '{query}' → '{translated_query}'")
 
-        for attempt in range(max_retries):
+        while True:
+            attempt = retry.attempt
             browser = None
             context = None
             page = None
+            # Причина неудачной попытки (None — товары найдены)
+            failure = None
+            # Браузер занимает слот только на время попытки: пауза перед повтором
+            # его не держит. Ожидание слота блокирует поток, но каждый поиск
+            # выполняется в своем event loop (asyncio.run)
+            with browser_slots.acquire():
+                attempt_started = time.perf_counter()
+                # Навигация не дольше, чем осталось до крайнего срока поиска
+                navigation_timeout = retry.timeout(60) * 1000
             
-            try:
-                browser, context, page = await self._setup_browser_context()
-
                 try:
-                    # Переходим на главную страницу
-                    logger.info("🏠 Переходим на главную страницу Allegro...")
-                    await page.goto(self.base_url, timeout=60000)
-                    await page.wait_for_load_state("domcontentloaded", timeout=30000)
+                    browser, context, page = await self._setup_browser_context()
 
-                    await self._human_like_behavior(page)
-                    await self._handle_gdpr_consent(page)
-
-                    # Переходим к поиску
-                    search_url = f"{self.search_url}?string={quote_plus(translated_query)}"
-                    logger.info(f"🔍 Переходим к поиску: {search_url}")
+                    try:
+                        # Переходим на главную страницу
+                        logger.info("🏠 Переходим на главную страницу Allegro...")
+                        with span('allegro.homepage'):
+                            await page.goto(self.base_url, timeout=navigation_timeout)
+                            await page.wait_for_load_state("domcontentloaded", timeout=min(30000, navigation_timeout))
+
+                        await self._human_like_behavior(page)
+                        await self._handle_gdpr_consent(page)
+
+                        # Переходим к поиску
+                        search_url = f"{self.search_url}?string={quote_plus(translated_query)}"
+                        logger.info(f"🔍 Переходим к поиску: {search_url}")
+
+                        with span('allegro.search_page'):
+                            await page.goto(search_url, timeout=retry.timeout(60) * 1000)
+                        with span('allegro.networkidle'):
+                            await page.wait_for_load_state("networkidle", timeout=retry.timeout(30) * 1000)
+                        await self._human_like_behavior(page)
+
+                        # Проверяем на CAPTCHA
+                        if await self._detect_captcha(page):
+                            logger.warning("🤖 Обнаружена CAPTCHA, пытаемся решить...")
+                            if await self._solve_captcha(page):
+                                logger.info("✅ CAPTCHA решена, продолжаем...")
+                                await asyncio.sleep(3)
+                            else:
+                                logger.error("❌ Не удалось решить CAPTCHA")
+                                failure = 'captcha'
 
-                    await page.goto(search_url, timeout=60000)
-                    await page.wait_for_load_state("networkidle", timeout=30000)
-                    await self._human_like_behavior(page)
+                        if failure is None:
+                            # Ищем товары на странице
+                            products_found = await self._parse_products_from_page(page, translated_query, max_pages)
 
-                    # Проверяем на CAPTCHA
-                    if await self._detect_captcha(page):
-                        logger.warning("🤖 Обнаружена CAPTCHA, пытаемся решить...")
-                        if await self._solve_captcha(page):
-                            logger.info("✅ CAPTCHA решена, продолжаем...")
-                            await asyncio.sleep(3)
-                        else:
-                            logger.error("❌ Не удалось решить CAPTCHA")
-                            continue
+                            if products_found:
+                                products.extend(products_found)
+                                logger.info(f"✅ Найдено {len(products_found)} товаров на попытке {attempt}")
+                            else:
+                                logger.warning(f"⚠️ На попытке {attempt} товары не найдены")
+                                failure = 'no products'
 
-                    # Ищем товары на странице
-                    products_found = await self._parse_products_from_page(page, translated_query, max_pages)
-                    
-                    if products_found:
-                        products.extend(products_found)
-                        logger.info(f"✅ Найдено {len(products_found)} товаров на попытке {attempt + 1}")
-                        break
-                    else:
-                        logger.warning(f"⚠️ На попытке {attempt + 1} товары не найдены")
+                    except Exception as e:
+                        logger.error(f"❌ Ошибка на попытке {attempt}: {e}")
+                        failure = type(e).__name__
 
                 except Exception as e:
-                    logger.error(f"❌ Ошибка на попытке {attempt + 1}: {e}")
-                    if attempt < max_retries - 1:
-                        wait_time = random.uniform(5.0, 10.0)
-                        logger.info(f"⏳ Ждем {wait_time:.1f} секунд перед следующей попыткой...")
-                        await asyncio.sleep(wait_time)
-
-            except Exception as e:
-                logger.error(f"❌ Критическая ошибка на попытке {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    wait_time = random.uniform(8.0, 15.0)
-                    logger.info(f"⏳ Ждем {wait_time:.1f} секунд перед следующей попыткой...")
-                    await asyncio.sleep(wait_time)
-
-            finally:
-                if page:
-                    try:
-                        await page.close()
-                    except:
-                        pass
-                if context:
-                    try:
-                        await context.close()
-                    except:
-                        pass
-                if browser:
-                    try:
-                        await browser.close()
-                    except:
-                        pass
+                    logger.error(f"❌ Критическая ошибка на попытке {attempt}: {e}")
+                    failure = type(e).__name__
+
+                finally:
+                    close_started = time.perf_counter()
+                    attempt_time = close_started - attempt_started
+                    if page:
+                        try:
+                            await page.close()
+                        except:
+                            pass
+                    if context:
+                        try:
+                            await context.close()
+                        except:
+                            pass
+                    if browser:
+                        try:
+                            await browser.close()
+                        except:
+                            pass
+                    record('allegro.close', time.perf_counter() - close_started)
+
+            if failure is None:
+                break
+            # CAPTCHA или ошибки разомкнули цепь: оставшиеся попытки не запускаем
+            if breaker.is_open:
+                logger.warning("⛔ Allegro временно отключен, прекращаем попытки")
+                break
+            # Пауза по RETRY_POLICY; повтора нет, если исчерпаны попытки, бюджет или время
+            delay = retry.next_delay(failure)
+            if delay is None:
+                break
+            logger.info(f"⏳ Ждем {delay:.1f} секунд перед следующей попыткой...")
+            with span('allegro.retry_wait'):
+                await asyncio.sleep(delay)
+
+        # Автомат защиты получает один итог на поиск, а не каждую попытку:
+        # страница без товаров — площадка работает, CAPTCHA и ошибки — нет
+        if failure in (None, 'no products'):
+            breaker.record_success(attempt_time)
+        else:
+            breaker.record_failure(failure, attempt_time)
 
         # Если основной поиск не дал результатов, пробуем простой метод
         if not products:
             logger.warning("❌ Не удалось найти товары ни на одной попытке")
             logger.info("🔄 Пробуем простой метод поиска...")
             try:
-                simple_products = await self._try_simple_search(query)
+                # Allegro блокирует запросы: простой запрос тоже не пройдет
+                simple_products = [] if breaker.is_open else await self._try_simple_search(query)
                 if simple_products:
                     products.extend(simple_products)
                     logger.info(f"✅ Простой метод дал {len(simple_products)} результатов")
@@ -676,6 +767,7 @@ class AllegroEnhancedScraper:
         logger.info(f"✅ Allegro поиск завершен: {len(products)} товаров")
         return products
 
+    @timed('allegro.extract')
     async def _parse_products_from_page(self, page: Page, query: str, max_pages: int = 1) -> List[Dict[str, Any]]:
         """Парсит товары со страниц результатов поиска"""
         all_products = []
@@ -733,10 +825,12 @@ class AllegroEnhancedScraper:
 
                                     if product_data:
                                         page_products.append(product_data)
-                                        logger.info(f"📦 {len(page_products)}. {product_data['name'][:50]}... | {product_data['price']} | Score: {product_data['relevance_score']:.1f}")
+                                        logger.info("📦 %d. %.50s... | %s | Score: %.1f", len(page_products),
+                                                    product_data['name'], product_data['price'],
+                                                    product_data['relevance_score'], extra=SAMPLED)
 
                                 except Exception as e:
-                                    logger.debug(f"Ошибка парсинга товара {i}: {e}")
+                                    logger.debug("Ошибка парсинга товара %d: %s", i, e)
                                     continue
 
                             all_products.extend(page_products)
@@ -744,7 +838,7 @@ class AllegroEnhancedScraper:
                             break
 
                     except Exception as e:
-                        logger.debug(f"Селектор {selector} не сработал: {e}")
+                        logger.debug("Селектор %s не сработал: %s", selector, e)
                         continue
 
                 if not products_found:
@@ -756,6 +850,7 @@ class AllegroEnhancedScraper:
 
         return all_products
 
+    @timed('allegro.simple_search')
     async def _try_simple_search(self, query: str) -> List[Dict[str, Any]]:
         """Пробует простой метод поиска через API или базовый парсинг"""
         try:
@@ -847,6 +942,8 @@ class AllegroEnhancedScraper:
 # Основная функция для интеграции с приложением
 async def search_allegro_enhanced(query: str, max_pages: int = 1, debug_mode: bool = False) -> List[Dict[str, Any]]:
     """Главная функция поиска на Allegro с улучшенным обходом защиты"""
+    # Пока Allegro показывает CAPTCHA, поиск сразу завершается CircuitOpen (без запуска браузера)
+    get_breaker('allegro').check()
     try:
         scraper = AllegroEnhancedScraper()
         logger.info(f"🚀 Запускаем улучшенный поиск Allegro: '{query}'")
@@ -866,10 +963,13 @@ async def search_allegro_enhanced(query: str, max_pages: int = 1, debug_mode: bo
 
 
 # Синхронная обертка для совместимости
+@track_platform('allegro')
 def search_allegro_enhanced_sync(query: str, max_pages: int = 1, debug_mode: bool = False) -> List[Dict[str, Any]]:
     """Синхронная версия поиска для совместимости с основным приложением"""
     try:
         return asyncio.run(search_allegro_enhanced(query, max_pages, debug_mode))
+    except CircuitOpen:
+        raise
     except Exception as e:
         logger.error(f"❌ Ошибка синхронного поиска: {e}")
         return []
@@ -7,8 +7,24 @@ import os
 from urllib.parse import urlencode, quote_plus
 from typing import List, Dict, Any
 
+from circuit_breaker import get_breaker
+from health import track_platform
+from logging_config import SAMPLED
+from metrics import record, span
+from retry_policy import RetryPolicy, is_retryable_error, is_retryable_status, retry_after_seconds
+
 logger = logging.getLogger(__name__)
 
+# Ответы, которые означают блокировку или перегрузку Amazon (для автомата защиты)
+BLOCKED_STATUSES = {403, 429, 500, 502, 503, 504}
+
+# Страница проверки на робота (CAPTCHA) приходит с кодом 200
+CAPTCHA_MARKERS = (b'/errors/validateCaptcha', b'api-services-support@amazon.com')
+
+# Повторы запроса страницы поиска: паузы 5-20 сек, не дольше крайнего срока поиска
+RETRY_POLICY = RetryPolicy('amazon', max_attempts=3, base_delay=5, max_delay=20,
+                           min_attempt_seconds=5, default_deadline=60)
+
 def matches_query(product_name, query, min_score=30):
     """
     Улучшенная функция проверки релевантности товара
@@ -29,7 +45,7 @@ def matches_query(product_name, query, min_score=30):
     # СУПЕР БОНУС за точное совпадение всей фразы
     if query_lower in product_lower:
         score += 200  # Максимальный бонус за точное совпадение
-        logger.debug(f"🎯 ТОЧНОЕ СОВПАДЕНИЕ: '{query_lower}' в '{product_lower}'")
+        logger.debug("🎯 ТОЧНОЕ СОВПАДЕНИЕ: '%s' в '%s'", query_lower, product_lower)
 
     # Проверяем каждое слово из запроса
     for word in query_words:
@@ -79,7 +95,7 @@ def matches_query(product_name, query, min_score=30):
         # Если ищем SKIRCO, то любой товар с SKIRCO должен проходить
         if 'skirco' in product_lower or 'skir\'co' in product_lower:
             score += 150  # Большой бонус за SKIRCO
-            logger.debug(f"🎯 SKIRCO товар найден: {product_name}")
+            logger.debug("🎯 SKIRCO товар найден: %s", product_name)
 
     # Строгая проверка: если товар содержит слова аксессуаров, то он НЕ является смартфоном
     accessory_strict_keywords = ['hülle', 'case', 'cover', 'schutz', 'protection', 'folie', 'screen protector', 
@@ -112,6 +128,9 @@ def matches_query(product_name, query, min_score=30):
     # Возвращаем финальный счет для всех остальных случаев
     return float(score)
 
+def is_captcha_page(content: bytes) -> bool:
+    return any(marker in content for marker in CAPTCHA_MARKERS)
+
 def get_current_ip():
     """Получаем текущий IP адрес"""
     try:
@@ -120,15 +139,23 @@ def get_current_ip():
     except:
         return None
 
+@track_platform('amazon')
 def search_amazon(query, limit=50, max_pages=1):
     """
     Поиск товаров на Amazon - автоматически выбирает .de или .com в зависимости от IP
     """
+    # Пока Amazon блокирует запросы, поиск сразу завершается CircuitOpen
+    breaker = get_breaker('amazon')
+    breaker.check()
+    # Пробный запрос после блокировки — без повторов
+    retry = RETRY_POLICY.start(max_attempts=1 if breaker.is_probing else None)
+
     results = []
     
     try:
         # Проверяем текущий IP
-        current_ip = get_current_ip()
+        with span('amazon.ip_lookup'):
+            current_ip = get_current_ip()
         logger.info(f"🌐 Текущий IP: {current_ip}")
         
         # Выбираем домен Amazon в зависимости от IP
@@ -186,35 +213,50 @@ def search_amazon(query, limit=50, max_pages=1):
         logger.info(f"🔍 Amazon URL: {url}")
 
         # Добавляем задержку перед запросом
-        time.sleep(2)
+        with span('amazon.delay'):
+            time.sleep(2)
         
-        # Попытка с retry для ошибки 503
-        max_retries = 3
-        retry_delay = 5
-        
-        for attempt in range(max_retries):
+        # Повторы при 429/5xx и сетевых ошибках по RETRY_POLICY (бюджет повторов, крайний срок)
+        while True:
             try:
-                response = requests.get(url, headers=headers, timeout=20)
+                fetch_started = time.perf_counter()
+                with span('amazon.fetch'):
+                    response = requests.get(url, headers=headers, timeout=retry.timeout(20))
+                fetch_time = time.perf_counter() - fetch_started
                 
-                if response.status_code == 503 and attempt < max_retries - 1:
-                    logger.info(f"🔄 Попытка {attempt + 1}/{max_retries}: Amazon недоступен, ждем {retry_delay} сек...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Увеличиваем задержку с каждой попыткой
-                    continue
-                else:
-                    break  # Выходим из цикла retry
+                # Автомат защиты получает один итог на поиск (после повторов), а не каждую попытку.
+                # Если цепь разомкнулась, оставшиеся повторы не выполняем
+                if not is_retryable_status(response.status_code) or breaker.is_open:
+                    break
+                delay = retry.next_delay(f"HTTP {response.status_code}", retry_after_seconds(response.headers))
+                if delay is None:
+                    break
+                logger.info(f"🔄 Попытка {retry.attempt - 1}/{retry.max_attempts}: Amazon ответил "
+                            f"{response.status_code}, ждем {delay:.1f} сек...")
+                with span('amazon.retry_wait'):
+                    time.sleep(delay)
                     
             except requests.exceptions.RequestException as e:
-                if attempt < max_retries - 1:
-                    logger.warning(f"🔄 Попытка {attempt + 1}/{max_retries}: Ошибка сети, ждем {retry_delay} сек...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
-                else:
+                delay = retry.next_delay(type(e).__name__) \
+                    if is_retryable_error(e) and not breaker.is_open else None
+                if delay is None:
                     logger.error(f"❌ Все попытки исчерпаны: {e}")
+                    breaker.record_failure(type(e).__name__, time.perf_counter() - fetch_started)
                     return results
+                logger.warning(f"🔄 Попытка {retry.attempt - 1}/{retry.max_attempts}: Ошибка сети, ждем {delay:.1f} сек...")
+                with span('amazon.retry_wait'):
+                    time.sleep(delay)
         
-        logger.info(f"📡 Amazon response status: {response.status_code} (попытка {attempt + 1})")
+        logger.info(f"📡 Amazon response status: {response.status_code} (попытка {retry.attempt})")
+        
+        if response.status_code in BLOCKED_STATUSES:
+            breaker.record_failure(f"HTTP {response.status_code}", fetch_time)
+        elif response.status_code == 200 and is_captcha_page(response.content):
+            breaker.record_failure('captcha', fetch_time)
+            logger.warning("🤖 Amazon показал проверку на робота (CAPTCHA)")
+            return results
+        else:
+            breaker.record_success(fetch_time)
         
         if response.status_code != 200:
             if response.status_code == 503:
@@ -231,7 +273,11 @@ def search_amazon(query, limit=50, max_pages=1):
             
             return results
 
-        soup = BeautifulSoup(response.content, 'html.parser')
+        with span('amazon.parse_html'):
+            soup = BeautifulSoup(response.content, 'html.parser')
+
+        # Извлечение карточек товаров из разобранной страницы
+        extract_started = time.perf_counter()
 
         # Ищем товары на странице - используем более широкие селекторы
         products = []
@@ -294,7 +340,7 @@ def search_amazon(query, limit=50, max_pages=1):
                             break
 
                 if not title:
-                    logger.debug(f"❌ Не найдено название для товара {i}")
+                    logger.debug("❌ Не найдено название для товара %d", i)
                     continue
 
                 # УБИРАЕМ ФИЛЬТР РЕЛЕВАНТНОСТИ - ВОЗВРАЩАЕМ ВСЕ ТОВАРЫ
@@ -401,7 +447,7 @@ def search_amazon(query, limit=50, max_pages=1):
                     asin = product.get('data-asin')
                     if asin and len(asin) >= 10:
                         link = f"https://www.amazon.de/dp/{asin}"
-                        logger.debug(f"🔗 Создана ссылка из ASIN: {link}")
+                        logger.debug("🔗 Создана ссылка из ASIN: %s", link)
 
                 # Если ссылка все еще пустая, попробуем найти любую ссылку в товаре
                 if not link:
@@ -426,18 +472,19 @@ def search_amazon(query, limit=50, max_pages=1):
 
                 # Добавляем ВСЕ товары без фильтрации по релевантности
                 results.append(result)
-                logger.info(f"✅ Добавлен товар: {title[:50]}... (score: {relevance_score})")
+                logger.info("✅ Добавлен товар: %.50s... (score: %s)", title, relevance_score, extra=SAMPLED)
 
                 # Логируем информацию о ссылке для отладки
                 if not link or link.strip() == '':
-                    logger.warning(f"⚠️ Товар без ссылки: {title[:50]}...")
+                    logger.warning("⚠️ Товар без ссылки: %.50s...", title)
                 else:
-                    logger.debug(f"🔗 Ссылка найдена: {link[:50]}...")
+                    logger.debug("🔗 Ссылка найдена: %.50s...", link)
 
             except Exception as e:
-                logger.error(f"Error processing product {i}: {e}")
+                logger.error("Error processing product %d: %s", i, e)
                 continue
     
+        record('amazon.extract', time.perf_counter() - extract_started)
         logger.info(f"🎯 Найдено {len(results)} товаров на Amazon (ВСЕ НАЙДЕННЫЕ)")
         return results
 
@@ -1,49 +1,171 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context, url_for
 from flask_cors import CORS
+import base64
 import concurrent.futures
+import itertools
+import logging
+import math
 import os
 import requests
-import base64
-import io
-import json
+import tempfile
 import time
 import threading
 import pandas as pd
-from PIL import Image
 from dotenv import load_dotenv
 
-from allegro_enhanced import search_allegro_enhanced_sync as search_allegro
+from ai_cache import CompletionCache, completion_key
+from ai_tasks import PENDING, POLL_INTERVAL, TaskStore, deferrable
+from allegro_enhanced import browser_available, browser_slots, search_allegro_enhanced_sync as search_allegro
 from amazon import search_amazon
 from aliexpress import search_aliexpress, search_aliexpress_api
+from circuit_breaker import CircuitOpen, get_breaker
+from checkpoint import CheckpointStore, file_digest
+from columnar_export import EXPORT_FORMATS, export_offers
+from dedup import collapse_near_duplicates
+from descriptions import (DEFAULT_CONCURRENCY, MAX_BATCH_SIZE, basic_description, description_payload,
+                          generate_descriptions, job_products)
+from excel_export import export_results
+from file_reader import DEFAULT_CHUNK_SIZE, iter_rows, open_chunks
+from health import init_health, platform_stats, requests_in_flight
+from http_compression import init_compression
+from image_prep import prepare_image
+from image_store import CONTENT_TYPES, IMAGE_NAME_RE, GeneratedImageStore
+from job_store import MAX_PAGE_SIZE, JobBusy, JobStore, PageCache, check_job_id, parse_page
+from logging_config import SAMPLED, setup_logging
+from metrics import bind_context, init_metrics, render_metrics, span
+from openai_client import EndpointBusy, get_client
+from pricing import annotate_prices
+from profiler import DEFAULT_INTERVAL, Profiler, ProfilerBusy, check_token, init_profiler
+from result_writer import dumps, iter_results
+from retry_policy import deadline
+from search_options import PLATFORM_COLUMNS, PLATFORMS, SearchOptions, apply_search_options, narrow_platforms, parse_platforms
 
 
 load_dotenv()
 
+# Queue-backed logging for the whole backend (LOG_FORMAT=json for JSON lines)
+setup_logging()
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
+
+# Completed CSV rows are checkpointed so interrupted jobs can resume
+checkpoints = CheckpointStore()
+
+# Results of CSV jobs: written to disk row by row, kept in memory within a budget
+job_store = JobStore()
+# Serialized result pages keyed by ETag, so polling clients do not rebuild them
+page_cache = PageCache()
+
+# OpenAI calls run on a shared async client with per-endpoint concurrency caps
+openai_client = get_client()
+# OpenAI completions keyed by a hash of the request (disk or Redis)
+ai_cache = CompletionCache(client=openai_client)
+# AI requests sent with 'Prefer: respond-async' run in the background: the request
+# thread answers 202 at once and the client polls /api/openai/tasks/<task_id>
+ai_tasks = TaskStore()
+
+# DALL-E images stored by content hash and served with long-lived cache headers
+image_store = GeneratedImageStore()
+IMAGE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Time budget of one /api/search request: platform retries never run past it
+SEARCH_DEADLINE_SECONDS = float(os.getenv('SEARCH_DEADLINE_SECONDS', 120))
+
+# How many results /api/upload-csv returns inline; the rest are paginated
+UPLOAD_INLINE_RESULTS = min(int(os.getenv('UPLOAD_INLINE_RESULTS', MAX_PAGE_SIZE)), MAX_PAGE_SIZE)
+
 CORS(app, origins=["http://localhost:3000", "http://127.0.0.1:3000", "http://localhost:80", "http://127.0.0.1:80", "http://frontend:80"], supports_credentials=True, allow_headers=["Content-Type", "Authorization", "X-Requested-With"], methods=["GET", "POST", "OPTIONS", "DELETE"], expose_headers=["Content-Disposition"])
 
+# Per-endpoint latency histograms and Server-Timing headers (see /metrics).
+# after_request hooks run in reverse order: registered before compression, metrics
+# see the final response (304, compressed body) and include the compression time
+init_metrics(app)
+# ETag / If-None-Match and gzip/brotli for JSON responses
+init_compression(app)
+# Sampling profiler: on demand and for requests slower than PROFILE_SLOW_MS (see /api/debug/*)
+profiler = Profiler()
+init_profiler(app, profiler)
+# In-flight request counter for /health/ready
+init_health(app)
+STARTED_AT = time.time()
+
+# Not ready while more Allegro searches wait for a browser than this
+READY_MAX_BROWSER_WAITING = int(os.getenv('READY_MAX_BROWSER_WAITING', browser_slots.size))
+
 @app.route('/')
 def index():
     return jsonify({"message": "Welcome to the Product Search API. Use /api/search endpoint to search for products."})
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint для Docker"""
+    """Health check endpoint для Docker (always 200; see /health/ready for routing decisions)"""
+    ready, report = readiness()
+    degraded = not ready or any(breaker['state'] != 'closed' for breaker in report['circuit_breakers'].values())
     return jsonify({
-        'status': 'healthy',
+        'status': 'degraded' if degraded else 'healthy',
         'timestamp': time.time(),
         'version': '1.0.0',
         'services': {
             'flask': 'running',
-            'playwright': 'available'
-        }
+            'playwright': 'available' if report['browser_pool']['installed'] else 'unavailable'
+        },
+        **report
     })
 
+@app.route('/health/live')
+def health_live():
+    """Liveness: the process is up and serving requests. No dependency checks"""
+    return jsonify({'status': 'alive', 'timestamp': time.time(), 'uptime': round(time.time() - STARTED_AT, 1)})
+
+@app.route('/health/ready')
+def health_ready():
+    """Readiness: 503 while the instance should not receive search traffic"""
+    ready, report = readiness()
+    return jsonify({'status': 'ready' if ready else 'not_ready', 'timestamp': time.time(), **report}), \
+        200 if ready else 503
+
+def readiness():
+    """
+    Cheap checks for frequent polling: counters and snapshots kept in memory,
+    a cache ping and a cached browser lookup. Returns (ready, report)
+    """
+    browser = browser_slots.snapshot()
+    browser['installed'] = browser_available()
+    breakers = {platform: get_breaker(platform).snapshot() for platform in PLATFORMS}
+    platforms = platform_stats()
+    cache = ai_cache.ping()
+    checks = {
+        'cache': cache['ok'],
+        'browser_installed': browser['installed'],
+        'browser_pool': browser['waiting'] <= READY_MAX_BROWSER_WAITING,
+        # Ready while at least one platform is not cut off by its circuit breaker
+        'platforms': any(breaker['state'] != 'open' for breaker in breakers.values()),
+    }
+    return all(checks.values()), {
+        'checks': checks,
+        # Not counting the health request itself
+        'requests_in_flight': requests_in_flight() - 1,
+        'searches_in_flight': sum(stats['in_flight'] for stats in platforms.values()),
+        'browser_pool': browser,
+        'cache': cache,
+        'circuit_breakers': breakers,
+        'platforms': platforms,
+    }
+
+def openai_busy_response(error):
+    """503 with Retry-After when an OpenAI endpoint is at its concurrency cap"""
+    logger.warning(f"OpenAI endpoint busy: {error.endpoint}")
+    response = jsonify({'error': 'Too many AI requests in progress. Please try again shortly.'})
+    response.headers['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response, 503
+
 @app.route('/api/generate-product-description', methods=['POST'])
+@deferrable(ai_tasks, 'description')
 def generate_product_description():
 
-    print("=== Product Description Generation Request ===")
+    logger.info("=== Product Description Generation Request ===")
     data = request.get_json()
 
     if not data:
@@ -59,40 +181,19 @@ def generate_product_description():
     if not product_name:
         return jsonify({'error': 'Product name is required'}), 400
 
-    print(f"Generating description for: {product_name[:50]}...")
-    print(f"Source: {source_platform}")
-    print(f"Price: {product_price}")
+    logger.info(f"Generating description for: {product_name[:50]}...")
+    logger.info(f"Source: {source_platform}")
+    logger.info(f"Price: {product_price}")
 
 
     openai_api_key = os.getenv('OPENAI_API_KEY')
     if not openai_api_key:
         # Если API ключ не настроен, возвращаем базовое описание
-        basic_description = f"""
-📱 **{product_name}**
-
-🔹 **Основные характеристики:**
-• Высокое качество и надежность
-• Современные технологии
-• Отличное соотношение цена/качество
-
-🔹 **Преимущества:**
-• Проверенный производитель
-• Гарантия качества
-• Быстрая доставка
-
-🔹 **Применение:**
-Подходит для повседневного использования и профессиональных задач.
-
-💡 **Рекомендация:** Для получения более детального AI-описания настройте OpenAI API ключ в файле .env
-
----
-*Источник: {source_platform}*
-*Цена: {product_price}*
-        """.strip()
+        basic = basic_description(data)
         
         return jsonify({
             'success': True,
-            'description': basic_description,
+            'description': basic,
             'product_info': {
                 'name': product_name,
                 'price': product_price,
@@ -102,65 +203,22 @@ def generate_product_description():
         })
 
     try:
-        # Создаем промпт для генерации описания
-        prompt = f"""
-Создай профессиональное описание товара для интернет-магазина на основе следующей информации:
-
-Название товара: {product_name}
-Цена: {product_price}
-Источник: {source_platform}
-
-Требования к описанию:
-1. Напиши привлекательное и информативное описание на русском языке
-2. Выдели ключевые особенности и преимущества товара
-3. Используй продающий стиль текста
-4. Добавь информацию о качестве и надежности
-5. Упомяни возможные варианты использования
-6. Сделай описание длиной 150-300 слов
-7. Используй эмодзи для привлекательности
-8. Структурируй текст с абзацами
-9. Опиши товар максимально точно, основываясь на его названии
-10. Не добавляй информацию, которой нет в названии товара
-
-ВАЖНО: Описание должно точно соответствовать названию товара. Если в названии указан конкретный товар (например, iPhone 15 Pro Max), то описание должно быть именно об этом товаре, а не о других моделях.
-
-Создай описание, которое поможет покупателю принять решение о покупке.
-"""
-
-        # Отправляем запрос к OpenAI
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {openai_api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'gpt-4o-mini',  # Используем более экономичную модель
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': 'Ты профессиональный копирайтер, специализирующийся на создании продающих описаний товаров для интернет-магазинов. Твоя задача - создавать привлекательные, информативные и убедительные описания, которые точно соответствуют названию товара и помогают покупателям принять решение о покупке.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'max_tokens': 600,
-                'temperature': 0.5
-            },
-            timeout=30
+        # Отправляем запрос к OpenAI (повторный запрос по тому же товару берется из кэша)
+        result, cached = ai_cache.chat_completion(
+            openai_api_key,
+            description_payload(data),
+            timeout=30,
+            refresh=bool(data.get('refresh')),
+            endpoint='description'
         )
 
-        response.raise_for_status()
-        result = response.json()
-
         generated_description = result['choices'][0]['message']['content']
 
-        print("✅ Description generated successfully")
+        logger.info("✅ Description generated successfully" + (" (cached)" if cached else ""))
 
         return jsonify({
             'success': True,
+            'cached': cached,
             'description': generated_description,
             'product_info': {
                 'name': product_name,
@@ -169,8 +227,11 @@ def generate_product_description():
             }
         })
 
+    except EndpointBusy as e:
+        return openai_busy_response(e)
+
     except requests.exceptions.RequestException as e:
-        print(f"OpenAI API error: {e}")
+        logger.error(f"OpenAI API error: {e}")
 
         if hasattr(e, 'response') and e.response is not None:
             try:
@@ -190,16 +251,80 @@ def generate_product_description():
         return jsonify({'error': f'Failed to generate description: {str(e)}'}), 500
 
     except Exception as e:
-        print(f"Error generating description: {e}")
+        logger.error(f"Error generating description: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
 
+@app.route('/api/generate-product-descriptions', methods=['POST'])
+def generate_product_descriptions():
+    """
+    Generate descriptions for many products in one request.
+
+    Body (JSON), either:
+        products: list of {'name', 'price', 'source', ...}
+    or:
+        job_id: CSV job whose results to describe
+        platforms: optional platform subset (default: all)
+        offers: 'top' (first offer of each platform, default) or 'cheapest'
+    Optional:
+        concurrency: parallel OpenAI requests (default DESCRIPTION_CONCURRENCY)
+        refresh: ignore cached descriptions
+
+    Identical products are described once. Results are streamed as NDJSON,
+    one line per product as soon as its description is ready (in completion
+    order, with 'index' pointing into the product list); the last line is
+    {"done": true, "summary": {...}}.
+    """
+    data = request.get_json()
+    if not data or ('products' not in data and 'job_id' not in data):
+        return jsonify({'error': 'Provide products or job_id'}), 400
+
+    try:
+        if 'products' in data:
+            products = data['products']
+            if not isinstance(products, list) or not all(isinstance(product, dict) for product in products):
+                return jsonify({'error': 'products must be a list of objects'}), 400
+        else:
+            platforms = parse_platforms(data.get('platforms'))
+            offers = data.get('offers', 'top')
+            if offers not in ('top', 'cheapest'):
+                return jsonify({'error': "offers must be 'top' or 'cheapest'"}), 400
+            job = job_store.get(data['job_id'])
+            if job is None:
+                return jsonify({'error': 'Job not found'}), 404
+            products = job_products(iter_results(job.path), platforms, offers)
+        concurrency = int(data.get('concurrency') or DEFAULT_CONCURRENCY)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    products = [product for product in products if str(product.get('name') or '').strip()]
+    if not products:
+        return jsonify({'error': 'No products with a name to describe'}), 400
+    if len(products) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Too many products: {len(products)} (max {MAX_BATCH_SIZE})'}), 400
+
+    logger.info(f"Generating descriptions for {len(products)} products, concurrency {concurrency}")
+    records = generate_descriptions(products, os.getenv('OPENAI_API_KEY'), ai_cache,
+                                    concurrency=min(max(concurrency, 1), 16), refresh=bool(data.get('refresh')))
+    return Response(stream_with_context(dumps(record) + b'\n' for record in records),
+                    mimetype='application/x-ndjson')
+
 @app.route('/api/search', methods=['POST'])
 def search():
     """
     Основной endpoint для поиска товаров на всех платформах
-    
+
+    Необязательные параметры (фильтрация выполняется на сервере до сериализации):
+    - platforms: список площадок или строка 'amazon,allegro' — остальные скраперы не запускаются
+    - min_price, max_price, currency: диапазон цены (по умолчанию в BASE_CURRENCY)
+    - min_relevance: минимальный relevance_score
+    - sort: relevance (по умолчанию), price, price_desc
+    - limit: максимум товаров на площадку
+
+    status площадки: success, filtered_out (предложения были, но не прошли фильтры),
+    no_results, unavailable, circuit_open, skipped
+
     Исправления:
     - Добавлен недостающий метод _try_simple_search в AllegroEnhancedScraper
     - Улучшена функция сортировки для обработки None значений
@@ -212,44 +337,48 @@ def search():
 
     query = data['query']
 
-    # Запускаем поиск на всех платформах параллельно
-    with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-        # Включаем Allegro обратно
-        allegro_future = executor.submit(search_allegro, query)
-        amazon_future = executor.submit(search_amazon, query, limit=10)
-        aliexpress_future = executor.submit(search_aliexpress, query, limit=10)
+    try:
+        options = SearchOptions.from_request(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    def timed_search(platform, search_func):
+        with span(f'search.{platform}'), profiler.track_thread():
+            return search_func()
+
+    searches = {
+        'allegro': lambda: timed_search('allegro', lambda: search_allegro(query)),
+        'amazon': lambda: timed_search('amazon', lambda: search_amazon(query, limit=10)),
+        'aliexpress': lambda: timed_search('aliexpress', lambda: search_aliexpress(query, limit=10))
+    }
+    platform_names = {'allegro': 'Allegro', 'amazon': 'Amazon', 'aliexpress': 'AliExpress'}
+
+    # Запускаем поиск только на выбранных платформах параллельно
+    results = {platform: [] for platform in searches}
+    circuit_open = set()
+    with deadline(SEARCH_DEADLINE_SECONDS), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=len(options.platforms)) as executor:
+        # Каждый поиск выполняется в копии контекста запроса: его этапы попадают в Server-Timing,
+        # а крайний срок запроса — в политику повторов площадки
+        futures = {platform: executor.submit(bind_context(searches[platform])) for platform in options.platforms}
 
         # Получаем результаты с обработкой ошибок
-        try:
-            allegro_results = allegro_future.result()
-        except Exception as e:
-            print(f"⚠️ Ошибка Allegro поиска: {e}")
-            allegro_results = []
-            
-        try:
-            amazon_results = amazon_future.result()
-        except Exception as e:
-            print(f"⚠️ Ошибка Amazon поиска: {e}")
-            amazon_results = []
-            
-        # Если Amazon недоступен, добавляем информационное сообщение
-        if not amazon_results:
-            print("ℹ️ Amazon может быть временно недоступен (ошибка 503) или заблокирован")
-            print("💡 Результаты будут показаны только с Allegro и AliExpress")
-            
-        try:
-            aliexpress_results = aliexpress_future.result()
-        except Exception as e:
-            print(f"⚠️ Ошибка AliExpress поиска: {e}")
-            aliexpress_results = []
+        for platform, future in futures.items():
+            try:
+                results[platform] = future.result()
+            except CircuitOpen as e:
+                # Площадка отключена автоматом защиты: запрос не отправлялся
+                logger.info(f"⛔ {platform_names[platform]} пропущен: {e}")
+                circuit_open.add(platform)
+            except Exception as e:
+                logger.warning(f"⚠️ Ошибка {platform_names[platform]} поиска: {e}")
+                results[platform] = []
 
-    # Убеждаемся, что все результаты являются списками
-    if not isinstance(allegro_results, list):
-        allegro_results = []
-    if not isinstance(amazon_results, list):
-        amazon_results = []
-    if not isinstance(aliexpress_results, list):
-        aliexpress_results = []
+    # Если Amazon недоступен, добавляем информационное сообщение
+    amazon_unavailable = 'amazon' in options.platforms and not results['amazon']
+    if amazon_unavailable:
+        logger.info("ℹ️ Amazon может быть временно недоступен (ошибка 503) или заблокирован")
+        logger.info("💡 Результаты будут показаны только с Allegro и AliExpress")
 
     # Дополнительная сортировка результатов по релевантности
     def sort_by_relevance(results):
@@ -268,50 +397,72 @@ def search():
             
             return sorted(results, key=get_score, reverse=True)
         except Exception as e:
-            print(f"⚠️ Ошибка сортировки: {e}")
+            logger.warning(f"⚠️ Ошибка сортировки: {e}")
             return results
 
-    # Сортируем результаты по релевантности
-    allegro_results = sort_by_relevance(allegro_results)
-    amazon_results = sort_by_relevance(amazon_results)
-    aliexpress_results = sort_by_relevance(aliexpress_results)
+    # Сортировка, разбор цен, схлопывание дублей и фильтры запроса
+    with span('search.postprocess'):
+        status = {}
+        for platform in searches:
+            platform_results = results[platform]
+
+            # Убеждаемся, что все результаты являются списками
+            if not isinstance(platform_results, list):
+                platform_results = []
+
+            # Сортируем по релевантности и схлопываем почти одинаковые предложения
+            # (спонсорские + органические, разные продавцы)
+            platform_results = collapse_near_duplicates(annotate_prices(sort_by_relevance(platform_results)))
+
+            # Фильтры и сортировка из запроса
+            results[platform] = apply_search_options(platform_results, options)
+
+            if platform not in options.platforms:
+                status[platform] = 'skipped'
+            elif platform in circuit_open:
+                status[platform] = 'circuit_open'
+            elif results[platform]:
+                status[platform] = 'success'
+            elif platform_results:
+                # Предложения были, но ни одно не прошло фильтры запроса
+                status[platform] = 'filtered_out'
+            else:
+                status[platform] = 'unavailable' if platform == 'amazon' else 'no_results'
 
     # Формируем ответ с информацией о статусе сервисов
     response_data = {
-        'allegro': allegro_results,
-        'amazon': amazon_results,
-        'aliexpress': aliexpress_results,
-        'status': {
-            'allegro': 'success' if allegro_results else 'no_results',
-            'amazon': 'success' if amazon_results else 'unavailable',
-            'aliexpress': 'success' if aliexpress_results else 'no_results'
-        },
-        'message': 'Amazon может быть временно недоступен' if not amazon_results else None
+        'allegro': results['allegro'],
+        'amazon': results['amazon'],
+        'aliexpress': results['aliexpress'],
+        'status': status,
+        'filters': options.to_dict(),
+        'message': 'Amazon может быть временно недоступен' if amazon_unavailable else None
     }
 
-    print(f"Total response: Allegro={len(allegro_results)}, Amazon={len(amazon_results)}, AliExpress={len(aliexpress_results)}")
-    print("✅ Результаты отсортированы по релевантности")
+    logger.info(f"Total response: Allegro={len(results['allegro'])}, Amazon={len(results['amazon'])}, AliExpress={len(results['aliexpress'])}")
+    logger.info(f"✅ Результаты отфильтрованы и отсортированы: {options.sort}")
 
     return jsonify(response_data)
 
 @app.route('/api/generate-image', methods=['POST'])
+@deferrable(ai_tasks, 'image-generation')
 def generate_image():
-    print("=== Image Generation Request Received ===")
+    logger.info("=== Image Generation Request Received ===")
     data = request.get_json()
     if not data or 'description' not in data:
-        print("Error: Missing description parameter")
+        logger.error("Error: Missing description parameter")
         return jsonify({'error': 'Missing description parameter'}), 400
 
     description = data['description']
-    print(f"Description: {description[:50]}..." if len(description) > 50 else f"Description: {description}")
+    logger.info(f"Description: {description[:50]}..." if len(description) > 50 else f"Description: {description}")
 
     # Get OpenAI API key from environment variables
     openai_api_key = os.getenv('OPENAI_API_KEY')
     if not openai_api_key:
-        print("Error: OpenAI API key not configured")
+        logger.error("Error: OpenAI API key not configured")
         return jsonify({'error': 'OpenAI API key not configured'}), 500
 
-    print(f"Using OpenAI API key: {openai_api_key[:10]}...")
+    logger.info(f"Using OpenAI API key: {openai_api_key[:10]}...")
 
     # Создаем специальный промпт для генерации изображения на основе названия товара
     try:
@@ -328,65 +479,71 @@ def generate_image():
         # М
         image_prompt = product_name
 
-        print(f"Generated image prompt: {image_prompt}")
+        logger.info(f"Generated image prompt: {image_prompt}")
 
-        # Call OpenAI API to generate image with DALL-E 3
-        response = requests.post(
-            'https://api.openai.com/v1/images/generations',
-            headers={
-                'Authorization': f'Bearer {openai_api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'dall-e-3',  # Use the latest DALL-E model
-                'prompt': image_prompt,
-                'n': 1,
-                'size': '1024x1024',  # Standard size for DALL-E 3
-                'quality': 'standard',  # Can be 'standard' or 'hd'
-                'response_format': 'url'
-            },
+        generation = {
+            'model': 'dall-e-3',  # Use the latest DALL-E model
+            'prompt': image_prompt,
+            'n': 1,
+            'size': '1024x1024',  # Standard size for DALL-E 3
+            'quality': 'standard'  # Can be 'standard' or 'hd'
+        }
+
+        # Identical prompts are served from the local image store without a new generation
+        prompt_key = completion_key(generation)
+        image_name = None if data.get('refresh') else image_store.lookup(prompt_key)
+        if image_name:
+            logger.info(f"Returning stored image {image_name}")
+            return jsonify({'image_url': url_for('generated_image', name=image_name, _external=True), 'cached': True})
+
+        # Call OpenAI API to generate image with DALL-E 3; the image comes back in the response
+        # body, so it is stored once instead of being fetched again from a temporary URL
+        response = openai_client.post(
+            'image-generation',
+            '/images/generations',
+            openai_api_key,
+            dict(generation, response_format='b64_json'),
             timeout=30  # 30 seconds timeout
         )
 
-        # Check if the request was successful
-        response.raise_for_status()
-
-        # Extract image URL from response
         result = response.json()
-        print(f"OpenAI API response status code: {response.status_code}")
+        logger.info(f"OpenAI API response status code: {response.status_code}")
 
         # Check if the response contains the expected data
-        if 'data' not in result or not result['data'] or 'url' not in result['data'][0]:
-            print(f"Unexpected API response format: {result}")
+        if 'data' not in result or not result['data'] or 'b64_json' not in result['data'][0]:
+            logger.error(f"Unexpected API response format: {str(result)[:500]}")
             return jsonify({'error': 'Unexpected response format from OpenAI API'}), 500
 
-        image_url = result['data'][0]['url']
-        print("Successfully generated image URL")
+        image_name = image_store.put(prompt_key, base64.b64decode(result['data'][0]['b64_json']))
+        logger.info(f"Successfully generated image {image_name}")
 
-        return jsonify({'image_url': image_url})
+        return jsonify({'image_url': url_for('generated_image', name=image_name, _external=True), 'cached': False})
+
+    except EndpointBusy as e:
+        return openai_busy_response(e)
 
     except requests.exceptions.RequestException as e:
-        print(f"OpenAI API error: {e}")
+        logger.error(f"OpenAI API error: {e}")
 
         # Handle different types of request exceptions
         if isinstance(e, requests.exceptions.Timeout):
-            print("Request timed out")
+            logger.error("Request timed out")
             return jsonify({'error': 'The request to OpenAI API timed out. Please try again later.'}), 504
         elif isinstance(e, requests.exceptions.ConnectionError):
-            print("Connection error")
+            logger.error("Connection error")
             return jsonify({'error': 'Could not connect to OpenAI API. Please check your internet connection.'}), 503
         elif hasattr(e, 'response') and e.response is not None:
             status_code = e.response.status_code
-            print(f"API response status code: {status_code}")
+            logger.info(f"API response status code: {status_code}")
 
             try:
                 error_detail = e.response.json()
-                print(f"API response error: {error_detail}")
+                logger.error(f"API response error: {error_detail}")
                 error_message = error_detail.get('error', {}).get('message', 'Unknown API error')
                 error_type = error_detail.get('error', {}).get('type', '')
                 error_code = error_detail.get('error', {}).get('code', '')
 
-                print(f"Error type: {error_type}, Error code: {error_code}")
+                logger.error(f"Error type: {error_type}, Error code: {error_code}")
 
                 # Check for specific error types
                 if 'too large' in error_message.lower() or 'size' in error_message.lower():
@@ -409,10 +566,26 @@ def generate_image():
             return jsonify({'error': f'OpenAI API error: {str(e)}'}), 500
 
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        logger.error(f"Unexpected error: {e}")
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
+@app.route('/api/generated-images/<name>', methods=['GET'])
+def generated_image(name):
+    """
+    Generated images by content hash. A name always maps to the same bytes,
+    so browsers and proxies may cache them for a year without revalidating.
+    """
+    if not IMAGE_NAME_RE.match(name) or not os.path.exists(image_store.path(name)):
+        return jsonify({'error': 'Image not found'}), 404
+    image_store.touch(name)
+    response = send_from_directory(image_store.directory, name, mimetype=CONTENT_TYPES[name.rsplit('.', 1)[1]],
+                                   max_age=IMAGE_MAX_AGE, etag=name.split('.')[0])
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
+
 @app.route('/api/analyze-image', methods=['POST'])
+@deferrable(ai_tasks, 'image-analysis')
 def analyze_image():
     # Check if image file is present in the request
     if 'image' not in request.files:
@@ -437,7 +610,7 @@ def analyze_image():
 
     # Validate the API key format
     if not ((openai_api_key.startswith('sk-') or openai_api_key.startswith('sk-proj-')) and len(openai_api_key) > 20):
-        print(f"Warning: OpenAI API key may not be in the correct format: {openai_api_key[:10]}...")
+        logger.warning(f"Warning: OpenAI API key may not be in the correct format: {openai_api_key[:10]}...")
         # Continue anyway as the format might be valid for certain account types
 
     try:
@@ -448,57 +621,19 @@ def analyze_image():
         if len(image_data) > 10 * 1024 * 1024:
             return jsonify({'error': 'Image is too large. Please upload an image smaller than 10MB.'}), 400
 
-        # Resize the image to reduce its size
+        # Downscaled decode, EXIF orientation and a single JPEG encode; repeated uploads hit the cache
         try:
-            img = Image.open(io.BytesIO(image_data))
-
-            # Resize the image while maintaining aspect ratio
-            max_size = (800, 800)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-
-            # Convert to RGB if the image is in RGBA mode (has transparency)
-            if img.mode == 'RGBA':
-                img = img.convert('RGB')
-
-            # Save the resized image to a bytes buffer
-            buffer = io.BytesIO()
-            img.save(buffer, format="JPEG", quality=85)
-            buffer.seek(0)
-
-            # Encode the resized image as base64
-            base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-            # Check if the base64 encoded image is too large for the API (max ~4MB)
-            if len(base64_image) > 4 * 1024 * 1024:
-                # Try with lower quality
-                buffer = io.BytesIO()
-                img.save(buffer, format="JPEG", quality=50)
-                buffer.seek(0)
-                base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-                # If still too large, resize further
-                if len(base64_image) > 4 * 1024 * 1024:
-                    max_size = (400, 400)
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    buffer = io.BytesIO()
-                    img.save(buffer, format="JPEG", quality=50)
-                    buffer.seek(0)
-                    base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            base64_image = prepare_image(image_data).base64
         except Exception as e:
-            print(f"Error processing image: {e}")
+            logger.error(f"Error processing image: {e}")
             import traceback
             traceback.print_exc()
             return jsonify({'error': f'Error processing image: {str(e)}'}), 500
 
-        # Call OpenAI API to analyze the image
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {openai_api_key}',
-                'Content-Type': 'application/json'
-            },
-            timeout=30,  # Add a timeout to prevent hanging requests
-            json={
+        # Call OpenAI API to analyze the image (the same prepared image is answered from the cache)
+        result, cached = ai_cache.chat_completion(
+            openai_api_key,
+            {
                 'model': 'gpt-4o',
                 'messages': [
                     {
@@ -525,27 +660,29 @@ def analyze_image():
                 ],
                 'max_tokens': 300,
                 'temperature': 0.7
-            }
+            },
+            timeout=30,  # Add a timeout to prevent hanging requests
+            refresh=bool(request.form.get('refresh')),
+            endpoint='image-analysis'
         )
 
-        # Check if the request was successful
-        response.raise_for_status()
-
         # Extract the analysis from the response
-        result = response.json()
         analysis = result['choices'][0]['message']['content']
 
         return jsonify({
             'analysis': analysis,
+            'cached': cached,
             'success': True
         })
 
+    except EndpointBusy as e:
+        return openai_busy_response(e)
     except requests.exceptions.RequestException as e:
-        print(f"OpenAI API error: {e}")
+        logger.error(f"OpenAI API error: {e}")
         if hasattr(e, 'response') and e.response is not None:
             try:
                 error_detail = e.response.json()
-                print(f"API response error: {error_detail}")
+                logger.error(f"API response error: {error_detail}")
                 error_message = error_detail.get('error', {}).get('message', 'Unknown API error')
 
                 # Check for specific error types
@@ -558,12 +695,12 @@ def analyze_image():
                 else:
                     return jsonify({'error': f'OpenAI API error: {error_message}'}), 500
             except Exception as parse_error:
-                print(f"Could not parse error response: {e.response.text}")
-                print(f"Parse error: {parse_error}")
+                logger.error(f"Could not parse error response: {e.response.text}")
+                logger.error(f"Parse error: {parse_error}")
                 return jsonify({'error': 'Could not process the API response. Please try again.'}), 500
         return jsonify({'error': f'Failed to analyze image: {str(e)}'}), 500
     except Exception as e:
-        print(f"Error analyzing image: {e}")
+        logger.error(f"Error analyzing image: {e}")
         import traceback
         traceback.print_exc()
 
@@ -575,105 +712,141 @@ def analyze_image():
         else:
             return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
 
-def process_csv(df):
+def process_csv(chunks, platforms=None, job_id=None, refresh=False):
     """
-    Process a DataFrame containing product characteristics.
-    For each product, search on Amazon, Allegro, and AliExpress using enhanced matching.
-    Returns results directly instead of saving to file.
+    Process product characteristics streamed from an uploaded file.
+    For each product, search on the selected platforms using enhanced matching.
+    Rows are fed to the matcher as they are read, without a temporary file.
 
     Args:
-        df (pandas.DataFrame): DataFrame with product characteristics
+        chunks (Iterable[pandas.DataFrame]): File contents read in chunks (file_reader.open_chunks)
+        platforms: Platforms allowed for the whole job (default: all);
+            a 'platforms' column narrows them per row
+        job_id: Checkpoint key; completed rows of the same job are not searched again.
+            Results are stored in job_store under the same id.
+        refresh: Search every row again instead of taking results from checkpoints
+            or earlier uploads (e.g. to get current prices)
     Returns:
-        List[Dict]: Results of processing
+        Dict: Job summary
     """
+    chunks = iter(chunks)
     try:
         # Пытаемся использовать улучшенный ProductMatcher
         from product_matcher import ProductMatcher
 
-        # Создаем временный файл для обработки
-        temp_file = 'temp_upload.csv'
-        df.to_csv(temp_file, index=False, encoding='utf-8')
-
-        # Используем ProductMatcher для обработки без сохранения в файл
-        matcher = ProductMatcher()
-        results = matcher.process_file_in_memory(temp_file)
-
-        # Удаляем временный файл
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
-
-        print(f"Enhanced processing completed: {len(results)} products processed")
-        return results
-
+        matcher = ProductMatcher(platforms=platforms, checkpoint=checkpoints, job_id=job_id, refresh=refresh)
     except Exception as e:
-        print(f"Error in enhanced processing: {e}")
-        # Fallback to simple processing
-        return process_csv_simple(df)
-
-def process_csv_simple(df):
+        logger.error(f"Error in enhanced processing: {e}")
+        # Fallback to simple processing; no row has been read or written yet
+        results, summary = process_csv_simple(chunks, platforms)
+        job_store.save(job_id, results, summary)
+        return summary
+
+    # Each row goes to the job store as soon as it completes; the matcher keeps nothing.
+    # If streaming fails midway, the rows already written stay in the job (marked
+    # incomplete) and the error propagates: there is no fallback that could overwrite them.
+    with job_store.open_writer(job_id) as writer:
+        matcher.process_chunks(chunks, writer, keep_results=False)
+
+    summary = matcher.get_summary()
+    logger.info(f"Enhanced processing completed: {summary['processed']} products processed, "
+          f"resumed from checkpoints: {summary['resumed_rows']}, "
+          f"reused from previous uploads: {summary['reused_rows']}, "
+          f"skipped platform calls: {summary['skipped_calls_total']}")
+    return summary
+
+def process_csv_simple(chunks, platforms=None):
     """
     Простая обработка CSV файла (fallback)
+    Accepts the file as an iterable of DataFrame chunks.
     Returns results directly instead of saving to file.
     """
     results = []
+    total_rows = 0
+    job_platforms = parse_platforms(platforms)
+    platform_calls = {platform: 0 for platform in PLATFORMS}
+    skipped_calls = {platform: 0 for platform in PLATFORMS}
+
+    chunks = iter(chunks)
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        first_chunk = pd.DataFrame()
+    columns = list(first_chunk.columns)
+
+    def summary():
+        return {
+            'total': total_rows,
+            'processed': len(results),
+            'platforms': list(job_platforms),
+            'platform_calls': platform_calls,
+            'skipped_calls': skipped_calls,
+            'skipped_calls_total': sum(skipped_calls.values())
+        }
 
     # Determine which column to use for product names
     product_column = None
     for col in ['product', 'product_name', 'название', 'name']:
-        if col in df.columns:
+        if col in columns:
             product_column = col
             break
 
     if not product_column:
-        print("Не найдена колонка с названием товара")
-        return results
+        logger.warning("Не найдена колонка с названием товара")
+        return results, summary()
 
-    for index, row in df.iterrows():
+    platform_column = next((col for col in PLATFORM_COLUMNS if col in columns), None)
+
+    searches = [
+        ('amazon', 'Amazon', lambda name: search_amazon(name, max_pages=1), 5),
+        ('allegro', 'Allegro', lambda name: search_allegro(name), 5),
+        ('aliexpress', 'AliExpress', lambda name: search_aliexpress(name, limit=5), None)
+    ]
+
+    for index, row in iter_rows(itertools.chain([first_chunk], chunks)):
+        total_rows += 1
         product_name = row[product_column]
         if pd.isna(product_name) or str(product_name).strip() == '':
             continue
 
         product_result = {"product": str(product_name), "row_index": index + 1}
 
-        try:
-            # Search Amazon
+        row_platforms = job_platforms
+        if platform_column and pd.notna(row[platform_column]) and str(row[platform_column]).strip():
             try:
-                amazon_results = search_amazon(str(product_name), max_pages=1)
-                product_result["amazon"] = amazon_results[:5]  # Limit to 5 results
-                print(f"Amazon: found {len(amazon_results)} products for {product_name}")
-            except Exception as e:
-                product_result["amazon_error"] = str(e)
-                print(f"Error searching Amazon for {product_name}: {e}")
+                row_platforms = narrow_platforms(job_platforms, str(row[platform_column]))
+            except ValueError as e:
+                logger.warning("Row %d: %s, using job platforms", index + 1, e)
+        product_result["platforms"] = list(row_platforms)
 
-            # Search Allegro
-            try:
-                allegro_results = search_allegro(str(product_name))
-                product_result["allegro"] = allegro_results[:5]  # Limit to 5 results
-                print(f"Allegro: found {len(allegro_results)} products for {product_name}")
-            except Exception as e:
-                product_result["allegro_error"] = str(e)
-                print(f"Error searching Allegro for {product_name}: {e}")
+        try:
+            for platform, platform_name, search_platform, limit in searches:
+                # Skip excluded platforms: no browser session or paid API call
+                if platform not in row_platforms:
+                    skipped_calls[platform] += 1
+                    continue
 
-            # Search AliExpress
-            try:
-                aliexpress_results = search_aliexpress(str(product_name), limit=5)
-                product_result["aliexpress"] = aliexpress_results
-                print(f"AliExpress: found {len(aliexpress_results)} products for {product_name}")
-            except Exception as e:
-                product_result["aliexpress_error"] = str(e)
-                print(f"Error searching AliExpress for {product_name}: {e}")
+                platform_calls[platform] += 1
+                try:
+                    platform_results = search_platform(str(product_name))
+                    product_result[platform] = collapse_near_duplicates(annotate_prices(platform_results))[:limit]
+                    logger.info("%s: found %d products for %s", platform_name, len(platform_results), product_name,
+                                extra=SAMPLED)
+                except Exception as e:
+                    product_result[f"{platform}_error"] = str(e)
+                    logger.error("Error searching %s for %s: %s", platform_name, product_name, e)
 
         except Exception as e:
             product_result["error"] = f"Error processing product: {str(e)}"
-            print(f"Error processing product {product_name}: {e}")
+            logger.error("Error processing product %s: %s", product_name, e)
 
         results.append(product_result)
 
         # Sleep to avoid rate limiting
-        time.sleep(1)
+        if row_platforms:
+            time.sleep(1)
 
-    print(f"Simple processing completed: {len(results)} products processed")
-    return results
+    logger.info(f"Simple processing completed: {len(results)} products processed")
+    return results, summary()
 
 @app.route('/api/upload-csv', methods=['POST'])
 def upload_csv():
@@ -687,8 +860,25 @@ def upload_csv():
     - color, цвет (for colors)
     - size, размер (for sizes)
     - keywords, ключевые_слова (for additional keywords)
-
-    Processing is done immediately and results are returned directly.
+    - platforms, платформы (optional per-row platform subset, e.g. "allegro")
+
+    The optional form field 'platforms' limits the whole job to a subset of
+    platforms; excluded platforms are never queried and the saved calls are
+    reported in 'summary'.
+
+    Completed rows are checkpointed under 'job_id' (by default a hash of the
+    file and platforms). If the backend restarts mid-batch, uploading the same
+    file again resumes from the last completed row; fresh rows
+    (CHECKPOINT_MAX_AGE) are not searched again. Rows whose search-relevant
+    columns are unchanged since an earlier upload (REUSE_MAX_AGE) are reused
+    as well, so a re-uploaded catalog only searches new and changed rows.
+    The form field 'refresh' (1/true/yes) searches every row again, e.g. to
+    get current prices; the fresh results replace the stored ones.
+
+    Processing is done immediately. Results are kept in the job store; the
+    response includes the first UPLOAD_INLINE_RESULTS of them and the rest are
+    available from /api/jobs/<job_id>/results. While a job is being processed,
+    another upload with the same job_id is rejected with 409.
 
     Returns:
         JSON response with results or error
@@ -708,16 +898,29 @@ def upload_csv():
     if not any(file.filename.lower().endswith(ext) for ext in allowed_extensions):
         return jsonify({'error': 'File must be CSV (.csv) or Excel (.xlsx, .xls)'}), 400
 
+    # Optional job-wide platform subset (multipart field 'platforms')
     try:
-        # Read the file based on extension
-        if file.filename.lower().endswith('.csv'):
-            df = pd.read_csv(file, encoding='utf-8')
-        else:
-            df = pd.read_excel(file)
+        platforms = parse_platforms(request.form.get('platforms'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Search every row again instead of reusing stored results (current prices)
+    refresh = request.form.get('refresh', '').strip().lower() in ('1', 'true', 'yes')
+
+    # Re-uploading the same file (or passing the same job_id) resumes from checkpoints
+    job_id = request.form.get('job_id') or file_digest(file.stream, ','.join(platforms))
+    try:
+        check_job_id(job_id)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # Stream the file in chunks; only the first chunk is read up front
+        columns, chunks = open_chunks(file.stream, file.filename)
 
         # Check if we have at least one column that could contain product information
         product_columns = ['product', 'product_name', 'название', 'name', 'brand', 'бренд']
-        has_product_info = any(col in df.columns for col in product_columns)
+        has_product_info = any(col in columns for col in product_columns)
 
         if not has_product_info:
             return jsonify({
@@ -725,53 +928,206 @@ def upload_csv():
             }), 400
 
         # Log available columns for debugging
-        print(f"Available columns: {list(df.columns)}")
-        print(f"Processing {len(df)} rows")
+        logger.info(f"Available columns: {columns}")
+        logger.info(f"Processing rows in chunks of {DEFAULT_CHUNK_SIZE}")
 
         # Process the CSV file immediately
-        results = process_csv(df)
+        summary = process_csv(chunks, platforms, job_id, refresh=refresh)
+
+        job = job_store.get(job_id)
+        results = job_store.page(job, 0, UPLOAD_INLINE_RESULTS)
 
         return jsonify({
             'success': True,
-            'message': f'Successfully processed {len(results)} products',
-            'products_count': len(results),
-            'columns': list(df.columns),
-            'results': results
+            'job_id': job_id,
+            'message': f'Successfully processed {job.total} products',
+            'products_count': job.total,
+            'columns': columns,
+            'summary': summary,
+            'results': results,
+            'pagination': job.pagination(0, UPLOAD_INLINE_RESULTS)
         })
 
+    except JobBusy as e:
+        # Another upload with the same job_id is still writing its results
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         return jsonify({'error': f'Error processing CSV file: {str(e)}'}), 500
 
+def filter_result_platforms(result, platforms):
+    """Drop offers of platforms the client did not ask for"""
+    excluded = [platform for platform in PLATFORMS if platform not in platforms]
+    if not excluded:
+        return result
+    return {key: value for key, value in result.items()
+            if key not in excluded and not any(key.startswith(f'{platform}_') for platform in excluded)}
+
+def job_results_response(job_id=None):
+    """
+    Paginated results of a job (the latest one by default).
+
+    Pages are served with an ETag: a client repeating the request with
+    If-None-Match gets 304 until the job changes, and unchanged pages are
+    served from page_cache without reading or serializing the results again.
+    """
+    try:
+        offset, limit = parse_page(request.args)
+        platforms = parse_platforms(request.args.get('platforms'))
+        job = job_store.get(job_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': 'No results available. Please upload a CSV file first.'
+        }), 404
+
+    etag = job.page_etag(offset, limit, *platforms)
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    body = page_cache.get(etag)
+    if body is None:
+        results = [filter_result_platforms(result, platforms) for result in job_store.page(job, offset, limit)]
+        body = dumps({
+            'success': True,
+            'job_id': job.job_id,
+            'complete': job.complete,
+            'results': {
+                'metadata': job.metadata,
+                'results': results,
+                'complete': job.complete
+            },
+            'pagination': dict(job.pagination(offset, limit), platforms=list(platforms))
+        })
+        page_cache.put(etag, body)
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients may keep the page but must revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/api/csv-results', methods=['GET'])
 def get_csv_results():
     """
-    Endpoint to retrieve the results of CSV processing.
+    Endpoint to retrieve the results of the latest CSV job.
+
+    Results are stored row by row while a job runs, so this also returns
+    partial results of a job in progress ('complete': false).
+
+    Query params:
+        offset, limit: page of results (default 0 and RESULTS_PAGE_SIZE)
+        platforms: optional comma-separated platforms to include offers for
 
     Returns:
-        JSON response containing the results from results.json
+        JSON response containing a page of results and pagination info
     """
     try:
-        # Check if results.json exists in current directory
-        results_file = os.path.join(os.getcwd(), 'results.json')
-        if not os.path.exists(results_file):
-            return jsonify({
-                'success': False,
-                'message': 'No results available. Please upload a CSV file first.'
-            }), 404
+        return job_results_response()
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving results: {str(e)}'
+        }), 500
 
-        # Read the results.json file
-        with open(results_file, 'r', encoding='utf-8') as f:
-            results = json.load(f)
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status and metadata of a CSV job"""
+    try:
+        job = job_store.get(job_id)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify(dict(job.info(), success=True))
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def get_job_results(job_id):
+    """
+    Paginated results of a CSV job.
 
+    Query params:
+        offset, limit: page of results (default 0 and RESULTS_PAGE_SIZE)
+        platforms: optional comma-separated platforms to include offers for
+    """
+    try:
+        return job_results_response(job_id)
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'results': results
-        })
+            'success': False,
+            'message': f'Error retrieving results: {str(e)}'
+        }), 500
+
+RESULT_EXPORT_FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+@app.route('/api/csv-results/export', methods=['GET'])
+def export_csv_results():
+    """
+    Download the latest CSV job results in a flat or spreadsheet format.
 
+    Query params:
+        format: 'parquet' (default) or 'arrow' — one row per offer with
+            row_index, platform, name, numeric price, currency, url, relevance;
+            'xlsx' — one row per product with the top offers of each platform
+        job_id: job to export (default: the latest one)
+
+    The export is streamed from the job's results file and rebuilt only when
+    the results have changed since the previous export.
+    """
+    file_format = request.args.get('format', 'parquet').lower()
+    if file_format not in RESULT_EXPORT_FORMATS:
+        return jsonify({'error': f"Unknown format '{file_format}'. Allowed: {', '.join(RESULT_EXPORT_FORMATS)}"}), 400
+
+    try:
+        job = job_store.get(request.args.get('job_id'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if job is None:
+        return jsonify({
+            'success': False,
+            'message': 'No results available. Please upload a CSV file first.'
+        }), 404
+
+    try:
+        extension, mimetype = RESULT_EXPORT_FORMATS[file_format]
+        exports_dir = os.path.join(job_store.directory, 'exports')
+        os.makedirs(exports_dir, exist_ok=True)
+        export_path = os.path.join(exports_dir, job.job_id + extension)
+
+        if not os.path.exists(export_path) or os.path.getmtime(export_path) < os.path.getmtime(job.path):
+            # Write to a unique temporary file so a concurrent download never sees a
+            # half-written export and concurrent exports of the same job never share one
+            fd, temp_path = tempfile.mkstemp(dir=exports_dir, prefix=job.job_id + '.', suffix='.tmp' + extension)
+            os.close(fd)
+            try:
+                if file_format in EXPORT_FORMATS:
+                    export_offers(iter_results(job.path), temp_path, file_format)
+                else:
+                    export_results(iter_results(job.path), temp_path)
+                os.replace(temp_path, export_path)
+            finally:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+
+        from flask import send_file
+        return send_file(export_path, mimetype=mimetype, as_attachment=True,
+                         download_name='results' + extension)
+
+    except RuntimeError as e:
+        # pyarrow is an optional dependency
+        return jsonify({'success': False, 'error': str(e)}), 501
     except Exception as e:
         return jsonify({
             'success': False,
-            'message': f'Error retrieving results: {str(e)}'
+            'error': str(e)
         }), 500
 
 @app.route('/api/files', methods=['GET'])
@@ -856,6 +1212,7 @@ def download_file(filename):
         }), 500
 
 @app.route('/api/generate-image-prompt', methods=['POST'])
+@deferrable(ai_tasks, 'image-prompt')
 def generate_image_prompt():
     data = request.get_json()
     if not data or 'product_name' not in data:
@@ -877,13 +1234,9 @@ def generate_image_prompt():
     )
 
     try:
-        response = requests.post(
-            'https://api.openai.com/v1/chat/completions',
-            headers={
-                'Authorization': f'Bearer {openai_api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
+        result, cached = ai_cache.chat_completion(
+            openai_api_key,
+            {
                 'model': 'gpt-3.5-turbo',
                 'messages': [
                     {'role': 'system', 'content': 'You are a prompt engineer for DALL-E.'},
@@ -892,16 +1245,125 @@ def generate_image_prompt():
                 'max_tokens': 100,
                 'temperature': 0.2
             },
-            timeout=30
+            timeout=30,
+            refresh=bool(data.get('refresh')),
+            endpoint='image-prompt'
         )
-        response.raise_for_status()
-        result = response.json()
         prompt = result['choices'][0]['message']['content'].strip()
-        return jsonify({'prompt': prompt})
+        return jsonify({'prompt': prompt, 'cached': cached})
+    except EndpointBusy as e:
+        return openai_busy_response(e)
     except Exception as e:
-        print(f"Error generating image prompt: {e}")
+        logger.error(f"Error generating image prompt: {e}")
         return jsonify({'error': 'Failed to generate image prompt'}), 500
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage and request latency histograms in the Prometheus text format"""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def profiler_forbidden():
+    """404 when profiling is not configured, 403 for a wrong X-Profiler-Token"""
+    if not os.getenv('PROFILER_TOKEN'):
+        return jsonify({'error': 'Not found'}), 404
+    if not check_token(request.headers.get('X-Profiler-Token')):
+        return jsonify({'error': 'Invalid profiler token'}), 403
+    return None
+
+@app.route('/api/debug/profile', methods=['POST'])
+def debug_profile():
+    """
+    Wall-clock sampling profile of every thread in the process (request threads,
+    search executor, Allegro event loop with the await chain of each task).
+
+    Query parameters:
+        seconds: how long to sample (default 10, max PROFILE_MAX_SECONDS)
+        interval_ms: sampling interval (default PROFILE_INTERVAL_MS)
+
+    Returns collapsed stacks ('frame;frame;frame count' per line) for
+    flamegraph.pl, inferno or speedscope.
+    """
+    forbidden = profiler_forbidden()
+    if forbidden:
+        return forbidden
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', DEFAULT_INTERVAL * 1000)) / 1000
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    if not (math.isfinite(seconds) and math.isfinite(interval)):
+        return jsonify({'error': 'seconds and interval_ms must be finite numbers'}), 400
+    if seconds <= 0 or interval <= 0:
+        return jsonify({'error': 'seconds and interval_ms must be positive'}), 400
+
+    try:
+        profile = profiler.profile(seconds, interval)
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+
+    logger.info(f"Profile collected: {profile.samples} samples in {profile.duration:.1f} s")
+    response = Response(profile.collapsed(), content_type='text/plain; charset=utf-8')
+    response.headers['X-Profile-Samples'] = str(profile.samples)
+    return response
+
+@app.route('/api/debug/slow-profiles', methods=['GET'])
+def debug_slow_profiles():
+    """Recent requests slower than PROFILE_SLOW_MS that have a recorded profile"""
+    forbidden = profiler_forbidden()
+    if forbidden:
+        return forbidden
+    return jsonify({
+        'threshold_ms': profiler.slow_threshold * 1000,
+        'profiles': [profile.info() for profile in reversed(profiler.slow_profiles)]
+    })
+
+@app.route('/api/debug/slow-profiles/<int:profile_id>', methods=['GET'])
+def debug_slow_profile(profile_id):
+    """Collapsed stacks of one slow request (the request thread and its search threads)"""
+    forbidden = profiler_forbidden()
+    if forbidden:
+        return forbidden
+    profile = profiler.get_slow_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(profile.collapsed(), content_type='text/plain; charset=utf-8')
+
+@app.route('/api/ai-cache/stats', methods=['GET'])
+def ai_cache_stats():
+    """Hits, misses and tokens saved by the OpenAI completion cache"""
+    return jsonify(ai_cache.stats())
+
+@app.route('/api/openai/stats', methods=['GET'])
+def openai_stats():
+    """
+    Per-endpoint OpenAI concurrency: queued, in flight, rejected, queue and call time
+    percentiles; 'tasks' counts background requests sent with 'Prefer: respond-async'
+    """
+    return jsonify(dict(openai_client.stats(), tasks=ai_tasks.stats()))
+
+@app.route('/api/openai/tasks/<task_id>', methods=['GET'])
+def openai_task(task_id):
+    """
+    Result of an AI request sent with 'Prefer: respond-async'.
+
+    While the OpenAI call is running: 202 {'status': 'pending'} with Retry-After.
+    Afterwards: the endpoint's own response (status code, body and headers),
+    available for AI_TASK_TTL seconds.
+    """
+    task = ai_tasks.get(task_id)
+    if task is None:
+        return jsonify({'error': 'Task not found'}), 404
+    if task.state == PENDING:
+        response = jsonify({'task_id': task.id, 'status': PENDING})
+        response.headers['Retry-After'] = str(POLL_INTERVAL)
+        return response, 202
+    return Response(task.body, status=task.status_code, headers=task.headers)
+
+@app.route('/api/generated-images/stats', methods=['GET'])
+def generated_image_stats():
+    """Number and total size of stored generated images"""
+    return jsonify(image_store.stats())
+
 if __name__ == '__main__':
     # Определяем режим запуска
     debug_mode = os.getenv('FLASK_ENV') != 'production'
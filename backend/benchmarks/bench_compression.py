@@ -0,0 +1,90 @@
+"""
+Бенчмарк сжатия ответов: байты на проводе для типичных ответов
+/api/search и страницы /api/csv-results без сжатия, с gzip и brotli.
+
+Запуск из каталога backend:
+    python benchmarks/bench_compression.py --rows 100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_compression  # noqa: E402
+
+BRANDS = ['Apple', 'Samsung', 'DeLonghi', 'Sony', 'Xiaomi', 'Philips', 'Bosch']
+ITEMS = ['iPhone 15 Pro 128GB Black Titanium', 'Galaxy S24 Ultra 256GB', 'Magnifica S Automatic Coffee Machine',
+         'WH-1000XM5 Wireless Noise Cancelling Headphones', 'Redmi Note 13 Pro 5G', 'Series 5000 Shaver',
+         'Serie 4 Dishwasher 60cm']
+
+
+def make_product(platform: str, index: int, rank: int) -> dict:
+    rng = random.Random(index * 100 + rank)
+    brand = rng.choice(BRANDS)
+    item = rng.choice(ITEMS)
+    asin = ''.join(rng.choice('ABCDEFGHJKLMNPQRSTUVWXYZ0123456789') for _ in range(10))
+    hosts = {'amazon': 'https://www.amazon.de/dp/', 'aliexpress': 'https://www.aliexpress.com/item/',
+             'allegro': 'https://allegro.pl/oferta/'}
+    return {
+        'name': f'{brand} {item} - {rng.choice(["New", "Sealed", "Official", "2024 model"])} '
+                f'{rng.choice(["with warranty", "free shipping", "EU version", ""])}'.strip(),
+        'price': f'{rng.randint(20, 2000)},{rng.randint(0, 99):02d} {"zł" if platform == "allegro" else "€"}',
+        'price_amount': rng.randint(20, 2000) + rng.random(),
+        'price_currency': 'PLN' if platform == 'allegro' else 'EUR',
+        'url': f'{hosts[platform]}{asin}?ref=sr_1_{rank}&keywords={brand}+{item.replace(" ", "+")}&qid=1700000000',
+        'image': f'https://images.example-cdn.com/images/I/{asin}._AC_SL1500_.jpg',
+        'source': platform.title(),
+        'relevance_score': round(rng.random(), 3),
+        'variants_count': rng.randint(1, 4),
+    }
+
+
+def search_payload(limit: int) -> dict:
+    return {
+        'query': 'apple iphone 15 pro',
+        'allegro': [make_product('allegro', 0, rank) for rank in range(limit)],
+        'amazon': [make_product('amazon', 1, rank) for rank in range(limit)],
+        'aliexpress': [make_product('aliexpress', 2, rank) for rank in range(limit)],
+        'filters': {'platforms': ['allegro', 'amazon', 'aliexpress'], 'sort': 'relevance'},
+    }
+
+
+def results_page(rows: int) -> dict:
+    results = []
+    for index in range(rows):
+        result = {'row_index': index + 1, 'query': f'{BRANDS[index % 7]} {ITEMS[index % 7]}',
+                  'characteristics': {'brand': BRANDS[index % 7].lower()}}
+        for platform in ('amazon', 'aliexpress', 'allegro'):
+            result[platform] = [make_product(platform, index, rank) for rank in range(10)]
+        result['cheapest_offer'] = dict(result['allegro'][0], platform='allegro')
+        results.append(result)
+    return {'success': True, 'results': {'metadata': {}, 'results': results, 'complete': True}}
+
+
+def measure(label: str, payload: dict):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    line = f"{label:<28} raw {len(body) / 1024:9.1f} KiB"
+    for encoding in ('gzip', 'br'):
+        if encoding == 'br' and http_compression.brotli is None:
+            line += '   br: not installed'
+            continue
+        start = time.perf_counter()
+        compressed = http_compression.compress_body(body, encoding)
+        elapsed = (time.perf_counter() - start) * 1000
+        line += (f"   {encoding} {len(compressed) / 1024:8.1f} KiB "
+                 f"({len(body) / len(compressed):4.1f}x, {elapsed:6.1f} ms)")
+    print(line)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100)
+    args = parser.parse_args()
+
+    measure('/api/search (3 x 50)', search_payload(50))
+    measure(f'/api/csv-results ({args.rows} rows)', results_page(args.rows))
+    measure('/api/upload-csv (1000 rows)', results_page(1000))
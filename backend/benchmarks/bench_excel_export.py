@@ -0,0 +1,99 @@
+"""
+Бенчмарк экспорта в Excel: прежний путь (list of dicts → DataFrame → to_excel)
+против потоковой записи openpyxl write-only из файла результатов NDJSON.
+
+Запуск из каталога backend:
+    python benchmarks/bench_excel_export.py --rows 100000
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_export import export_results  # noqa: E402
+from result_writer import iter_results, open_writer  # noqa: E402
+
+
+def make_result(index: int) -> dict:
+    def offers(platform: str, currency: str):
+        return [{
+            'name': f'{platform} product {index} offer {rank}',
+            'price': f'{10 + rank}.99 {currency}',
+            'url': f'https://{platform}.example/item/{index}/{rank}',
+            'relevance_score': 0.9 - rank * 0.1
+        } for rank in range(5)]
+
+    return {
+        'row_index': index + 1,
+        'query': f'Brand Product {index}',
+        'characteristics': {'brand': 'brand', 'color': 'black'},
+        'amazon': offers('amazon', 'EUR'),
+        'aliexpress': offers('aliexpress', 'USD'),
+        'allegro': offers('allegro', 'zł'),
+        'cheapest_offer': {'platform': 'aliexpress', 'name': f'product {index}', 'price_amount': 10.99,
+                           'price_currency': 'USD', 'url': f'https://aliexpress.example/item/{index}/0'}
+    }
+
+
+def legacy_export(results, output_file: str):
+    """Копия прежнего ProductMatcher.export_to_excel (только products[0])"""
+    excel_data = []
+    for result in results:
+        row_data = {
+            'Строка': result.get('row_index', ''),
+            'Запрос': result.get('query', ''),
+            'Характеристики': json.dumps(result.get('characteristics', {}), ensure_ascii=False),
+            'Ошибка': result.get('error', '')
+        }
+        for platform in ['amazon', 'aliexpress', 'allegro']:
+            products = result.get(platform, [])
+            best_product = products[0] if products else {}
+            row_data[f'{platform.title()}_Название'] = best_product.get('name', '')
+            row_data[f'{platform.title()}_Цена'] = best_product.get('price', '')
+            row_data[f'{platform.title()}_URL'] = best_product.get('url', '')
+            row_data[f'{platform.title()}_Релевантность'] = f"{best_product.get('relevance_score', 0):.2f}"
+        excel_data.append(row_data)
+
+    pd.DataFrame(excel_data).to_excel(output_file, index=False, engine='openpyxl')
+
+
+def measure(label: str, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<40} {elapsed:7.2f} s   peak {peak / 2 ** 20:8.1f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--top-n', type=int, default=3)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        results_file = os.path.join(directory, 'results.ndjson')
+        with open_writer(results_file) as writer:
+            for index in range(args.rows):
+                writer.write(make_result(index))
+            writer.close({'complete': True})
+
+        print(f"rows: {args.rows}, top_n: {args.top_n}")
+        # Прежний путь требует всех результатов в памяти, поэтому они загружаются внутри замера
+        measure('legacy (DataFrame, top-1):',
+                lambda: legacy_export(list(iter_results(results_file)), os.path.join(directory, 'legacy.xlsx')))
+        measure(f'streaming (write-only, top-{args.top_n}):',
+                lambda: export_results(iter_results(results_file), os.path.join(directory, 'stream.xlsx'),
+                                       args.top_n))
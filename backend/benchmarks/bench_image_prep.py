@@ -0,0 +1,94 @@
+"""
+Бенчмарк подготовки изображений для /api/analyze-image: прежний путь
+(полное декодирование, thumbnail, до трех кодирований JPEG) против
+image_prep (Image.draft, EXIF, одно кодирование) и повторной загрузки из кэша.
+
+Корпус — каталог с фотографиями (--corpus) или синтетические «снимки
+телефона» 4032x3024 с EXIF-ориентацией.
+
+Запуск из каталога backend:
+    python benchmarks/bench_image_prep.py --count 10
+    python benchmarks/bench_image_prep.py --corpus ~/Pictures/phone
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_prep  # noqa: E402
+
+
+def make_photo(seed: int, size=(4032, 3024)) -> bytes:
+    """Шумное изображение размера снимка телефона с ориентацией EXIF 6 (повернут на 90°)"""
+    noise = Image.effect_noise((size[0] // 4, size[1] // 4), 40 + seed % 20).resize(size)
+    gradient = Image.linear_gradient('L').resize(size)
+    img = Image.merge('RGB', (noise, gradient, noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=92, exif=exif)
+    return buffer.getvalue()
+
+
+def load_corpus(directory: str):
+    photos = []
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(('.jpg', '.jpeg', '.png')):
+            with open(os.path.join(directory, name), 'rb') as f:
+                photos.append(f.read())
+    return photos
+
+
+def legacy_prepare(image_data: bytes) -> str:
+    """Копия прежней подготовки изображения в analyze_image"""
+    img = Image.open(io.BytesIO(image_data))
+    img.thumbnail((800, 800), Image.Resampling.LANCZOS)
+    if img.mode == 'RGBA':
+        img = img.convert('RGB')
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    if len(base64_image) > 4 * 1024 * 1024:
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=50)
+        base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+        if len(base64_image) > 4 * 1024 * 1024:
+            img.thumbnail((400, 400), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=50)
+            base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return base64_image
+
+
+def run(label: str, func, photos):
+    start = time.perf_counter()
+    sizes = [len(func(photo)) for photo in photos]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / len(photos) * 1000:8.1f} ms/image   "
+          f"base64 avg {sum(sizes) / len(sizes) / 1024:7.1f} KiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help='каталог с фотографиями')
+    parser.add_argument('--count', type=int, default=10)
+    args = parser.parse_args()
+
+    photos = load_corpus(args.corpus) if args.corpus else [make_photo(seed) for seed in range(args.count)]
+    print(f"images: {len(photos)}, avg upload {sum(map(len, photos)) / len(photos) / 2 ** 20:.1f} MiB")
+
+    run('legacy (full decode):', legacy_prepare, photos)
+    run('image_prep (draft, 1 pass):', lambda data: image_prep.prepare_image_uncached(data).base64, photos)
+    run('image_prep (cached):', lambda data: image_prep.prepare_image(data).base64, photos)
+    run('image_prep (cached, repeat):', lambda data: image_prep.prepare_image(data).base64, photos)
+
+    # Прежний путь игнорировал EXIF: снимок с ориентацией 6 отправлялся лежащим на боку
+    legacy = Image.open(io.BytesIO(base64.b64decode(legacy_prepare(photos[0]))))
+    prepared = image_prep.prepare_image(photos[0])
+    print(f"orientation: legacy {legacy.size}, image_prep {(prepared.width, prepared.height)}")
@@ -0,0 +1,126 @@
+"""
+Бенчмарк накладных расходов логирования в пакете CSV из 1000 строк:
+прежний режим (f-строки, запись о каждом товаре в обработчик в том же потоке)
+против logging_config (ленивое форматирование, выборка записей о товарах,
+очередь с фоновой записью) в текстовом и JSON формате.
+
+Каждая строка пакета дает те же записи, что ProductMatcher и скраперы:
+обработка строки, поиск на трех площадках, запись о каждом найденном товаре.
+
+Запуск из каталога backend:
+    python benchmarks/bench_logging.py --rows 1000
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_config  # noqa: E402
+from logging_config import SAMPLED  # noqa: E402
+
+ITEMS_PER_PLATFORM = {'amazon': 20, 'allegro': 30, 'aliexpress': 10}
+
+
+def make_rows(count: int):
+    return [(index, f'Apple iPhone 15 Pro {index} 128GB Black Titanium') for index in range(count)]
+
+
+def legacy_batch(rows):
+    """Записи в прежнем виде: f-строки форматируются до проверки уровня и фильтров"""
+    matcher = logging.getLogger('product_matcher')
+    for index, query in rows:
+        matcher.info(f"Обработка строки {index + 1}: '{query}'")
+        for platform, items in ITEMS_PER_PLATFORM.items():
+            scraper = logging.getLogger(platform)
+            matcher.info(f"Поиск на {platform}: {query}")
+            for i in range(items):
+                title = f'{query} - offer {i} with a reasonably long marketplace title'
+                scraper.info(f"✅ Добавлен товар: {title[:50]}... (score: {i * 3.5})")
+                scraper.debug(f"🔗 Ссылка найдена: https://example.com/dp/{i:010d}...")
+            matcher.info(f"{platform}: найдено {items} релевантных товаров")
+        matcher.info(f"Обработано {index + 1} товаров")
+
+
+def structured_batch(rows):
+    """Записи как в коде после logging_config: ленивые шаблоны и SAMPLED для горячих циклов"""
+    matcher = logging.getLogger('product_matcher')
+    for index, query in rows:
+        matcher.info("Обработка строки %d: '%s'", index + 1, query, extra=SAMPLED)
+        for platform, items in ITEMS_PER_PLATFORM.items():
+            scraper = logging.getLogger(platform)
+            matcher.info("Поиск на %s: %s", platform, query, extra=SAMPLED)
+            for i in range(items):
+                title = f'{query} - offer {i} with a reasonably long marketplace title'
+                scraper.info("✅ Добавлен товар: %.50s... (score: %s)", title, i * 3.5, extra=SAMPLED)
+                scraper.debug("🔗 Ссылка найдена: %.50s...", f'https://example.com/dp/{i:010d}')
+            matcher.info("%s: найдено %d релевантных товаров", platform, items, extra=SAMPLED)
+        matcher.info("Обработано %d товаров", index + 1, extra=SAMPLED)
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run_legacy(rows, path: str):
+    reset_root()
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(logging_config.TEXT_FORMAT))
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.INFO)
+
+    start = time.perf_counter()
+    legacy_batch(rows)
+    caller = time.perf_counter() - start
+    handler.flush()
+    return caller, time.perf_counter() - start
+
+
+def run_structured(rows, path: str, log_format: str, sample_every: int):
+    reset_root()
+    logging_config.setup_logging(log_format=log_format, level='INFO', module_levels={},
+                                 sample_every=sample_every, log_file=path)
+    start = time.perf_counter()
+    structured_batch(rows)
+    caller = time.perf_counter() - start
+    logging_config.stop_logging()
+    return caller, time.perf_counter() - start
+
+
+def report(label: str, caller: float, total: float, path: str):
+    with open(path, encoding='utf-8') as f:
+        lines = sum(1 for _ in f)
+    print(f"{label:<34} caller {caller * 1000:8.1f} ms   total {total * 1000:8.1f} ms   "
+          f"{lines:8d} lines   {os.path.getsize(path) / 2 ** 20:7.2f} MiB")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--sample-every', type=int, default=logging_config.DEFAULT_SAMPLE_EVERY)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    items = sum(ITEMS_PER_PLATFORM.values())
+    print(f"rows: {args.rows}, items per row: {items}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'legacy.log')
+        report('legacy (f-strings, inline write):', *run_legacy(rows, path), path)
+
+        path = os.path.join(directory, 'text-all.log')
+        report('queue, text, no sampling:', *run_structured(rows, path, 'text', 1), path)
+
+        path = os.path.join(directory, 'text.log')
+        report(f'queue, text, 1/{args.sample_every} items:', *run_structured(rows, path, 'text', args.sample_every),
+               path)
+
+        path = os.path.join(directory, 'json.log')
+        report(f'queue, json, 1/{args.sample_every} items:', *run_structured(rows, path, 'json', args.sample_every),
+               path)
@@ -0,0 +1,96 @@
+"""
+Бенчмарк построения запросов: df.iterrows() + build_search_query
+против CatalogSchema (векторные операции pandas) на синтетическом каталоге.
+Перед замером проверяется, что оба способа дают одинаковые запросы
+и характеристики (в каталоге есть кириллица, польские буквы и знаки препинания).
+
+Запуск из каталога backend:
+    python benchmarks/bench_query_building.py --rows 100000
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog_schema import CatalogSchema  # noqa: E402
+from product_matcher import ProductMatcher  # noqa: E402
+
+
+def make_catalog(rows: int) -> pd.DataFrame:
+    brands = ['Apple', 'Samsung', 'DeLonghi', 'Sony', 'Łucznik', None]
+    colors = ['Черный!', 'Silver', '', 'Żółty (mat)', 'Blue', None]
+    names = ['Product {}', 'Смартфон №{}', 'Ekspres do kawy {}, 15 bar', 'iPhone {}/Pro']
+    return pd.DataFrame({
+        'product_name': [names[i % len(names)].format(i) for i in range(rows)],
+        'brand': [brands[i % len(brands)] for i in range(rows)],
+        'category': ['Смартфоны' if i % 2 else 'Ноутбуки' for i in range(rows)],
+        'color': [colors[i % len(colors)] for i in range(rows)],
+        'size': [f'{64 * (i % 4 + 1)}GB' if i % 3 else None for i in range(rows)],
+        'keywords': ['телефон мобильный' if i % 2 else 'ноутбук лэптоп' for i in range(rows)],
+        'price': [i * 1.5 for i in range(rows)],
+    })
+
+
+def check_equivalence(df: pd.DataFrame) -> int:
+    """Число строк, где запрос или характеристики отличаются от build_search_query"""
+    matcher = ProductMatcher()
+    schema = CatalogSchema(list(df.columns))
+    queries = schema.build_queries(df)
+    characteristics = schema.build_characteristics(df)
+    mismatches = 0
+    for (index, row), query, row_characteristics in zip(df.iterrows(), queries, characteristics):
+        expected_query = matcher.build_search_query(row)
+        expected_characteristics = matcher.extract_characteristics(row)
+        if query != expected_query or row_characteristics != expected_characteristics:
+            if mismatches < 5:
+                print(f"row {index}: {query!r} != {expected_query!r}")
+            mismatches += 1
+    return mismatches
+
+
+def bench_iterrows(df: pd.DataFrame):
+    matcher = ProductMatcher()
+    start = time.perf_counter()
+    for _, row in df.iterrows():
+        matcher.build_search_query(row)
+        matcher.extract_characteristics(row)
+    return time.perf_counter() - start
+
+
+def bench_schema(df: pd.DataFrame, chunksize: int):
+    start = time.perf_counter()
+    schema = CatalogSchema(list(df.columns))
+    for offset in range(0, len(df), chunksize):
+        chunk = df.iloc[offset:offset + chunksize]
+        schema.build_queries(chunk)
+        schema.build_characteristics(chunk)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--chunksize', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Логи по каждой строке исказили бы замер
+    logging.disable(logging.INFO)
+
+    catalog = make_catalog(args.rows)
+    mismatches = check_equivalence(catalog.head(5000))
+    if mismatches:
+        print(f"vectorized queries differ from build_search_query in {mismatches} rows")
+        sys.exit(1)
+
+    iterrows_time = bench_iterrows(catalog)
+    schema_time = bench_schema(catalog, args.chunksize)
+
+    print(f"rows: {args.rows}, chunksize: {args.chunksize}")
+    print(f"iterrows + build_search_query: {iterrows_time:.2f} s ({args.rows / iterrows_time:,.0f} rows/s)")
+    print(f"CatalogSchema (vectorized):    {schema_time:.2f} s ({args.rows / schema_time:,.0f} rows/s)")
+    print(f"speedup: {iterrows_time / schema_time:.1f}x")
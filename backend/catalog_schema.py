@@ -0,0 +1,133 @@
+import logging
+import re
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from search_options import PLATFORM_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Основные поля для поиска (в порядке приоритета)
+PRIORITY_FIELDS = [
+    'brand', 'бренд', 'марка',
+    'product_name', 'название', 'name', 'product',
+    'model', 'модель',
+    'category', 'категория',
+    'type', 'тип'
+]
+
+# Дополнительные характеристики
+ADDITIONAL_FIELDS = [
+    'color', 'цвет', 'colour',
+    'size', 'размер',
+    'material', 'материал',
+    'keywords', 'ключевые_слова', 'tags'
+]
+
+# Ключевые характеристики для фильтрации результатов
+CHARACTERISTIC_FIELDS = {
+    'brand': ['brand', 'бренд', 'марка'],
+    'color': ['color', 'цвет', 'colour'],
+    'size': ['size', 'размер'],
+    'material': ['material', 'материал'],
+    'category': ['category', 'категория'],
+    'type': ['type', 'тип'],
+    'model': ['model', 'модель']
+}
+
+EMPTY_VALUES = ['nan', 'null', '']
+
+# Максимум частей в поисковом запросе
+MAX_QUERY_PARTS = 5
+
+
+def clean_column(series: pd.Series) -> pd.Series:
+    """Строковые значения колонки без пробелов по краям; пустые значения → NaN"""
+    values = series.astype(object).where(series.notna()).astype(str).str.strip()
+    empty = series.isna() | values.str.lower().isin(EMPTY_VALUES)
+    return values.mask(empty)
+
+
+# Те же шаблоны, что в ProductMatcher.build_search_query. Применяются через Python re:
+# в строковом dtype pandas на Arrow \w совпадает только с ASCII и удалил бы кириллицу и польские буквы
+SPECIAL_CHARS_RE = re.compile(r'[^\w\s\-]')
+SPACES_RE = re.compile(r'\s+')
+
+
+def clean_query(queries: pd.Series) -> pd.Series:
+    """Очищает запросы от лишних символов"""
+    return queries.astype(object).map(lambda query: SPACES_RE.sub(' ', SPECIAL_CHARS_RE.sub(' ', query)).strip())
+
+
+class CatalogSchema:
+    """
+    Соответствие колонок файла ролям (части запроса, характеристики, площадки).
+
+    Определяется один раз на файл, после чего запросы и характеристики
+    строятся для целого чанка векторными операциями pandas.
+    """
+
+    def __init__(self, columns: List[str]):
+        present = set(columns)
+        self.query_columns = [field for field in PRIORITY_FIELDS + ADDITIONAL_FIELDS if field in present]
+        self.characteristic_columns = {
+            key: [field for field in fields if field in present]
+            for key, fields in CHARACTERISTIC_FIELDS.items()
+        }
+        self.characteristic_columns = {key: fields for key, fields in self.characteristic_columns.items() if fields}
+        self.platform_column = next((field for field in PLATFORM_COLUMNS if field in present), None)
+
+        logger.info(f"Схема файла: запрос из {self.query_columns}, "
+                    f"характеристики {list(self.characteristic_columns)}, площадки: {self.platform_column}")
+
+    @property
+    def relevant_columns(self) -> List[str]:
+        """Колонки, от которых зависит результат поиска по строке"""
+        columns = list(self.query_columns)
+        if self.platform_column:
+            columns.append(self.platform_column)
+        return columns
+
+    def build_queries(self, chunk: pd.DataFrame) -> pd.Series:
+        """Поисковые запросы для всех строк чанка"""
+        if not self.query_columns or chunk.empty:
+            return pd.Series('', index=chunk.index, dtype=object)
+
+        parts = pd.DataFrame(
+            {position: clean_column(chunk[column]) for position, column in enumerate(self.query_columns)},
+            index=chunk.index
+        )
+        # Оставляем первые MAX_QUERY_PARTS непустых частей в порядке приоритета колонок
+        parts = parts.where(parts.notna().cumsum(axis=1) <= MAX_QUERY_PARTS)
+
+        # Пропуски склеиваются в лишние пробелы, которые убирает clean_query
+        first, rest = parts[0], [parts[position] for position in parts.columns[1:]]
+        queries = first.str.cat(rest, sep=' ', na_rep='') if rest else first.fillna('')
+        return clean_query(queries)
+
+    def build_characteristics(self, chunk: pd.DataFrame) -> List[Dict]:
+        """Характеристики для всех строк чанка (в нижнем регистре)"""
+        if not self.characteristic_columns:
+            return [{} for _ in range(len(chunk))]
+
+        values = {}
+        for key, fields in self.characteristic_columns.items():
+            # Первое непустое значение среди возможных колонок
+            value = clean_column(chunk[fields[0]])
+            for field in fields[1:]:
+                value = value.where(value.notna(), clean_column(chunk[field]))
+            values[key] = value.str.lower()
+
+        keys = list(values)
+        return [
+            {key: value for key, value in zip(keys, row) if isinstance(value, str)}
+            for row in zip(*(values[key] for key in keys))
+        ]
+
+    def platform_values(self, chunk: pd.DataFrame) -> List[Optional[str]]:
+        """Значения колонки площадок (None, если колонки нет или значение пустое)"""
+        if not self.platform_column:
+            return [None] * len(chunk)
+        cleaned = clean_column(chunk[self.platform_column])
+        return [value if isinstance(value, str) else None for value in cleaned]
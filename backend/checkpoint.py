@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Сколько секунд результат строки считается свежим
+DEFAULT_MAX_AGE = int(os.getenv('CHECKPOINT_MAX_AGE', 24 * 60 * 60))
+
+# Сколько секунд результат строки можно переиспользовать в следующих загрузках каталога
+DEFAULT_REUSE_MAX_AGE = int(os.getenv('REUSE_MAX_AGE', 7 * 24 * 60 * 60))
+
+
+def file_digest(source, extra: str = '', block_size: int = 1 << 20) -> str:
+    """
+    Хэш содержимого файла (путь или файловый объект) для идентификатора задания.
+    Файловый объект читается блоками и перематывается в начало.
+    """
+    digest = hashlib.sha256(extra.encode('utf-8'))
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+    else:
+        position = source.tell()
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+        source.seek(position)
+    return digest.hexdigest()[:32]
+
+
+def row_hash(query: str, characteristics: Dict, platforms) -> str:
+    """
+    Хэш входных данных строки, от которых зависит результат поиска.
+    Запрос и характеристики строятся только из колонок CatalogSchema.relevant_columns,
+    поэтому изменения в остальных колонках не меняют хэш.
+    """
+    payload = json.dumps([query, characteristics, list(platforms)], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def is_complete(result: Dict) -> bool:
+    """Результаты с ошибками не сохраняем, чтобы при повторе строка искалась заново"""
+    return not any(key == 'error' or key.endswith('_error') for key in result)
+
+
+class CheckpointStore:
+    """
+    Локальное хранилище завершенных строк пакетной обработки (SQLite).
+
+    Строки хранятся по ключу (job_id, row_hash): после перезапуска backend
+    задание с тем же job_id продолжает с первой незавершенной строки,
+    а повторная загрузка того же файла берет свежие ответы из хранилища.
+
+    Дополнительно ведется индекс по содержимому строк (row_hash без job_id):
+    при загрузке обновленного каталога заново ищутся только новые
+    и измененные строки, остальные берутся из индекса.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv('CHECKPOINT_DB', os.path.join(os.getcwd(), 'checkpoints.db'))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS rows ('
+            ' job_id TEXT NOT NULL,'
+            ' row_hash TEXT NOT NULL,'
+            ' row_index INTEGER NOT NULL,'
+            ' result TEXT NOT NULL,'
+            ' completed_at REAL NOT NULL,'
+            ' PRIMARY KEY (job_id, row_hash))'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS row_index ('
+            ' row_hash TEXT PRIMARY KEY,'
+            ' result TEXT NOT NULL,'
+            ' completed_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, job_id: str, key: str, max_age: Optional[float] = DEFAULT_MAX_AGE) -> Optional[Dict]:
+        """Сохраненный результат строки, если он не старше max_age секунд"""
+        min_time = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result FROM rows WHERE job_id = ? AND row_hash = ? AND completed_at >= ?',
+                (job_id, key, min_time)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def lookup(self, key: str, max_age: Optional[float] = DEFAULT_REUSE_MAX_AGE) -> Optional[Dict]:
+        """Результат строки с тем же содержимым из любого прошлого задания"""
+        min_time = time.time() - max_age if max_age is not None else 0
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT result FROM row_index WHERE row_hash = ? AND completed_at >= ?',
+                (key, min_time)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, job_id: Optional[str], key: str, row_index: int, result: Dict):
+        """
+        Сохраняет результат строки сразу после ее обработки:
+        в контрольные точки задания (если есть job_id) и в индекс строк
+        """
+        payload = json.dumps(result, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            if job_id is not None:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO rows (job_id, row_hash, row_index, result, completed_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (job_id, key, row_index, payload, now)
+                )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO row_index (row_hash, result, completed_at) VALUES (?, ?, ?)',
+                (key, payload, now)
+            )
+            self._conn.commit()
+
+    def completed_rows(self, job_id: str) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM rows WHERE job_id = ?', (job_id,)).fetchone()[0]
+
+    def purge(self, max_age: float = DEFAULT_MAX_AGE, reuse_max_age: float = DEFAULT_REUSE_MAX_AGE) -> int:
+        """Удаляет устаревшие строки; возвращает количество удаленных"""
+        now = time.time()
+        with self._lock:
+            removed = self._conn.execute('DELETE FROM rows WHERE completed_at < ?', (now - max_age,)).rowcount
+            removed += self._conn.execute(
+                'DELETE FROM row_index WHERE completed_at < ?', (now - reuse_max_age,)
+            ).rowcount
+            self._conn.commit()
+        if removed:
+            logger.info(f"🧹 Удалено устаревших контрольных точек: {removed}")
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
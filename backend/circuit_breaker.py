@@ -0,0 +1,217 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Размыкаем цепь, если среди последних вызовов доля ошибок (503/403/429, CAPTCHA,
+# сетевые ошибки) или медленных вызовов не меньше порога
+FAILURE_RATE = float(os.getenv('CIRCUIT_FAILURE_RATE', 0.5))
+SLOW_RATE = float(os.getenv('CIRCUIT_SLOW_RATE', 0.8))
+MIN_CALLS = int(os.getenv('CIRCUIT_MIN_CALLS', 3))
+WINDOW_SIZE = int(os.getenv('CIRCUIT_WINDOW', 20))
+WINDOW_SECONDS = float(os.getenv('CIRCUIT_WINDOW_SECONDS', 300))
+
+# Сколько цепь разомкнута до пробного запроса; после неудачной пробы время удваивается
+OPEN_SECONDS = float(os.getenv('CIRCUIT_OPEN_SECONDS', 60))
+MAX_OPEN_SECONDS = float(os.getenv('CIRCUIT_MAX_OPEN_SECONDS', 600))
+
+# Вызов медленнее порога считается медленным, например
+# CIRCUIT_SLOW_SECONDS="amazon=15,allegro=90"
+DEFAULT_SLOW_SECONDS = {
+    'amazon': 15.0,
+    'aliexpress': 20.0,
+    'allegro': 90.0,
+}
+
+REJECTED_METRIC = 'product_search_circuit_rejected_total'
+OPENED_METRIC = 'product_search_circuit_opened_total'
+
+
+def parse_slow_seconds(value: Optional[str]) -> Dict[str, float]:
+    """'amazon=15,allegro=90' -> {'amazon': 15.0, 'allegro': 90.0}"""
+    thresholds = dict(DEFAULT_SLOW_SECONDS)
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, seconds = item.split('=', 1)
+            thresholds[name.strip()] = float(seconds)
+    return thresholds
+
+
+class CircuitOpen(Exception):
+    """Площадка временно отключена: цепь разомкнута, запрос не выполняется"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily disabled after repeated failures (retry in {retry_after:.0f}s)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Автомат защиты площадки: closed -> open -> half_open -> closed.
+
+    В состоянии closed запросы идут как обычно, результаты последних вызовов
+    хранятся в скользящем окне. Когда доля ошибок или медленных вызовов
+    превышает порог, цепь размыкается: запросы сразу отклоняются (CircuitOpen)
+    без сетевых попыток, ожиданий и запуска браузера. Через open_seconds один
+    запрос пропускается как проба: успех замыкает цепь, ошибка снова размыкает
+    ее на вдвое больший срок.
+    """
+
+    def __init__(self, name: str, slow_seconds: float, failure_rate: float = FAILURE_RATE,
+                 slow_rate: float = SLOW_RATE, min_calls: int = MIN_CALLS, window_size: int = WINDOW_SIZE,
+                 window_seconds: float = WINDOW_SECONDS, open_seconds: float = OPEN_SECONDS,
+                 max_open_seconds: float = MAX_OPEN_SECONDS):
+        self.name = name
+        self.slow_seconds = slow_seconds
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.min_calls = max(1, min_calls)
+        self.window_seconds = window_seconds
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.open_seconds = open_seconds
+        # (время, ошибка, медленный) последних вызовов
+        self._calls: deque = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._last_failure: Optional[str] = None
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _retry_after(self, now: float) -> float:
+        return max(0.0, self._opened_at + self.open_seconds - now)
+
+    def allow(self) -> bool:
+        """
+        Можно ли выполнить запрос. В half_open пропускается одна проба за раз;
+        если ее результат не записан (проба зависла), через open_seconds — следующая
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self._state == OPEN and self._retry_after(now) <= 0:
+                self._state = HALF_OPEN
+                self._probe_started = None
+                logger.info(f"🟡 {self.name}: пробный запрос после {self.open_seconds:.0f} сек паузы")
+            if self._state == HALF_OPEN and (self._probe_started is None
+                                             or now - self._probe_started > self.open_seconds):
+                self._probe_started = now
+                return True
+            if self._state == CLOSED:
+                return True
+            self.rejected += 1
+        registry.inc(REJECTED_METRIC, platform=self.name)
+        return False
+
+    def check(self):
+        """allow() или CircuitOpen — для входа в скрапер"""
+        if not self.allow():
+            with self._lock:
+                retry_after = self._retry_after(time.monotonic()) or self.open_seconds
+            raise CircuitOpen(self.name, retry_after)
+
+    @property
+    def is_open(self) -> bool:
+        """Цепь разомкнута: оставшиеся попытки и паузы между ними не имеют смысла"""
+        with self._lock:
+            return self._state == OPEN
+
+    @property
+    def is_probing(self) -> bool:
+        """Идет пробный запрос: достаточно одной попытки без повторов"""
+        with self._lock:
+            return self._state == HALF_OPEN
+
+    def record_success(self, duration: float = 0.0):
+        self._record(False, duration, None)
+
+    def record_failure(self, reason: str, duration: float = 0.0):
+        self._record(True, duration, reason)
+
+    def _record(self, failed: bool, duration: float, reason: Optional[str]):
+        now = time.monotonic()
+        slow = duration >= self.slow_seconds
+        with self._lock:
+            if failed:
+                self._last_failure = reason
+            # Ответы запросов, начатых до размыкания, не влияют на состояние
+            if self._state == OPEN:
+                return
+            if self._state == HALF_OPEN:
+                if failed or slow:
+                    self.open_seconds = min(self.open_seconds * 2, self.max_open_seconds)
+                    self._open(now, reason or 'slow response')
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    self.open_seconds = self.base_open_seconds
+                    logger.info(f"🟢 {self.name}: площадка снова доступна, цепь замкнута")
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and now - self._calls[0][0] > self.window_seconds:
+                self._calls.popleft()
+            calls = len(self._calls)
+            if calls < self.min_calls:
+                return
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+            if failures / calls >= self.failure_rate:
+                self._open(now, f"{failures}/{calls} failed, last: {reason or self._last_failure}")
+            elif slow_calls / calls >= self.slow_rate:
+                self._open(now, f"{slow_calls}/{calls} slower than {self.slow_seconds:.0f}s")
+
+    def _open(self, now: float, reason: str):
+        self._state = OPEN
+        self._opened_at = now
+        self._probe_started = None
+        registry.inc(OPENED_METRIC, platform=self.name)
+        logger.warning(f"🔴 {self.name}: цепь разомкнута на {self.open_seconds:.0f} сек ({reason})")
+
+    def snapshot(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(1 for _, failed, _ in self._calls if failed)
+            slow_calls = sum(1 for _, _, slow in self._calls if slow)
+            return {
+                'state': self._state,
+                'calls': calls,
+                'failure_rate': round(failures / calls, 2) if calls else 0.0,
+                'slow_rate': round(slow_calls / calls, 2) if calls else 0.0,
+                'retry_in': round(self._retry_after(now), 1) if self._state == OPEN else None,
+                'open_seconds': self.open_seconds,
+                'rejected': self.rejected,
+                'last_failure': self._last_failure,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(platform: str) -> CircuitBreaker:
+    """Общий для процесса автомат площадки (/api/search и обработка CSV)"""
+    with _breakers_lock:
+        breaker = _breakers.get(platform)
+        if breaker is None:
+            slow_seconds = parse_slow_seconds(os.getenv('CIRCUIT_SLOW_SECONDS'))
+            breaker = _breakers[platform] = CircuitBreaker(platform, slow_seconds.get(platform, 30.0))
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
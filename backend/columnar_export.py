@@ -0,0 +1,114 @@
+import logging
+from typing import Dict, Iterable, Iterator, List
+
+from pricing import product_price
+
+logger = logging.getLogger(__name__)
+
+# Колоночный формат (необязательная зависимость): pip install pyarrow
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+
+# Сколько предложений собирать в один record batch перед записью
+DEFAULT_BATCH_SIZE = 50000
+
+OFFER_PLATFORMS = ['amazon', 'aliexpress', 'allegro']
+
+
+def offer_schema():
+    """Схема плоской таблицы: одна строка на предложение"""
+    return pa.schema([
+        ('row_index', pa.int64()),
+        ('query', pa.string()),
+        ('platform', pa.string()),
+        ('rank', pa.int32()),
+        ('name', pa.string()),
+        ('price', pa.float64()),
+        ('currency', pa.string()),
+        ('price_text', pa.string()),
+        ('url', pa.string()),
+        ('relevance', pa.float64()),
+    ])
+
+
+def _float(value):
+    try:
+        return float(value) if value is not None and value != '' else None
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_offers(results: Iterable[Dict]) -> Iterator[Dict]:
+    """Разворачивает вложенные результаты строк в плоские записи предложений"""
+    for result in results:
+        for platform in OFFER_PLATFORMS:
+            for rank, product in enumerate(result.get(platform) or [], start=1):
+                amount = product.get('price_amount')
+                currency = product.get('price_currency')
+                if amount is None:
+                    # Результаты, сохраненные до появления числовых цен
+                    parsed = product_price(product)
+                    if parsed is not None:
+                        amount, currency = parsed.amount, parsed.currency
+
+                yield {
+                    'row_index': result.get('row_index'),
+                    'query': result.get('query'),
+                    'platform': platform,
+                    'rank': rank,
+                    'name': product.get('name'),
+                    'price': _float(amount),
+                    'currency': currency,
+                    'price_text': product.get('price'),
+                    'url': product.get('url'),
+                    'relevance': _float(product.get('relevance_score')),
+                }
+
+
+def _batches(offers: Iterator[Dict], schema, batch_size: int):
+    batch: List[Dict] = []
+    for offer in offers:
+        batch.append(offer)
+        if len(batch) >= batch_size:
+            yield pa.RecordBatch.from_pylist(batch, schema=schema)
+            batch = []
+    if batch:
+        yield pa.RecordBatch.from_pylist(batch, schema=schema)
+
+
+def export_offers(results: Iterable[Dict], output_file: str, file_format: str = 'parquet',
+                  batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """
+    Записывает предложения в Parquet или Arrow IPC пакетами по batch_size строк.
+
+    results может быть генератором (result_writer.iter_results), поэтому
+    в памяти одновременно находится не больше одного пакета.
+    Возвращает количество записанных предложений.
+    """
+    if pa is None:
+        raise RuntimeError("Экспорт Parquet/Arrow требует pyarrow. Установите: pip install pyarrow")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}'. Allowed: {', '.join(EXPORT_FORMATS)}")
+
+    schema = offer_schema()
+    if file_format == 'parquet':
+        writer = pq.ParquetWriter(output_file, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(output_file, schema)
+
+    count = 0
+    try:
+        for batch in _batches(iter_offers(results), schema, batch_size):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    finally:
+        writer.close()
+
+    logger.info(f"Экспортировано предложений в {file_format}: {count} → {output_file}")
+    return count
@@ -0,0 +1,143 @@
+import hashlib
+import logging
+import re
+from typing import Dict, List
+
+from pricing import convert, product_price
+
+logger = logging.getLogger(__name__)
+
+# Размер SimHash-сигнатуры и разбиение на полосы для LSH
+SIMHASH_BITS = 64
+BANDS = 8
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+# Максимальное расстояние Хэмминга, при котором названия считаются дубликатами.
+# При BANDS полосах дубликаты с расстоянием < BANDS гарантированно совпадут
+# хотя бы в одной полосе, поэтому порог не должен превышать BANDS - 1.
+DEFAULT_MAX_DISTANCE = 6
+
+SHINGLE_SIZE = 3
+
+# Слова с цифрами (модели, объемы, артикулы: xm5, 256gb) должны совпадать:
+# шинглы почти не различают WH-1000XM4 и WH-1000XM5
+_DIGIT_RE = re.compile(r'\d')
+
+_NON_WORD_RE = re.compile(r'[^\w\s]+', re.UNICODE)
+_SPACES_RE = re.compile(r'\s+')
+
+
+def normalize_title(title: str) -> str:
+    """Приводит название к нормальной форме для сравнения"""
+    title = _NON_WORD_RE.sub(' ', (title or '').lower())
+    return _SPACES_RE.sub(' ', title).strip()
+
+
+def model_tokens(title: str) -> frozenset:
+    """Слова названия, содержащие цифры"""
+    return frozenset(token for token in normalize_title(title).split() if _DIGIT_RE.search(token))
+
+
+def _shingles(text: str) -> List[str]:
+    """Символьные шинглы названия"""
+    if len(text) <= SHINGLE_SIZE:
+        return [text] if text else []
+    return [text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)]
+
+
+def simhash(title: str) -> int:
+    """
+    Вычисляет 64-битную SimHash-сигнатуру названия товара по шинглам
+    """
+    weights = [0] * SIMHASH_BITS
+
+    for shingle in _shingles(normalize_title(title)):
+        digest = hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest()
+        value = int.from_bytes(digest, 'big')
+        for bit in range(SIMHASH_BITS):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def _is_cheaper(candidate: Dict, current: Dict) -> bool:
+    """Сравнивает цены в валюте текущего представителя кластера"""
+    candidate_price = product_price(candidate)
+    if candidate_price is None:
+        return False
+    current_price = product_price(current)
+    if current_price is None:
+        return True
+
+    amount = candidate_price.amount
+    if candidate_price.currency != current_price.currency:
+        amount = convert(amount, candidate_price.currency, current_price.currency)
+    return amount is not None and amount < current_price.amount
+
+
+def collapse_near_duplicates(products: List[Dict], max_distance: int = DEFAULT_MAX_DISTANCE) -> List[Dict]:
+    """
+    Схлопывает почти одинаковые товары (спонсорские + органические, разные продавцы).
+
+    Для каждого товара считается SimHash названия; кандидаты в дубликаты ищутся
+    только среди кластеров, совпадающих хотя бы в одной LSH-полосе, поэтому
+    сравнение не требует перебора всех пар. Товары объединяются, только если
+    совпадают и слова с цифрами (номера моделей). В каждом кластере остается
+    копия самого дешевого предложения с полем variants_count; исходные
+    словари не изменяются. Порядок кластеров
+    соответствует порядку первого появления (т.е. сохраняет сортировку
+    по релевантности).
+    """
+    if not products:
+        return products
+
+    max_distance = min(max_distance, BANDS - 1)
+
+    clusters = []  # [fingerprint, model_tokens, representative, count]
+    buckets: Dict[tuple, List[int]] = {}
+
+    for product in products:
+        fingerprint = simhash(product.get('name', ''))
+        models = model_tokens(product.get('name', ''))
+        bands = [(band, fingerprint >> (band * BAND_BITS) & BAND_MASK) for band in range(BANDS)]
+
+        match = None
+        for key in bands:
+            for cluster_id in buckets.get(key, ()):
+                cluster = clusters[cluster_id]
+                if cluster[1] == models and hamming_distance(fingerprint, cluster[0]) <= max_distance:
+                    match = cluster_id
+                    break
+            if match is not None:
+                break
+
+        if match is None:
+            cluster_id = len(clusters)
+            clusters.append([fingerprint, models, product, 1])
+            for key in bands:
+                buckets.setdefault(key, []).append(cluster_id)
+            continue
+
+        cluster = clusters[match]
+        cluster[3] += 1
+        if _is_cheaper(product, cluster[2]):
+            cluster[2] = product
+
+    collapsed = [{**representative, 'variants_count': count} for _, _, representative, count in clusters]
+
+    if len(collapsed) < len(products):
+        logger.info(f"🧬 Схлопнуто дубликатов: {len(products)} → {len(collapsed)}")
+
+    return collapsed
@@ -0,0 +1,282 @@
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from ai_cache import CompletionCache
+
+logger = logging.getLogger(__name__)
+
+DESCRIPTION_MODEL = 'gpt-4o-mini'  # Используем более экономичную модель
+
+SYSTEM_PROMPT = (
+    'Ты профессиональный копирайтер, специализирующийся на создании продающих описаний товаров '
+    'для интернет-магазинов. Твоя задача - создавать привлекательные, информативные и убедительные '
+    'описания, которые точно соответствуют названию товара и помогают покупателям принять решение о покупке.'
+)
+
+# Параллельные запросы к OpenAI при пакетной генерации
+DEFAULT_CONCURRENCY = int(os.getenv('DESCRIPTION_CONCURRENCY', 4))
+MAX_BATCH_SIZE = int(os.getenv('DESCRIPTION_MAX_BATCH', 2000))
+
+# Повторы при 429/5xx и сетевых ошибках
+MAX_RETRIES = 5
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def product_fields(product: Dict) -> Tuple[str, str, str]:
+    """Название, цена и площадка товара в том виде, в котором они попадают в промпт"""
+    return (
+        str(product.get('name') or '').strip(),
+        str(product.get('price') or ''),
+        str(product.get('source') or 'Unknown')
+    )
+
+
+def basic_description(product: Dict) -> str:
+    """Описание-заглушка, если OpenAI API ключ не настроен"""
+    product_name, product_price, source_platform = product_fields(product)
+    return f"""
+📱 **{product_name}**
+
+🔹 **Основные характеристики:**
+• Высокое качество и надежность
+• Современные технологии
+• Отличное соотношение цена/качество
+
+🔹 **Преимущества:**
+• Проверенный производитель
+• Гарантия качества
+• Быстрая доставка
+
+🔹 **Применение:**
+Подходит для повседневного использования и профессиональных задач.
+
+💡 **Рекомендация:** Для получения более детального AI-описания настройте OpenAI API ключ в файле .env
+
+---
+*Источник: {source_platform}*
+*Цена: {product_price}*
+""".strip()
+
+
+def description_payload(product: Dict) -> Dict:
+    """Тело запроса chat completions для описания товара"""
+    product_name, product_price, source_platform = product_fields(product)
+
+    # Создаем промпт для генерации описания
+    prompt = f"""
+Создай профессиональное описание товара для интернет-магазина на основе следующей информации:
+
+Название товара: {product_name}
+Цена: {product_price}
+Источник: {source_platform}
+
+Требования к описанию:
+1. Напиши привлекательное и информативное описание на русском языке
+2. Выдели ключевые особенности и преимущества товара
+3. Используй продающий стиль текста
+4. Добавь информацию о качестве и надежности
+5. Упомяни возможные варианты использования
+6. Сделай описание длиной 150-300 слов
+7. Используй эмодзи для привлекательности
+8. Структурируй текст с абзацами
+9. Опиши товар максимально точно, основываясь на его названии
+10. Не добавляй информацию, которой нет в названии товара
+
+ВАЖНО: Описание должно точно соответствовать названию товара. Если в названии указан конкретный товар (например, iPhone 15 Pro Max), то описание должно быть именно об этом товаре, а не о других моделях.
+
+Создай описание, которое поможет покупателю принять решение о покупке.
+"""
+
+    return {
+        'model': DESCRIPTION_MODEL,
+        'messages': [
+            {
+                'role': 'system',
+                'content': SYSTEM_PROMPT
+            },
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ],
+        'max_tokens': 600,
+        'temperature': 0.5
+    }
+
+
+def _backoff(attempt: int) -> float:
+    """Экспоненциальная задержка с jitter"""
+    return min(MAX_DELAY, BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def retry_after(response) -> Optional[float]:
+    """
+    Сколько ждать по заголовкам ответа: Retry-After (секунды)
+    или x-ratelimit-reset-requests/-tokens OpenAI (например, '6m0s', '120ms')
+    """
+    value = response.headers.get('Retry-After')
+    if value:
+        try:
+            return min(MAX_DELAY, float(value))
+        except ValueError:
+            pass
+    resets = []
+    for header in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+        value = response.headers.get(header)
+        if value:
+            seconds = sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in _DURATION_RE.findall(value))
+            if seconds:
+                resets.append(seconds)
+    return min(MAX_DELAY, max(resets)) if resets else None
+
+
+class RateLimiter:
+    """
+    Общая пауза для всех потоков пакета: после 429 ни один поток
+    не отправляет запросы до указанного OpenAI времени
+    """
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self.pauses = 0
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+            self.pauses += 1
+
+
+def generate_description(cache: CompletionCache, api_key: str, product: Dict,
+                         limiter: Optional[RateLimiter] = None, refresh: bool = False) -> Tuple[str, bool]:
+    """
+    Описание одного товара с повторами при 429/5xx и сетевых ошибках.
+    Возвращает (описание, взято_из_кэша).
+    """
+    limiter = limiter or RateLimiter()
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.wait()
+        try:
+            result, cached = cache.chat_completion(api_key, description_payload(product), timeout=30,
+                                                   refresh=refresh, endpoint='description-batch', wait=True)
+            return result['choices'][0]['message']['content'], cached
+        except requests.exceptions.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                raise
+            delay = (retry_after(e.response) if e.response is not None else None) or _backoff(attempt)
+            logger.warning(f"⚠️ OpenAI {status}, повтор через {delay:.1f} с (попытка {attempt + 1})")
+            if status == 429:
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = _backoff(attempt)
+            logger.warning(f"⚠️ Ошибка сети OpenAI: {e}, повтор через {delay:.1f} с")
+            time.sleep(delay)
+
+
+def job_products(results, platforms, offers: str = 'top') -> List[Dict]:
+    """
+    Товары для описаний из результатов CSV задания:
+    offers='top' — первое предложение каждой площадки, 'cheapest' — самое дешевое в строке
+    """
+    products = []
+    for result in results:
+        if offers == 'cheapest':
+            cheapest = result.get('cheapest_offer')
+            if cheapest and cheapest.get('platform') in platforms:
+                products.append(dict(cheapest, row_index=result.get('row_index')))
+            continue
+        for platform in platforms:
+            offers_list = result.get(platform) or []
+            if offers_list:
+                products.append(dict(offers_list[0], row_index=result.get('row_index'), platform=platform))
+    return products
+
+
+def generate_descriptions(products: List[Dict], api_key: Optional[str], cache: CompletionCache,
+                          concurrency: int = DEFAULT_CONCURRENCY, refresh: bool = False) -> Iterator[Dict]:
+    """
+    Генерирует описания для списка товаров и отдает записи по мере готовности.
+
+    Одинаковые товары (название, цена, площадка) объединяются до обращения к модели:
+    один запрос, результат копируется во все позиции. Запросы идут параллельно,
+    не больше concurrency одновременно; после 429 все потоки ждут вместе.
+    Последняя запись — {'done': True, 'summary': {...}}.
+    """
+    groups: Dict[Tuple[str, str, str], List[int]] = {}
+    for index, product in enumerate(products):
+        groups.setdefault(product_fields(product), []).append(index)
+
+    summary = {'total': len(products), 'unique': len(groups), 'generated': 0, 'cached': 0, 'failed': 0}
+    started = time.perf_counter()
+
+    def record(index: int, **fields) -> Dict:
+        product = products[index]
+        return dict({
+            'index': index,
+            'row_index': product.get('row_index'),
+            'platform': product.get('platform'),
+            'name': product.get('name'),
+        }, **fields)
+
+    if not api_key:
+        for key, indices in groups.items():
+            description = basic_description(products[indices[0]])
+            for index in indices:
+                yield record(index, description=description, cached=False, basic=True)
+        summary['basic'] = len(products)
+        yield {'done': True, 'summary': summary}
+        return
+
+    limiter = RateLimiter()
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = {
+            executor.submit(generate_description, cache, api_key, products[indices[0]], limiter, refresh): indices
+            for indices in groups.values()
+        }
+        for future in as_completed(futures):
+            indices = futures[future]
+            try:
+                description, cached = future.result()
+            except Exception as e:
+                logger.error(f"Ошибка генерации описания: {e}")
+                summary['failed'] += 1
+                for index in indices:
+                    yield record(index, error=str(e))
+                continue
+
+            summary['cached' if cached else 'generated'] += 1
+            for index in indices:
+                yield record(index, description=description, cached=cached)
+    finally:
+        # Клиент мог закрыть соединение: незапущенные запросы отменяем
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    summary['rate_limit_pauses'] = limiter.pauses
+    summary['seconds'] = round(time.perf_counter() - started, 2)
+    logger.info(f"📝 Пакет описаний: {summary}")
+    yield {'done': True, 'summary': summary}
@@ -0,0 +1,102 @@
+import json
+import logging
+from typing import Dict, Iterable, List
+
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+logger = logging.getLogger(__name__)
+
+# Сколько лучших предложений каждой площадки выгружать в строку
+DEFAULT_TOP_N = 3
+
+EXPORT_PLATFORMS = ['amazon', 'aliexpress', 'allegro']
+
+OFFER_FIELDS = ['Название', 'Цена', 'URL', 'Релевантность']
+
+CHEAPEST_COLUMNS = ['Лучшая_цена_Площадка', 'Лучшая_цена_Название', 'Лучшая_цена',
+                    'Лучшая_цена_Валюта', 'Лучшая_цена_URL']
+
+
+def _offer_prefix(platform: str, rank: int) -> str:
+    # Первое предложение сохраняет прежние названия колонок (Amazon_Цена и т.д.)
+    return platform.title() if rank == 1 else f'{platform.title()}_{rank}'
+
+
+def build_header(top_n: int = DEFAULT_TOP_N) -> List[str]:
+    header = ['Строка', 'Запрос', 'Характеристики', 'Ошибка']
+    for platform in EXPORT_PLATFORMS:
+        for rank in range(1, top_n + 1):
+            prefix = _offer_prefix(platform, rank)
+            header.extend(f'{prefix}_{field}' for field in OFFER_FIELDS)
+    header.extend(CHEAPEST_COLUMNS)
+    return header
+
+
+def _relevance(product: Dict):
+    try:
+        return round(float(product.get('relevance_score', 0)), 2)
+    except (TypeError, ValueError):
+        return ''
+
+
+def _clean(value):
+    # Управляющие символы из названий товаров openpyxl не принимает
+    return ILLEGAL_CHARACTERS_RE.sub('', value) if isinstance(value, str) else value
+
+
+def build_row(result: Dict, top_n: int = DEFAULT_TOP_N) -> List:
+    """Одна строка таблицы: данные строки файла, top_n предложений каждой площадки, лучшая цена"""
+    row = [
+        result.get('row_index', ''),
+        result.get('query', ''),
+        json.dumps(result.get('characteristics', {}), ensure_ascii=False),
+        result.get('error', '')
+    ]
+
+    for platform in EXPORT_PLATFORMS:
+        products = result.get(platform) or []
+        for rank in range(top_n):
+            if rank < len(products):
+                product = products[rank]
+                row.extend([
+                    product.get('name', ''),
+                    product.get('price', ''),
+                    product.get('url', ''),
+                    _relevance(product)
+                ])
+            else:
+                row.extend([''] * len(OFFER_FIELDS))
+
+    # Самое дешевое предложение среди площадок
+    cheapest = result.get('cheapest_offer') or {}
+    row.extend([
+        cheapest.get('platform', '').title(),
+        cheapest.get('name', ''),
+        cheapest.get('price_amount', ''),
+        cheapest.get('price_currency', ''),
+        cheapest.get('url', '')
+    ])
+    return [_clean(value) for value in row]
+
+
+def export_results(results: Iterable[Dict], output_file: str, top_n: int = DEFAULT_TOP_N) -> int:
+    """
+    Потоково записывает результаты в Excel (openpyxl write-only).
+
+    Строки пишутся на диск сразу по мере чтения results, поэтому память
+    не зависит от количества строк: results может быть генератором,
+    например result_writer.iter_results(path). Возвращает число строк.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Results')
+    sheet.append(build_header(top_n))
+
+    count = 0
+    for result in results:
+        sheet.append(build_row(result, top_n))
+        count += 1
+
+    workbook.save(output_file)
+    logger.info(f"Результаты экспортированы в Excel: {output_file} ({count} строк)")
+    return count
@@ -0,0 +1,115 @@
+import itertools
+import logging
+from typing import IO, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк файла держать в памяти одновременно
+DEFAULT_CHUNK_SIZE = 1000
+
+Source = Union[str, IO]
+
+
+def _file_type(filename: str) -> str:
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith('.xlsx'):
+        return 'xlsx'
+    if name.endswith('.xls'):
+        return 'xls'
+    raise ValueError("Поддерживаются только файлы CSV и Excel")
+
+
+def _iter_csv_chunks(source: Source, chunksize: int) -> Iterator[pd.DataFrame]:
+    # Индекс строк у pandas продолжается между чанками
+    with pd.read_csv(source, encoding='utf-8', chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def _iter_xlsx_chunks(source: Source, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Читает .xlsx в режиме read-only, не загружая всю книгу в память"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [
+            str(name) if name is not None else f'Unnamed: {position}'
+            for position, name in enumerate(header)
+        ]
+
+        width = len(columns)
+        start = 0
+        batch = []
+        # Пустые строки в конце листа пропускаем, как это делает pandas; пустые
+        # строки в середине остаются (строкой из NaN), чтобы номера строк совпадали с листом
+        blank = 0
+        for row in rows:
+            if all(value is None for value in row):
+                blank += 1
+                continue
+            batch.extend([(None,) * width] * blank)
+            blank = 0
+            batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame([row[:width] for row in batch], columns=columns,
+                                   index=range(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame([row[:width] for row in batch], columns=columns,
+                               index=range(start, start + len(batch)))
+    finally:
+        workbook.close()
+
+
+def _iter_xls_chunks(source: Source, chunksize: int) -> Iterator[pd.DataFrame]:
+    # Старый формат .xls (xlrd) не поддерживает потоковое чтение
+    df = pd.read_excel(source)
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def iter_chunks(source: Source, filename: Optional[str] = None,
+                chunksize: int = DEFAULT_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """
+    Потоково читает CSV/Excel файл чанками DataFrame.
+
+    source — путь к файлу или файловый объект (например, поток загрузки Flask);
+    filename нужен для определения формата, если source не путь.
+    """
+    file_type = _file_type(filename or source)
+    readers = {
+        'csv': _iter_csv_chunks,
+        'xlsx': _iter_xlsx_chunks,
+        'xls': _iter_xls_chunks,
+    }
+    return readers[file_type](source, chunksize)
+
+
+def open_chunks(source: Source, filename: Optional[str] = None,
+                chunksize: int = DEFAULT_CHUNK_SIZE) -> Tuple[List[str], Iterator[pd.DataFrame]]:
+    """
+    Открывает файл для потокового чтения и возвращает (колонки, итератор чанков).
+
+    Первый чанк читается сразу, чтобы проверить колонки до обработки,
+    без повторного чтения и без перемотки потока.
+    """
+    chunks = iter_chunks(source, filename, chunksize)
+    first = next(chunks, None)
+    if first is None:
+        return [], iter(())
+    return list(first.columns), itertools.chain([first], chunks)
+
+
+def iter_rows(chunks) -> Iterator[Tuple[int, pd.Series]]:
+    """Строки из чанков в виде (index, row), как у DataFrame.iterrows()"""
+    for chunk in chunks:
+        yield from chunk.iterrows()
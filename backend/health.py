@@ -0,0 +1,152 @@
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from flask import g
+
+from circuit_breaker import CircuitOpen
+
+# Сколько последних поисков на площадке хранить для процентилей
+SAMPLE_SIZE = int(os.getenv('HEALTH_SAMPLE_SIZE', 200))
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+
+class Slots:
+    """
+    Ограничение числа одновременно занятых ресурсов (например, браузеров)
+    со счетчиками занятых и ожидающих слотов для /health/ready
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self.in_use = 0
+        self.waiting = 0
+        self._semaphore = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        with self._lock:
+            self.waiting += 1
+        try:
+            self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        with self._lock:
+            self.in_use += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'size': self.size,
+                'in_use': self.in_use,
+                'waiting': self.waiting,
+                'available': self.size - self.in_use,
+            }
+
+
+class PlatformStats:
+    """Поиски на площадке: выполняются сейчас, завершены, отклонены автоматом защиты, время"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.durations = deque(maxlen=SAMPLE_SIZE)
+
+    def snapshot(self) -> Dict:
+        return {
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'latency_ms_p50': _percentile(self.durations, 0.5),
+            'latency_ms_p95': _percentile(self.durations, 0.95),
+            'latency_ms_p99': _percentile(self.durations, 0.99),
+        }
+
+
+_platforms: Dict[str, PlatformStats] = {}
+_lock = threading.Lock()
+
+# HTTP запросы, которые обрабатываются сейчас
+_requests_in_flight = 0
+
+
+def track_platform(platform: str):
+    """Декоратор функции поиска: счетчики и время поисков площадки для /health/ready"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _lock:
+                stats = _platforms.get(platform)
+                if stats is None:
+                    stats = _platforms[platform] = PlatformStats()
+                stats.in_flight += 1
+            started = time.perf_counter()
+            outcome = 'completed'
+            try:
+                return func(*args, **kwargs)
+            except CircuitOpen:
+                outcome = 'rejected'
+                raise
+            except Exception:
+                outcome = 'failed'
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                with _lock:
+                    stats.in_flight -= 1
+                    setattr(stats, outcome, getattr(stats, outcome) + 1)
+                    # Отклоненные поиски не выполнялись: их время не попадает в процентили
+                    if outcome != 'rejected':
+                        stats.durations.append(elapsed)
+        return wrapper
+    return decorator
+
+
+def platform_stats() -> Dict[str, Dict]:
+    with _lock:
+        return {platform: stats.snapshot() for platform, stats in _platforms.items()}
+
+
+def requests_in_flight() -> int:
+    return _requests_in_flight
+
+
+def init_health(app):
+    """Подключает к приложению счетчик обрабатываемых HTTP запросов"""
+
+    @app.before_request
+    def count_request():
+        global _requests_in_flight
+        with _lock:
+            _requests_in_flight += 1
+        g.health_counted = True
+
+    @app.teardown_request
+    def uncount_request(exc=None):
+        global _requests_in_flight
+        if g.pop('health_counted', False):
+            with _lock:
+                _requests_in_flight -= 1
+
+    return app
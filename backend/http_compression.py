@@ -0,0 +1,103 @@
+import gzip
+import hashlib
+import logging
+import os
+from typing import Optional
+
+from flask import request
+
+logger = logging.getLogger(__name__)
+
+# Brotli сжимает JSON сильнее gzip (необязательная зависимость): pip install brotli
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Ответы меньше порога не сжимаем: выигрыш меньше накладных расходов
+MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+# Для динамических ответов средние уровни brotli дают почти тот же размер в разы быстрее
+BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+def choose_encoding(accept_encoding) -> Optional[str]:
+    """Лучшее поддерживаемое клиентом сжатие: br, затем gzip"""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def body_etag(body: bytes) -> str:
+    return hashlib.sha1(body).hexdigest()
+
+
+def _is_compressible(response) -> bool:
+    return (response.status_code == 200
+            and not response.direct_passthrough
+            and not response.is_streamed
+            and 'Content-Encoding' not in response.headers
+            and response.mimetype is not None
+            and response.mimetype.startswith(COMPRESSIBLE_TYPES))
+
+
+def init_compression(app):
+    """
+    Подключает к приложению ETag и сжатие JSON ответов.
+
+    GET ответы без собственного ETag получают ETag по содержимому, и повтор
+    с If-None-Match возвращает 304 без тела. Ответы больше MIN_SIZE сжимаются
+    brotli или gzip (по Accept-Encoding); ETag сжатого ответа помечается
+    слабым, так как байты на проводе отличаются от исходных.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if not _is_compressible(response):
+            return response
+
+        body = response.get_data()
+
+        if request.method in ('GET', 'HEAD'):
+            etag, weak = response.get_etag()
+            if etag is None:
+                etag = body_etag(body)
+                response.set_etag(etag)
+            if request.if_none_match.contains_weak(etag):
+                not_modified = app.response_class(status=304)
+                not_modified.set_etag(etag, weak=weak)
+                for header in ('Cache-Control', 'Vary'):
+                    if header in response.headers:
+                        not_modified.headers[header] = response.headers[header]
+                return not_modified
+
+        response.vary.add('Accept-Encoding')
+        if len(body) < MIN_SIZE:
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        compressed = compress_body(body, encoding)
+        if len(compressed) >= len(body):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return app
@@ -0,0 +1,153 @@
+import base64
+import hashlib
+import io
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Максимальная сторона изображения для распознавания (detail: low все равно использует 512 px)
+MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', 800))
+
+# Лимит base64 в запросе к API (~4MB) и соответствующий размер JPEG
+MAX_BASE64_BYTES = 4 * 1024 * 1024
+MAX_JPEG_BYTES = MAX_BASE64_BYTES * 3 // 4
+
+DEFAULT_QUALITY = 85
+MIN_QUALITY = 50
+
+# Оценка размера JPEG сверху (бит на пиксель для шумной фотографии) по качеству.
+# Позволяет выбрать качество до кодирования и не кодировать изображение повторно
+WORST_CASE_BITS_PER_PIXEL = [(DEFAULT_QUALITY, 4.0), (75, 3.0), (65, 2.5), (50, 2.0)]
+
+# Сколько подготовленных изображений держать в кэше
+CACHE_SIZE = int(os.getenv('IMAGE_CACHE_SIZE', 128))
+
+
+class PreparedImage(NamedTuple):
+    base64: str
+    width: int
+    height: int
+    quality: int
+    jpeg_bytes: int
+
+
+def estimate_quality(pixels: int, target_bytes: int = MAX_JPEG_BYTES) -> Optional[int]:
+    """Наибольшее качество, при котором JPEG гарантированно помещается в target_bytes"""
+    for quality, bits_per_pixel in WORST_CASE_BITS_PER_PIXEL:
+        if pixels * bits_per_pixel / 8 <= target_bytes:
+            return quality
+    return None
+
+
+def _to_rgb(img: Image.Image) -> Image.Image:
+    """JPEG не поддерживает прозрачность и палитру: прозрачные области заливаем белым"""
+    if img.mode in ('RGB', 'L'):
+        return img
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    return img.convert('RGB')
+
+
+def _encode(img: Image.Image, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=quality, optimize=False)
+    return buffer.getvalue()
+
+
+def prepare_image_uncached(data: bytes, max_side: int = MAX_SIDE,
+                           target_bytes: int = MAX_JPEG_BYTES) -> PreparedImage:
+    """
+    Готовит изображение к отправке в API за один проход:
+    JPEG декодируется сразу в уменьшенном масштабе (Image.draft), ориентация
+    берется из EXIF, качество выбирается по оценке размера до кодирования.
+    Повторное кодирование (с уменьшением) нужно только если оценка ошиблась.
+    """
+    img = Image.open(io.BytesIO(data))
+    # Для JPEG декодер сразу уменьшает изображение в 2/4/8 раз,
+    # но так, чтобы большая сторона осталась не меньше max_side
+    scale = min(1.0, max_side / max(img.size))
+    img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+    img = _to_rgb(img)
+    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    # Поворот по EXIF после уменьшения: поворачивать маленькое изображение дешевле
+    img = ImageOps.exif_transpose(img)
+
+    quality = estimate_quality(img.width * img.height, target_bytes)
+    if quality is None:
+        # Даже при минимальном качестве не помещается: уменьшаем до оценки
+        scale = (target_bytes * 8 / (WORST_CASE_BITS_PER_PIXEL[-1][1] * img.width * img.height)) ** 0.5
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))),
+                         Image.Resampling.LANCZOS)
+        quality = MIN_QUALITY
+
+    jpeg = _encode(img, quality)
+    if len(jpeg) > target_bytes:
+        logger.warning(f"⚠️ JPEG {len(jpeg)} байт больше лимита {target_bytes}, уменьшаем изображение")
+        scale = (target_bytes / len(jpeg)) ** 0.5 * 0.9
+        img = img.resize((max(1, int(img.width * scale)), max(1, int(img.height * scale))),
+                         Image.Resampling.LANCZOS)
+        quality = MIN_QUALITY
+        jpeg = _encode(img, quality)
+
+    return PreparedImage(
+        base64=base64.b64encode(jpeg).decode('ascii'),
+        width=img.width,
+        height=img.height,
+        quality=quality,
+        jpeg_bytes=len(jpeg)
+    )
+
+
+class PreparedImageCache:
+    """LRU кэш подготовленных изображений по хэшу содержимого файла"""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[str, PreparedImage]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[PreparedImage]:
+        with self._lock:
+            prepared = self._items.get(key)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return prepared
+
+    def put(self, key: str, prepared: PreparedImage):
+        with self._lock:
+            self._items[key] = prepared
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+_cache = PreparedImageCache()
+
+
+def image_key(data: bytes, max_side: int = MAX_SIDE) -> str:
+    return hashlib.blake2b(data, digest_size=16, person=str(max_side).encode()[:16]).hexdigest()
+
+
+def prepare_image(data: bytes, max_side: int = MAX_SIDE) -> PreparedImage:
+    """Подготовленное изображение из кэша или prepare_image_uncached"""
+    key = image_key(data, max_side)
+    prepared = _cache.get(key)
+    if prepared is None:
+        prepared = prepare_image_uncached(data, max_side)
+        _cache.put(key, prepared)
+    return prepared
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Сколько места могут занимать сгенерированные изображения
+DEFAULT_MAX_BYTES = int(float(os.getenv('GENERATED_IMAGES_MAX_MB', 512)) * 1024 * 1024)
+
+# Имя файла — sha256 содержимого: по одному адресу всегда одни и те же байты,
+# поэтому ответы можно кэшировать в браузере без проверки
+IMAGE_NAME_RE = re.compile(r'^[0-9a-f]{64}\.(png|jpg|webp)$')
+CONTENT_TYPES = {'png': 'image/png', 'jpg': 'image/jpeg', 'webp': 'image/webp'}
+
+
+def image_extension(data: bytes) -> str:
+    """Формат изображения по сигнатуре файла"""
+    if data.startswith(b'\x89PNG'):
+        return 'png'
+    if data.startswith(b'\xff\xd8'):
+        return 'jpg'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    raise ValueError('Unsupported image format')
+
+
+class GeneratedImageStore:
+    """
+    Хранилище сгенерированных изображений с адресацией по содержимому.
+
+    Файлы лежат в directory под именем <sha256>.<ext>; индекс в SQLite
+    связывает ключ промпта (хэш запроса к модели) с файлом, поэтому
+    повторный промпт возвращает готовое изображение без генерации.
+    При превышении max_bytes удаляются давно не запрашивавшиеся изображения.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or os.getenv('GENERATED_IMAGES_DIR',
+                                                os.path.join(os.getcwd(), 'generated_images'))
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, 'index.db'), check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS images ('
+            ' name TEXT PRIMARY KEY,'
+            ' size INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS prompts ('
+            ' prompt_key TEXT PRIMARY KEY,'
+            ' name TEXT NOT NULL,'
+            ' created_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def lookup(self, prompt_key: str) -> Optional[str]:
+        """Имя файла изображения для промпта, если оно еще хранится"""
+        with self._lock:
+            row = self._conn.execute('SELECT name FROM prompts WHERE prompt_key = ?', (prompt_key,)).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(self.path(row[0])):
+                self._conn.execute('DELETE FROM prompts WHERE prompt_key = ?', (prompt_key,))
+                self._conn.execute('DELETE FROM images WHERE name = ?', (row[0],))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE images SET last_access = ? WHERE name = ?', (time.time(), row[0]))
+            self._conn.commit()
+        return row[0]
+
+    def put(self, prompt_key: str, data: bytes) -> str:
+        """Сохраняет изображение (одинаковые байты — один файл) и возвращает имя файла"""
+        name = f"{hashlib.sha256(data).hexdigest()}.{image_extension(data)}"
+        path = self.path(name)
+        if not os.path.exists(path):
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO images (name, size, created_at, last_access) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET last_access = excluded.last_access',
+                (name, len(data), now, now)
+            )
+            self._conn.execute(
+                'INSERT OR REPLACE INTO prompts (prompt_key, name, created_at) VALUES (?, ?, ?)',
+                (prompt_key, name, now)
+            )
+            self._evict(keep=name)
+            self._conn.commit()
+        return name
+
+    def touch(self, name: str):
+        """Отмечает обращение к файлу (для вытеснения давно не использованных)"""
+        with self._lock:
+            self._conn.execute('UPDATE images SET last_access = ? WHERE name = ?', (time.time(), name))
+            self._conn.commit()
+
+    def _evict(self, keep: str):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM images').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Удаляем давно не использованные изображения, пока не освободим 10% запаса
+        removed = 0
+        for name, size in self._conn.execute('SELECT name, size FROM images ORDER BY last_access').fetchall():
+            if total <= self.max_bytes * 0.9:
+                break
+            if name == keep:
+                continue
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+            self._conn.execute('DELETE FROM images WHERE name = ?', (name,))
+            self._conn.execute('DELETE FROM prompts WHERE name = ?', (name,))
+            total -= size
+            removed += 1
+        logger.info(f"🧹 Сгенерированные изображения: удалено {removed}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            images, size = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images').fetchone()
+            prompts = self._conn.execute('SELECT COUNT(*) FROM prompts').fetchone()[0]
+        return {'images': images, 'prompts': prompts, 'bytes': size, 'max_bytes': self.max_bytes}
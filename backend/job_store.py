@@ -0,0 +1,388 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from result_writer import NDJSONWriter, dumps
+
+logger = logging.getLogger(__name__)
+
+# Сколько сериализованных результатов (в байтах) держать в памяти для всех заданий
+DEFAULT_MEMORY_BUDGET = int(float(os.getenv('JOB_MEMORY_BUDGET_MB', 256)) * 1024 * 1024)
+
+# Через сколько секунд без обращений задание удаляется (из памяти и с диска)
+DEFAULT_JOB_TTL = int(os.getenv('JOB_TTL', 24 * 60 * 60))
+
+# Размер страницы результатов по умолчанию и максимальный
+DEFAULT_PAGE_SIZE = int(os.getenv('RESULTS_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = 1000
+
+METADATA_PREFIX = b'{"metadata"'
+
+# Как часто (в секундах) проверять устаревшие задания
+PURGE_INTERVAL = 60
+
+# Сколько байт готовых ответов со страницами результатов держать в кэше
+DEFAULT_PAGE_CACHE_BYTES = int(float(os.getenv('PAGE_CACHE_MB', 32)) * 1024 * 1024)
+
+
+class JobBusy(Exception):
+    """Результаты задания уже записывает другой запрос"""
+
+
+def check_job_id(job_id: str) -> str:
+    """Id задания используется как имя файла, поэтому пути и скрытые имена запрещены"""
+    if not job_id or os.path.basename(job_id) != job_id or job_id.startswith('.') or len(job_id) > 128:
+        raise ValueError(f"Invalid job id '{job_id}'")
+    return job_id
+
+
+def parse_page(args, default_limit: int = DEFAULT_PAGE_SIZE) -> Tuple[int, int]:
+    """Разбирает offset/limit из параметров запроса; ValueError при некорректных значениях"""
+    try:
+        offset = int(args.get('offset', 0))
+        limit = int(args.get('limit', default_limit))
+    except (TypeError, ValueError):
+        raise ValueError('offset and limit must be integers')
+    if offset < 0:
+        raise ValueError('offset must not be negative')
+    if limit <= 0 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    return offset, limit
+
+
+class Job:
+    """
+    Результаты одного задания: NDJSON файл на диске, индекс смещений строк
+    и (пока позволяет бюджет) сериализованные строки в памяти
+    """
+
+    def __init__(self, job_id: str, path: str):
+        self.job_id = job_id
+        self.path = path
+        self.offsets: List[int] = []
+        self.lines: Optional[List[bytes]] = []
+        self.memory = 0
+        self.data_end = 0
+        self.metadata: Dict = {}
+        self.complete = False
+        self.created_at = time.time()
+        self.last_access = self.created_at
+
+    @property
+    def total(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def in_memory(self) -> bool:
+        return self.lines is not None
+
+    def page_etag(self, offset: int, limit: int, *variant) -> str:
+        """
+        ETag страницы: задание только дописывается, поэтому страница меняется лишь
+        вместе с числом строк, статусом или перезапуском задания (created_at — mtime файла)
+        """
+        key = json.dumps([self.job_id, self.created_at, self.total, self.complete, offset, limit, list(variant)])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def pagination(self, offset: int, limit: int) -> Dict:
+        next_offset = offset + limit
+        return {
+            'offset': offset,
+            'limit': limit,
+            'total': self.total,
+            'next_offset': next_offset if next_offset < self.total else None
+        }
+
+    def info(self) -> Dict:
+        return {
+            'job_id': self.job_id,
+            'total': self.total,
+            'complete': self.complete,
+            'in_memory': self.in_memory,
+            'created_at': self.created_at,
+            'metadata': self.metadata
+        }
+
+
+class PageCache:
+    """LRU кэш готовых ответов (bytes) по ETag с ограничением суммарного размера"""
+
+    def __init__(self, max_bytes: int = DEFAULT_PAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._items: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                return
+            self._items[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class JobWriter(NDJSONWriter):
+    """
+    Writer задания: пишет строки в NDJSON файл и передает их хранилищу
+    (совместим с ProductMatcher.process_chunks)
+    """
+
+    def __init__(self, store: 'JobStore', job: Job):
+        self.store = store
+        self.job = job
+        super().__init__(job.path)
+
+    def write(self, result: Dict):
+        line = dumps(result, self.serializer)
+        offset = self._file.tell()
+        self._file.write(line + b'\n')
+        self._file.flush()
+        self.count += 1
+        self.store._append(self.job, offset, line)
+
+    def close(self, metadata: Optional[Dict] = None):
+        try:
+            super().close(metadata)
+        finally:
+            self.store._release(self.job.job_id)
+
+    def _finish(self, metadata: Dict):
+        self.job.data_end = self._file.tell()
+        super()._finish(metadata)
+        self.store._complete(self.job, metadata)
+
+
+class JobStore:
+    """
+    Хранилище результатов заданий с ограничением памяти.
+
+    Все результаты сразу пишутся на диск (JOB_STORE_DIR/<job_id>.ndjson).
+    В памяти хранятся только сериализованные строки, и их суммарный размер
+    ограничен бюджетом: при превышении давно не запрашиваемые задания
+    (LRU) выгружаются из памяти и дальше читаются с диска по индексу смещений.
+    Задания без обращений дольше ttl удаляются полностью.
+    """
+
+    def __init__(self, directory: Optional[str] = None, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                 ttl: float = DEFAULT_JOB_TTL):
+        self.directory = directory or os.getenv('JOB_STORE_DIR', os.path.join(os.getcwd(), 'jobs'))
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.memory = 0
+        self.latest_job_id: Optional[str] = None
+        self._jobs: Dict[str, Job] = {}
+        # Задания, у которых сейчас открыт writer: второй writer перезаписал бы тот же файл
+        self._writing = set()
+        self._lock = threading.RLock()
+        self._last_purge = 0.0
+        os.makedirs(self.directory, exist_ok=True)
+
+        # После перезапуска последним считается самый свежий файл задания
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if name.endswith('.ndjson')]
+        if paths:
+            latest = max(paths, key=os.path.getmtime)
+            self.latest_job_id = os.path.basename(latest)[:-len('.ndjson')]
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, f'{check_job_id(job_id)}.ndjson')
+
+    def open_writer(self, job_id: str) -> JobWriter:
+        """
+        Начинает (или начинает заново) задание и возвращает writer для его результатов.
+        JobBusy, если у задания уже есть незакрытый writer
+        """
+        path = self._path(job_id)
+        with self._lock:
+            if job_id in self._writing:
+                raise JobBusy(f"Job '{job_id}' is already being processed")
+            self._writing.add(job_id)
+            self.purge_expired()
+            self._drop(job_id)
+            job = Job(job_id, path)
+            self._jobs[job_id] = job
+            self.latest_job_id = job_id
+        try:
+            return JobWriter(self, job)
+        except Exception:
+            self._release(job_id)
+            raise
+
+    def _release(self, job_id: str):
+        with self._lock:
+            self._writing.discard(job_id)
+
+    def save(self, job_id: str, results: List[Dict], metadata: Dict):
+        """Сохраняет уже готовый список результатов как задание"""
+        with self.open_writer(job_id) as writer:
+            for result in results:
+                writer.write(result)
+            writer.close(dict(metadata, complete=True))
+
+    def _append(self, job: Job, offset: int, line: bytes):
+        with self._lock:
+            job.offsets.append(offset)
+            job.data_end = offset + len(line) + 1
+            if job.lines is not None:
+                job.lines.append(line)
+                job.memory += len(line)
+                self.memory += len(line)
+                if self.memory > self.memory_budget:
+                    self._enforce_budget()
+
+    def _complete(self, job: Job, metadata: Dict):
+        with self._lock:
+            job.metadata = metadata
+            job.complete = bool(metadata.get('complete', True))
+
+    def _spill(self, job: Job):
+        """Выгружает задание из памяти; результаты остаются доступны с диска"""
+        if job.lines is None:
+            return
+        self.memory -= job.memory
+        job.lines = None
+        job.memory = 0
+        logger.info(f"💽 Задание {job.job_id} выгружено на диск ({job.total} строк)")
+
+    def _enforce_budget(self):
+        # Сначала выгружаем задания, к которым дольше всего не обращались
+        for job in sorted(self._jobs.values(), key=lambda item: item.last_access):
+            if self.memory <= self.memory_budget:
+                break
+            self._spill(job)
+
+    def _drop(self, job_id: str):
+        job = self._jobs.pop(job_id, None)
+        if job is not None:
+            self._spill(job)
+
+    def _restore(self, job_id: str) -> Optional[Job]:
+        """Восстанавливает индекс задания по файлу (например, после перезапуска backend)"""
+        path = self._path(job_id)
+        if not os.path.exists(path) or os.path.getmtime(path) < time.time() - self.ttl:
+            return None
+
+        job = Job(job_id, path)
+        job.lines = None
+        job.created_at = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                if line.startswith(METADATA_PREFIX):
+                    try:
+                        job.metadata = json.loads(line)['metadata']
+                        job.complete = bool(job.metadata.get('complete', True))
+                    except ValueError:
+                        pass
+                    break
+                if line.endswith(b'\n'):
+                    job.offsets.append(offset)
+                    offset += len(line)
+                    job.data_end = offset
+        self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: Optional[str] = None) -> Optional[Job]:
+        """Задание по id (по умолчанию последнее); None, если его нет или оно устарело"""
+        job_id = job_id or self.latest_job_id
+        if not job_id:
+            return None
+        with self._lock:
+            self.purge_expired()
+            job = self._jobs.get(job_id) or self._restore(job_id)
+            if job is not None:
+                job.last_access = time.time()
+            return job
+
+    def page(self, job: Job, offset: int = 0, limit: int = DEFAULT_PAGE_SIZE) -> List[Dict]:
+        """Страница результатов задания: из памяти или чтением нужного диапазона файла"""
+        with self._lock:
+            job.last_access = time.time()
+            if job.lines is not None:
+                lines = job.lines[offset:offset + limit]
+            else:
+                lines = None
+                offsets = job.offsets[offset:offset + limit + 1]
+                end = offsets[-1] if len(offsets) > limit else job.data_end
+
+        if lines is None:
+            if not offsets:
+                return []
+            with open(job.path, 'rb') as f:
+                f.seek(offsets[0])
+                lines = f.read(end - offsets[0]).splitlines()
+        return [json.loads(line) for line in lines if line]
+
+    def purge_expired(self, force: bool = False) -> int:
+        """Удаляет задания без обращений дольше ttl; возвращает их количество"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            if not force and now - self._last_purge < PURGE_INTERVAL:
+                return 0
+            self._last_purge = now
+
+            # Незавершенные задания (writer прерван, backend упал до конца записи) тоже
+            # устаревают; не трогаем только задания, которые записываются сейчас
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job_id not in self._writing and job.last_access < now - self.ttl]
+            # Файлы заданий, которые не загружались после перезапуска
+            for name in os.listdir(self.directory):
+                job_id = name[:-len('.ndjson')]
+                if (name.endswith('.ndjson') and job_id not in self._jobs and job_id not in self._writing
+                        and os.path.getmtime(os.path.join(self.directory, name)) < now - self.ttl):
+                    expired.append(job_id)
+
+            for job_id in expired:
+                self._drop(job_id)
+                if job_id == self.latest_job_id:
+                    self.latest_job_id = None
+                self._remove_files(job_id)
+                removed += 1
+        if removed:
+            logger.info(f"🧹 Удалено устаревших заданий: {removed}")
+        return removed
+
+    def _remove_files(self, job_id: str):
+        """Удаляет файл задания и его выгрузки (exports/<job_id>.*)"""
+        paths = [self._path(job_id)]
+        exports_dir = os.path.join(self.directory, 'exports')
+        if os.path.isdir(exports_dir):
+            paths.extend(os.path.join(exports_dir, name) for name in os.listdir(exports_dir)
+                         if name.startswith(job_id + '.'))
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'jobs': len(self._jobs),
+                'jobs_in_memory': sum(1 for job in self._jobs.values() if job.in_memory),
+                'memory_bytes': self.memory,
+                'memory_budget_bytes': self.memory_budget
+            }
@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Уровни отдельных модулей, например LOG_LEVELS="amazon=WARNING,allegro_enhanced=DEBUG"
+DEFAULT_MODULE_LEVELS = {'httpx': 'WARNING', 'werkzeug': 'INFO'}
+
+# Из записей в горячих циклах (extra=SAMPLED) пишется первая и каждая N-я
+DEFAULT_SAMPLE_EVERY = 50
+
+# extra для записей о каждом товаре или строке:
+# logger.info("✅ Добавлен товар: %.50s", title, extra=SAMPLED)
+SAMPLED = {'sample': True}
+
+# Атрибуты LogRecord, которые не попадают в JSON как дополнительные поля
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'sample', 'sampled_every'}
+
+
+def parse_levels(value: Optional[str]) -> Dict[str, str]:
+    """'amazon=WARNING,httpx=ERROR' -> {'amazon': 'WARNING', 'httpx': 'ERROR'}"""
+    levels = dict(DEFAULT_MODULE_LEVELS)
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, level = item.split('=', 1)
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает первую и каждую N-ю запись с extra=SAMPLED. Счетчик ведется
+    на место вызова (логгер и шаблон сообщения), поэтому шаблон должен быть
+    ленивым ('%s'), а не f-строкой. Остальные записи отбрасываются до очереди:
+    сообщение не форматируется и не пишется.
+    """
+
+    def __init__(self, every: int = DEFAULT_SAMPLE_EVERY):
+        super().__init__()
+        self.every = max(1, every)
+        self._counts: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, 'sample', False) or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.every:
+            return False
+        record.sampled_every = self.every
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Одна JSON строка на запись: время, уровень, модуль, сообщение и поля из extra"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'sampled_every', None):
+            entry['sampled_every'] = record.sampled_every
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке: сообщение (msg % args)
+    собирается фоновым потоком при записи. Очередь внутри процесса, поэтому
+    запись передается как есть, без копирования и сериализации.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging(log_format: Optional[str] = None, level: Optional[str] = None,
+                  module_levels: Optional[Dict[str, str]] = None,
+                  sample_every: Optional[int] = None, log_file: Optional[str] = None):
+    """
+    Настраивает логирование всего backend: корневой логгер пишет в очередь,
+    фоновый поток форматирует записи и пишет их в stderr или LOG_FILE.
+    Заменяет обработчики, установленные logging.basicConfig в модулях.
+
+    Не заданные параметры берутся из окружения: LOG_FORMAT (text или json),
+    LOG_LEVEL, LOG_LEVELS, LOG_SAMPLE_EVERY, LOG_FILE.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_format = log_format or os.getenv('LOG_FORMAT', 'text')
+    level = level or os.getenv('LOG_LEVEL', 'INFO')
+    if sample_every is None:
+        sample_every = int(os.getenv('LOG_SAMPLE_EVERY', DEFAULT_SAMPLE_EVERY))
+    log_file = log_file or os.getenv('LOG_FILE')
+    target = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+    target.setFormatter(JSONFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    handler = LazyQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(sample_every))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    levels = module_levels if module_levels is not None else parse_levels(os.getenv('LOG_LEVELS'))
+    for name, module_level in levels.items():
+        logging.getLogger(name).setLevel(module_level)
+
+    # Форматы не используют место вызова, поток и процесс: не собираем их
+    # для каждой записи (см. раздел Optimization в Logging HOWTO)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    _listener = logging.handlers.QueueListener(handler.queue, target, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает записи из очереди (при завершении процесса)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(stop_logging)
@@ -0,0 +1,215 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from flask import g, request
+
+# Границы корзин гистограмм (секунды): от разбора HTML до запуска браузера и ожидания networkidle
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_METRIC = 'product_search_stage_seconds'
+STAGE_ERRORS_METRIC = 'product_search_stage_errors_total'
+REQUEST_METRIC = 'product_search_http_request_seconds'
+
+DESCRIPTIONS = {
+    STAGE_METRIC: 'Duration of search pipeline stages',
+    STAGE_ERRORS_METRIC: 'Stages that ended with an exception',
+    REQUEST_METRIC: 'Duration of HTTP requests by endpoint',
+    'product_search_circuit_rejected_total': 'Platform searches skipped because the circuit is open',
+    'product_search_circuit_opened_total': 'Times a platform circuit was opened',
+    'product_search_retries_total': 'Platform request retries',
+    'product_search_retries_denied_total': 'Retries skipped: attempts, retry budget or deadline exhausted',
+}
+
+# Этапы текущего HTTP запроса для заголовка Server-Timing
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = \
+    contextvars.ContextVar('request_timings', default=None)
+
+# Сколько разных этапов показывать в Server-Timing
+MAX_SERVER_TIMING_ENTRIES = 30
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Гистограмма в формате Prometheus: накопительные корзины, сумма и количество"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Гистограммы и счетчики по имени метрики и меткам"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {histogram.count}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# HELP {name} {DESCRIPTIONS.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Labels, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+registry = Registry()
+
+
+def record(stage: str, seconds: float):
+    """Добавляет длительность этапа в гистограмму и в тайминги текущего запроса"""
+    registry.observe(STAGE_METRIC, seconds, stage=stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Замер этапа: with span('amazon.fetch'): ...
+    Работает и внутри async функций (время — по часам, включая ожидание)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        registry.inc(STAGE_ERRORS_METRIC, stage=stage)
+        raise
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+def timed(stage: str):
+    """Декоратор span для обычных и async функций"""
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def bind_context(func: Callable) -> Callable:
+    """
+    Функция для ThreadPoolExecutor, выполняемая в копии текущего контекста:
+    этапы из рабочих потоков попадают в Server-Timing запроса
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Значение заголовка Server-Timing: сумма по каждому этапу и общее время"""
+    totals: Dict[str, float] = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+    entries = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:MAX_SERVER_TIMING_ENTRIES]
+    entries.append(('total', total))
+    return ', '.join(f'{stage};dur={seconds * 1000:.1f}' for stage, seconds in entries)
+
+
+def init_metrics(app):
+    """
+    Подключает к приложению замер запросов: длительность каждого запроса
+    попадает в гистограмму по эндпоинту, а этапы (span) — в заголовок Server-Timing
+    """
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_token = _request_timings.set([])
+
+    @app.after_request
+    def finish_request_timer(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        registry.observe(REQUEST_METRIC, elapsed, endpoint=endpoint, method=request.method,
+                         status=str(response.status_code))
+        response.headers['Server-Timing'] = server_timing(_request_timings.get() or [], elapsed)
+        return response
+
+    @app.teardown_request
+    def reset_request_timer(exc=None):
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _request_timings.reset(token)
+
+    return app
+
+
+def render_metrics() -> str:
+    return registry.render()
@@ -0,0 +1,254 @@
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import httpx
+import requests
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_URL = 'https://api.openai.com/v1'
+
+# Одновременные запросы к OpenAI по эндпоинтам backend, например
+# OPENAI_LIMITS="description=8,image-generation=2"
+DEFAULT_LIMITS = {
+    'description': 8,
+    'description-batch': 4,
+    'image-prompt': 8,
+    'image-analysis': 4,
+    'image-generation': 2,
+}
+DEFAULT_LIMIT = int(os.getenv('OPENAI_DEFAULT_LIMIT', 4))
+
+# Сколько запросов может ждать свободного слота и как долго.
+# Остальные сразу получают 503: поток Flask не занимается ожиданием
+MAX_QUEUE = int(os.getenv('OPENAI_MAX_QUEUE', 8))
+QUEUE_TIMEOUT = float(os.getenv('OPENAI_QUEUE_TIMEOUT', 10))
+
+# Сколько последних замеров хранить для процентилей
+SAMPLE_SIZE = 500
+
+
+def parse_limits(value: Optional[str]) -> Dict[str, int]:
+    """'description=8,image-generation=2' -> {'description': 8, 'image-generation': 2}"""
+    limits = dict(DEFAULT_LIMITS)
+    for item in (value or '').split(','):
+        if '=' in item:
+            name, limit = item.split('=', 1)
+            limits[name.strip()] = max(1, int(limit))
+    return limits
+
+
+class EndpointBusy(Exception):
+    """Очередь эндпоинта заполнена или слот не освободился за QUEUE_TIMEOUT"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Too many concurrent OpenAI requests for {endpoint}")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+def _percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+
+class EndpointStats:
+    """Счетчики эндпоинта: ожидают слота, выполняются, время в очереди и время запроса"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.queued = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.queue_times = deque(maxlen=SAMPLE_SIZE)
+        self.call_times = deque(maxlen=SAMPLE_SIZE)
+
+    def snapshot(self) -> Dict:
+        return {
+            'limit': self.limit,
+            'queued': self.queued,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'queue_ms_p50': _percentile(self.queue_times, 0.5),
+            'queue_ms_p95': _percentile(self.queue_times, 0.95),
+            'call_ms_p50': _percentile(self.call_times, 0.5),
+            'call_ms_p95': _percentile(self.call_times, 0.95),
+        }
+
+
+class OpenAIClient:
+    """
+    Общий асинхронный HTTP клиент OpenAI в фоновом event loop.
+
+    Запросы всех эндпоинтов идут через один httpx.AsyncClient (общий пул
+    соединений), одновременных запросов на эндпоинт не больше лимита. Поток
+    Flask ждет только результат своего запроса; если эндпоинт перегружен,
+    запрос сразу отклоняется с EndpointBusy вместо того, чтобы занимать поток.
+
+    Ошибки переводятся в исключения requests (HTTPError с response, Timeout,
+    ConnectionError), поэтому обработчики в app.py работают без изменений.
+    """
+
+    def __init__(self, base_url: str = OPENAI_API_URL, limits: Optional[Dict[str, int]] = None,
+                 max_queue: int = MAX_QUEUE, queue_timeout: float = QUEUE_TIMEOUT):
+        self.base_url = base_url
+        self.limits = limits or parse_limits(os.getenv('OPENAI_LIMITS'))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._stats: Dict[str, EndpointStats] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._pid = None
+
+    def _endpoint_stats(self, endpoint: str) -> EndpointStats:
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = self._stats[endpoint] = EndpointStats(self.limits.get(endpoint, DEFAULT_LIMIT))
+        return stats
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        # Цикл запускается при первом запросе: после fork (gunicorn) в каждом процессе свой
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._semaphores = {}
+                self._loop = asyncio.new_event_loop()
+                ready = threading.Event()
+                threading.Thread(target=self._run_loop, args=(self._loop, ready),
+                                 name='openai-client', daemon=True).start()
+                ready.wait()
+            return self._loop
+
+    def _run_loop(self, loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        total = sum(self.limits.values())
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=total, max_keepalive_connections=total)
+        )
+        ready.set()
+        logger.info(f"🔌 OpenAI клиент запущен, лимиты: {self.limits}")
+        loop.run_forever()
+
+    async def _request(self, endpoint: str, path: str, api_key: str, payload: Dict,
+                       timeout: float, submitted_at: float, wait: bool) -> httpx.Response:
+        stats = self._endpoint_stats(endpoint)
+        semaphore = self._semaphores.get(endpoint)
+        if semaphore is None:
+            semaphore = self._semaphores[endpoint] = asyncio.Semaphore(stats.limit)
+
+        try:
+            if wait:
+                await semaphore.acquire()
+            else:
+                await asyncio.wait_for(semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                stats.queued -= 1
+                stats.rejected += 1
+            raise EndpointBusy(endpoint, self.queue_timeout)
+
+        started = time.perf_counter()
+        with self._lock:
+            stats.queued -= 1
+            stats.in_flight += 1
+            stats.queue_times.append(started - submitted_at)
+        try:
+            response = await self._client.post(
+                path,
+                headers={
+                    'Authorization': f'Bearer {api_key}',
+                    'Content-Type': 'application/json'
+                },
+                json=payload,
+                timeout=timeout
+            )
+        except Exception:
+            with self._lock:
+                stats.failed += 1
+            raise
+        finally:
+            semaphore.release()
+            with self._lock:
+                stats.in_flight -= 1
+                stats.call_times.append(time.perf_counter() - started)
+
+        with self._lock:
+            if response.status_code >= 400:
+                stats.failed += 1
+            else:
+                stats.completed += 1
+        return response
+
+    def post(self, endpoint: str, path: str, api_key: str, payload: Dict, timeout: float = 30,
+             wait: bool = False) -> httpx.Response:
+        """
+        POST к OpenAI от имени эндпоинта backend (для лимитов и метрик).
+        wait=True ждет слота без ограничения очереди — для фоновых пакетных задач,
+        которые не занимают потоки обработки запросов.
+        """
+        loop = self._ensure_started()
+        with self._lock:
+            stats = self._endpoint_stats(endpoint)
+            if not wait and stats.queued - max(0, stats.limit - stats.in_flight) >= self.max_queue:
+                stats.rejected += 1
+                raise EndpointBusy(endpoint, 1.0)
+            stats.queued += 1
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._request(endpoint, path, api_key, payload, timeout, time.perf_counter(), wait), loop
+        )
+        try:
+            response = future.result()
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        if response.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                f"{response.status_code} Error for url: {response.url}", response=response
+            )
+        return response
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {endpoint: stats.snapshot() for endpoint, stats in self._stats.items()}
+
+    def close(self):
+        with self._lock:
+            loop, client = self._loop, self._client
+            self._loop = self._client = None
+        if loop is None or self._pid != os.getpid():
+            return
+        if client is not None:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+_client: Optional[OpenAIClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAIClient:
+    """Общий для процесса клиент OpenAI"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAIClient()
+            atexit.register(_client.close)
+        return _client
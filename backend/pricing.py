@@ -0,0 +1,192 @@
+import json
+import logging
+import numbers
+import os
+import re
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ParsedPrice(NamedTuple):
+    amount: Decimal
+    currency: Optional[str]
+
+
+# Обозначения валют, которые встречаются в ценах площадок
+CURRENCY_ALIASES = {
+    '€': 'EUR', 'eur': 'EUR', 'euro': 'EUR',
+    'zł': 'PLN', 'zl': 'PLN', 'pln': 'PLN',
+    '$': 'USD', 'us$': 'USD', 'usd': 'USD',
+    '£': 'GBP', 'gbp': 'GBP',
+    '₽': 'RUB', 'руб': 'RUB', 'rub': 'RUB',
+    '₴': 'UAH', 'грн': 'UAH', 'uah': 'UAH',
+}
+
+# Валюта по умолчанию для площадки, если в строке цены она не указана
+PLATFORM_CURRENCIES = {
+    'amazon': 'EUR',
+    'allegro': 'PLN',
+    'aliexpress': 'USD',
+}
+
+_CURRENCY_PATTERN = '|'.join(
+    re.escape(alias) for alias in sorted(CURRENCY_ALIASES, key=len, reverse=True)
+)
+# Число с разделителями тысяч (пробел, неразрывный пробел, точка, запятая, апостроф)
+_NUMBER_PATTERN = r"\d{1,3}(?:[\s.,']\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?"
+
+_PRICE_RE = re.compile(
+    rf'(?P<prefix>{_CURRENCY_PATTERN})?\s*(?P<number>{_NUMBER_PATTERN})\s*(?P<suffix>{_CURRENCY_PATTERN})?',
+    re.IGNORECASE,
+)
+_GROUP_SEPARATORS_RE = re.compile(r"[\s']")
+
+
+def _normalize_number(number: str) -> Optional[Decimal]:
+    """
+    Переводит число в Decimal с учетом обоих соглашений:
+    '1.299,00' (de/pl) и '1,299.00' (en). Одиночный разделитель
+    с тремя цифрами после него считается разделителем тысяч.
+    """
+    number = _GROUP_SEPARATORS_RE.sub('', number)
+    separator = max(number.rfind(','), number.rfind('.'))
+
+    if separator != -1:
+        mark = number[separator]
+        other = '.' if mark == ',' else ','
+        decimals = len(number) - separator - 1
+        is_decimal = other in number or (number.count(mark) == 1 and decimals != 3)
+        if is_decimal:
+            number = number[:separator].replace(other, '').replace(mark, '') + '.' + number[separator + 1:]
+        else:
+            number = number.replace(mark, '')
+
+    try:
+        return Decimal(number)
+    except InvalidOperation:
+        return None
+
+
+def parse_price(text, default_currency: Optional[str] = None) -> Optional[ParsedPrice]:
+    """
+    Разбирает цену (строку или число) в (amount, currency).
+
+    Для диапазонов ('$5.99 - $25.99') возвращается нижняя граница.
+    Если валюта не указана в строке, используется default_currency.
+    Значения другого типа (списки, словари из ответа площадки) и NaN/Infinity
+    дают None: такие цены нельзя сравнивать.
+    """
+    if isinstance(text, bool) or not isinstance(text, (str, numbers.Real, Decimal)):
+        return None
+    if not isinstance(text, str):
+        amount = Decimal(str(text))
+        return ParsedPrice(amount, default_currency) if amount.is_finite() else None
+    return _parse_price_text(text, default_currency)
+
+
+@lru_cache(maxsize=4096)
+def _parse_price_text(text: str, default_currency: Optional[str]) -> Optional[ParsedPrice]:
+    """Разбор строки цены; кэшируется, потому что одни и те же цены разбираются много раз"""
+    match = _PRICE_RE.search(text)
+    if not match:
+        return None
+
+    amount = _normalize_number(match.group('number'))
+    if amount is None:
+        return None
+
+    symbol = match.group('prefix') or match.group('suffix')
+    currency = CURRENCY_ALIASES.get(symbol.lower()) if symbol else default_currency
+    return ParsedPrice(amount, currency)
+
+
+def platform_currency(source: Optional[str]) -> Optional[str]:
+    """Валюта по умолчанию по полю source товара ('Amazon', 'AliExpress (Demo)' ...)"""
+    source = (source or '').lower()
+    for platform, currency in PLATFORM_CURRENCIES.items():
+        if source.startswith(platform):
+            return currency
+    return None
+
+
+def product_price(product: Dict) -> Optional[ParsedPrice]:
+    """Структурированная цена товара"""
+    return parse_price(product.get('price'), platform_currency(product.get('source')))
+
+
+def base_currency() -> str:
+    return os.getenv('BASE_CURRENCY', 'EUR').upper()
+
+
+@lru_cache(maxsize=1)
+def load_rates() -> Dict[str, Decimal]:
+    """
+    Загружает локальную таблицу курсов: сколько единиц валюты за 1 BASE_CURRENCY.
+
+    Источник — переменная CURRENCY_RATES (JSON, например {"PLN": 4.3, "USD": 1.08})
+    или файл CURRENCY_RATES_FILE. Без таблицы конвертация отключена.
+    """
+    raw = os.getenv('CURRENCY_RATES')
+    rates_file = os.getenv('CURRENCY_RATES_FILE')
+
+    try:
+        if not raw and rates_file and os.path.exists(rates_file):
+            with open(rates_file, 'r', encoding='utf-8') as f:
+                raw = f.read()
+        data = json.loads(raw) if raw else {}
+        rates = {code.upper(): Decimal(str(value)) for code, value in data.items() if value}
+    except (ValueError, InvalidOperation) as e:
+        logger.error(f"❌ Ошибка чтения таблицы курсов валют: {e}")
+        rates = {}
+
+    rates[base_currency()] = Decimal(1)
+    return rates
+
+
+def convert(amount: Decimal, from_currency: Optional[str], to_currency: Optional[str]) -> Optional[Decimal]:
+    """Конвертирует сумму по локальной таблице курсов; None если курс неизвестен"""
+    if from_currency == to_currency:
+        return amount
+    if not from_currency or not to_currency:
+        return None
+
+    rates = load_rates()
+    if from_currency not in rates or to_currency not in rates:
+        return None
+    return amount / rates[from_currency] * rates[to_currency]
+
+
+def comparable_amount(product: Dict, currency: Optional[str] = None) -> Optional[Decimal]:
+    """Цена товара в валюте currency (по умолчанию BASE_CURRENCY)"""
+    parsed = product_price(product)
+    if parsed is None:
+        return None
+    if parsed.currency is None:
+        return parsed.amount
+    return convert(parsed.amount, parsed.currency, currency or base_currency())
+
+
+def annotate_prices(products: List[Dict]) -> List[Dict]:
+    """
+    Добавляет товарам числовые поля price_amount и price_currency
+    для сортировки и фильтрации без повторного разбора строк
+    """
+    for product in products:
+        parsed = product_price(product)
+        product['price_amount'] = float(parsed.amount) if parsed else None
+        product['price_currency'] = parsed.currency if parsed else None
+    return products
+
+
+def cheapest_offer(offers: Iterable[Dict], currency: Optional[str] = None) -> Optional[Dict]:
+    """Самое дешевое предложение среди товаров, цены которых можно сравнить"""
+    best = None
+    best_amount = None
+    for offer in offers:
+        amount = comparable_amount(offer, currency)
+        if amount is not None and (best_amount is None or amount < best_amount):
+            best, best_amount = offer, amount
+    return best
@@ -2,32 +2,64 @@
 
 import pandas as pd
 import logging
-import re
-import json
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from rapidfuzz import fuzz
 import time
-import os
 from datetime import datetime
 
 # Импортируем наши модули поиска
 from amazon import search_amazon
 from aliexpress import search_aliexpress
 from allegro_enhanced import search_allegro_enhanced_sync as search_allegro_improved
+from checkpoint import DEFAULT_MAX_AGE, DEFAULT_REUSE_MAX_AGE, CheckpointStore, file_digest, is_complete, row_hash
+from catalog_schema import (ADDITIONAL_FIELDS, CHARACTERISTIC_FIELDS, EMPTY_VALUES, MAX_QUERY_PARTS,
+                            PRIORITY_FIELDS, SPACES_RE, SPECIAL_CHARS_RE, CatalogSchema)
+from dedup import collapse_near_duplicates
+from excel_export import DEFAULT_TOP_N, export_results
+from file_reader import iter_chunks
+from logging_config import SAMPLED
+from metrics import span
+from pricing import annotate_prices, cheapest_offer
+from result_writer import ResultWriter, open_writer
+from search_options import PLATFORM_COLUMNS, PLATFORMS, narrow_platforms, parse_platforms
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Поиск на площадках в порядке обработки строки
+PLATFORM_SEARCHES = {
+    'amazon': ('Amazon', lambda query: search_amazon(query, max_pages=1)),
+    'aliexpress': ('AliExpress', lambda query: search_aliexpress(query, limit=10)),
+    'allegro': ('Allegro', lambda query: search_allegro_improved(query, max_pages=1)),
+}
+
 class ProductMatcher:
     """
     Класс для поиска товаров по характеристикам из файла
     """
     
-    def __init__(self):
+    def __init__(self, platforms=None, checkpoint: Optional[CheckpointStore] = None, job_id: Optional[str] = None,
+                 max_age: float = DEFAULT_MAX_AGE, reuse_max_age: float = DEFAULT_REUSE_MAX_AGE,
+                 refresh: bool = False):
         self.results = []
         self.processed_count = 0
         self.total_count = 0
+        # Площадки, разрешенные для всего задания
+        self.platforms = parse_platforms(platforms)
+        # Контрольные точки: завершенные строки сохраняются сразу, задание можно продолжить
+        self.checkpoint = checkpoint
+        self.job_id = job_id
+        self.max_age = max_age
+        self.resumed_count = 0
+        # Индекс строк: неизмененные строки каталога берутся из прошлых загрузок
+        self.reuse_max_age = reuse_max_age
+        self.reused_count = 0
+        # refresh=True: все строки ищутся заново (свежие цены), готовые ответы не берутся
+        # ни из контрольных точек, ни из индекса строк; новые результаты сохраняются как обычно
+        self.refresh = refresh
+        self.platform_calls = {platform: 0 for platform in PLATFORMS}
+        self.skipped_calls = {platform: 0 for platform in PLATFORMS}
         
     def read_file(self, file_path: str) -> pd.DataFrame:
         """
@@ -49,49 +81,26 @@ class ProductMatcher:
             raise
     
     def build_search_query(self, row: pd.Series) -> str:
-
-
+        """
+        Формирует поисковый запрос по одной строке.
+        Для целого файла используйте CatalogSchema.build_queries.
+        """
         query_parts = []
         
-        # Основные поля для поиска (в порядке приоритета)
-        priority_fields = [
-            'brand', 'бренд', 'марка',
-            'product_name', 'название', 'name', 'product',
-            'model', 'модель',
-            'category', 'категория',
-            'type', 'тип'
-        ]
-        
-        # Дополнительные характеристики
-        additional_fields = [
-            'color', 'цвет', 'colour',
-            'size', 'размер',
-            'material', 'материал',
-            'keywords', 'ключевые_слова', 'tags'
-        ]
-        
-        # Собираем основные части запроса
-        for field in priority_fields:
-            if field in row.index and pd.notna(row[field]) and str(row[field]).strip():
-                value = str(row[field]).strip()
-                if value.lower() not in ['nan', 'null', '']:
-                    query_parts.append(value)
-                    
-        # Добавляем дополнительные характеристики
-        for field in additional_fields:
-            if field in row.index and pd.notna(row[field]) and str(row[field]).strip():
+        # Собираем основные части запроса, затем дополнительные характеристики
+        for field in PRIORITY_FIELDS + ADDITIONAL_FIELDS:
+            if field in row and pd.notna(row[field]) and str(row[field]).strip():
                 value = str(row[field]).strip()
-                if value.lower() not in ['nan', 'null', '']:
+                if value.lower() not in EMPTY_VALUES:
                     query_parts.append(value)
         
         # Формируем финальный запрос
-        query = ' '.join(query_parts[:5])  # Ограничиваем длину запроса
+        query = ' '.join(query_parts[:MAX_QUERY_PARTS])  # Ограничиваем длину запроса
         
         # Очищаем запрос от лишних символов
-        query = re.sub(r'[^\w\s\-]', ' ', query)
-        query = re.sub(r'\s+', ' ', query).strip()
+        query = SPACES_RE.sub(' ', SPECIAL_CHARS_RE.sub(' ', query)).strip()
         
-        logger.info(f"Сформирован запрос: '{query}'")
+        logger.info("Сформирован запрос: '%s'", query, extra=SAMPLED)
         return query
     
     def extract_characteristics(self, row: pd.Series) -> Dict:
@@ -100,22 +109,11 @@ class ProductMatcher:
         """
         characteristics = {}
         
-        # Извлекаем ключевые характеристики
-        char_mapping = {
-            'brand': ['brand', 'бренд', 'марка'],
-            'color': ['color', 'цвет', 'colour'],
-            'size': ['size', 'размер'],
-            'material': ['material', 'материал'],
-            'category': ['category', 'категория'],
-            'type': ['type', 'тип'],
-            'model': ['model', 'модель']
-        }
-        
-        for char_key, possible_fields in char_mapping.items():
+        for char_key, possible_fields in CHARACTERISTIC_FIELDS.items():
             for field in possible_fields:
-                if field in row.index and pd.notna(row[field]):
+                if field in row and pd.notna(row[field]):
                     value = str(row[field]).strip()
-                    if value.lower() not in ['nan', 'null', '']:
+                    if value.lower() not in EMPTY_VALUES:
                         characteristics[char_key] = value.lower()
                         break
         
@@ -172,18 +170,47 @@ class ProductMatcher:
         
         # Сортируем по релевантности
         scored_products.sort(key=lambda x: x['relevance_score'], reverse=True)
+
+        # Схлопываем дубликаты, чтобы они не занимали места в топ-10
+        scored_products = collapse_near_duplicates(annotate_prices(scored_products))
         
-        logger.info(f"Отфильтровано {len(scored_products)} из {len(products)} товаров")
+        logger.info("Отфильтровано %d из %d товаров", len(scored_products), len(products), extra=SAMPLED)
         return scored_products[:10]  # Возвращаем топ-10
     
+    def resolve_row_platforms(self, value, row_index: int) -> Tuple[str, ...]:
+        """
+        Определяет площадки для строки: значение колонки platforms сужает список площадок задания
+        """
+        if value is not None and pd.notna(value) and str(value).strip():
+            try:
+                return narrow_platforms(self.platforms, str(value))
+            except ValueError as e:
+                logger.warning(f"Строка {row_index + 1}: {e}, используем площадки задания")
+
+        return self.platforms
+
     def search_single_product(self, row: pd.Series, row_index: int) -> Dict:
         """
         Ищет товар по одной строке из файла
         """
-        logger.info(f"Обработка строки {row_index + 1}")
+        platform_value = next((row[field] for field in PLATFORM_COLUMNS if field in row), None)
+        return self.search_prepared(
+            row_index,
+            self.build_search_query(row),
+            self.extract_characteristics(row),
+            self.resolve_row_platforms(platform_value, row_index)
+        )
+
+    def search_prepared(self, row_index: int, query: str, characteristics: Dict,
+                        platforms: Optional[Tuple[str, ...]] = None) -> Dict:
+        """
+        Ищет товар по уже сформированному запросу и характеристикам строки
+        """
+        if platforms is None:
+            platforms = self.platforms
+
+        logger.info("Обработка строки %d: '%s'", row_index + 1, query, extra=SAMPLED)
         
-        # Формируем запрос
-        query = self.build_search_query(row)
         if not query:
             logger.warning(f"Не удалось сформировать запрос для строки {row_index + 1}")
             return {
@@ -195,203 +222,235 @@ class ProductMatcher:
                 'allegro': []
             }
         
-        # Извлекаем характеристики
-        characteristics = self.extract_characteristics(row)
-        
         result = {
             'row_index': row_index + 1,
             'query': query,
             'characteristics': characteristics,
+            'platforms': list(platforms),
             'amazon': [],
             'aliexpress': [],
             'allegro': []
         }
         
-        # Поиск на Amazon
-        try:
-            logger.info(f"Поиск на Amazon: {query}")
-            amazon_products = search_amazon(query, max_pages=1)
-            filtered_amazon = self.filter_relevant_products(amazon_products, query, characteristics)
-            result['amazon'] = filtered_amazon
-            logger.info(f"Amazon: найдено {len(filtered_amazon)} релевантных товаров")
-        except Exception as e:
-            logger.error(f"Ошибка поиска на Amazon: {e}")
-            result['amazon_error'] = str(e)
-        
-        # Поиск на AliExpress
-        try:
-            logger.info(f"Поиск на AliExpress: {query}")
-            aliexpress_products = search_aliexpress(query, limit=10)
-            filtered_aliexpress = self.filter_relevant_products(aliexpress_products, query, characteristics)
-            result['aliexpress'] = filtered_aliexpress
-            logger.info(f"AliExpress: найдено {len(filtered_aliexpress)} релевантных товаров")
-        except Exception as e:
-            logger.error(f"Ошибка поиска на AliExpress: {e}")
-            result['aliexpress_error'] = str(e)
-        
-        # Поиск на Allegro с улучшенными методами
-        try:
-            logger.info(f"Поиск на Allegro: {query}")
-            allegro_products = search_allegro_improved(query, max_pages=1)
-            filtered_allegro = self.filter_relevant_products(allegro_products, query, characteristics)
-            result['allegro'] = filtered_allegro
-            logger.info(f"Allegro: найдено {len(filtered_allegro)} релевантных товаров")
-        except Exception as e:
-            logger.error(f"Ошибка поиска на Allegro: {e}")
-            result['allegro_error'] = str(e)
+        for platform, (platform_name, search) in PLATFORM_SEARCHES.items():
+            # Не запускаем браузер и платные API для исключенных площадок
+            if platform not in platforms:
+                self.skipped_calls[platform] += 1
+                continue
+
+            self.platform_calls[platform] += 1
+            try:
+                logger.info("Поиск на %s: %s", platform_name, query, extra=SAMPLED)
+                with span(f'matcher.{platform}'):
+                    products = search(query)
+                with span('matcher.filter'):
+                    filtered = self.filter_relevant_products(products, query, characteristics)
+                result[platform] = filtered
+                logger.info("%s: найдено %d релевантных товаров", platform_name, len(filtered), extra=SAMPLED)
+            except Exception as e:
+                logger.error("Ошибка поиска на %s: %s", platform_name, e)
+                result[f'{platform}_error'] = str(e)
+
+        # Самое дешевое предложение среди всех площадок
+        result['cheapest_offer'] = self._cheapest_offer(result)
         
         # Добавляем задержку между запросами
-        time.sleep(2)
+        if platforms:
+            with span('matcher.row_delay'):
+                time.sleep(2)
         
         return result
 
-    def process_file_in_memory(self, file_path: str) -> List[Dict]:
+    def _cheapest_offer(self, result: Dict) -> Optional[Dict]:
         """
-        Обрабатывает весь файл и возвращает результаты в памяти без сохранения в файл
+        Выбирает самое дешевое предложение строки по числовой цене
         """
-        # Читаем файл
-        df = self.read_file(file_path)
-        self.total_count = len(df)
-        self.processed_count = 0
-        self.results = []
+        offers = []
+        for platform in ['amazon', 'aliexpress', 'allegro']:
+            for product in result.get(platform, []):
+                offers.append((platform, product))
 
-        logger.info(f"🔍 Начинаем обработку {self.total_count} товаров в памяти")
+        best = cheapest_offer(product for _, product in offers)
+        if best is None:
+            return None
 
-        # Обрабатываем каждую строку
-        for index, row in df.iterrows():
-            try:
-                result = self.search_single_product(row, index)
-                self.results.append(result)
-                self.processed_count += 1
+        platform = next(platform for platform, product in offers if product is best)
+        return {
+            'platform': platform,
+            'name': best.get('name', ''),
+            'price': best.get('price', ''),
+            'price_amount': best.get('price_amount'),
+            'price_currency': best.get('price_currency'),
+            'url': best.get('url', '')
+        }
 
-                logger.info(f"Обработано {self.processed_count}/{self.total_count} товаров")
+    def prepare_chunks(self, chunks: Iterable[pd.DataFrame]) -> Iterator[Tuple[int, str, Dict, Optional[str]]]:
+        """
+        Строит запросы и характеристики для каждого чанка векторно.
+        Схема колонок определяется один раз по первому чанку.
+        """
+        schema = None
+        for chunk in chunks:
+            if schema is None:
+                schema = CatalogSchema(list(chunk.columns))
 
-            except Exception as e:
-                logger.error(f"Ошибка обработки строки {index + 1}: {e}")
-                error_result = {
-                    'row_index': index + 1,
-                    'error': str(e),
-                    'amazon': [],
-                    'aliexpress': [],
-                    'allegro': []
-                }
-                self.results.append(error_result)
-                self.processed_count += 1
+            queries = schema.build_queries(chunk)
+            characteristics = schema.build_characteristics(chunk)
+            platform_values = schema.platform_values(chunk)
 
-        logger.info(f"Обработка завершена. Обработано {self.processed_count} товаров")
-        return self.results
+            yield from zip(chunk.index, queries, characteristics, platform_values)
 
-    def process_file(self, file_path: str, output_file: str = None) -> List[Dict]:
+    def process_prepared(self, items: Iterable[Tuple[int, str, Dict, Optional[str]]],
+                         writer: Optional[ResultWriter] = None, keep_results: bool = True) -> List[Dict]:
         """
-        Обрабатывает весь файл и возвращает результаты с принудительным обновлением
+        Обрабатывает подготовленные строки по мере их поступления.
+        С writer каждый результат сразу записывается в файл; при keep_results=False
+        результаты не накапливаются в self.results, и память не растет с размером файла.
         """
-        # Очищаем старые результаты для получения свежих данных
-        if output_file and os.path.exists(output_file):
-            os.remove(output_file)
-            logger.info(f"🗑️ Удален старый файл результатов: {output_file}")
-
-        # Читаем файл
-        df = self.read_file(file_path)
-        self.total_count = len(df)
+        self.total_count = 0
         self.processed_count = 0
+        self.resumed_count = 0
+        self.reused_count = 0
         self.results = []
-
-        logger.info(f"🔍 Начинаем обработку {self.total_count} товаров с получением свежих данных")
-
-        # Обрабатываем каждую строку
-        for index, row in df.iterrows():
+        self._reset_platform_counters()
+
+        use_checkpoint = self.checkpoint is not None
+        if use_checkpoint:
+            # Раз в задание удаляем устаревшие строки, иначе таблицы контрольных точек растут без предела
+            self.checkpoint.purge(self.max_age, self.reuse_max_age)
+        if use_checkpoint and self.job_id is not None:
+            logger.info(f"💾 Задание {self.job_id}: уже завершено строк {self.checkpoint.completed_rows(self.job_id)}")
+
+        for index, query, characteristics, platform_value in items:
+            # При потоковом чтении общее число строк заранее неизвестно
+            self.total_count += 1
             try:
-                result = self.search_single_product(row, index)
-                self.results.append(result)
-                self.processed_count += 1
-
-                logger.info(f"Обработано {self.processed_count}/{self.total_count} товаров")
+                platforms = self.resolve_row_platforms(platform_value, index)
+                key = row_hash(query, characteristics, platforms) if use_checkpoint else None
+
+                result = None
+                if use_checkpoint and not self.refresh and self.job_id is not None:
+                    # Строка уже была обработана до перезапуска или в прошлой загрузке файла
+                    with span('matcher.checkpoint'):
+                        result = self.checkpoint.get(self.job_id, key, self.max_age)
+                    if result is not None:
+                        self.resumed_count += 1
+                if result is None and use_checkpoint and not self.refresh:
+                    # Строка с тем же содержимым уже встречалась в прошлых загрузках каталога
+                    with span('matcher.checkpoint'):
+                        result = self.checkpoint.lookup(key, self.reuse_max_age)
+                    if result is not None:
+                        self.reused_count += 1
+
+                if result is not None:
+                    result['row_index'] = index + 1
+                else:
+                    result = self.search_prepared(index, query, characteristics, platforms)
+                    if use_checkpoint and is_complete(result):
+                        with span('matcher.checkpoint'):
+                            self.checkpoint.put(self.job_id, key, index + 1, result)
 
             except Exception as e:
-                logger.error(f"Ошибка обработки строки {index + 1}: {e}")
-                error_result = {
+                logger.error("Ошибка обработки строки %d: %s", index + 1, e)
+                result = {
                     'row_index': index + 1,
                     'error': str(e),
                     'amazon': [],
                     'aliexpress': [],
                     'allegro': []
                 }
-                self.results.append(error_result)
-                self.processed_count += 1
 
-        # Сохраняем результаты
-        if output_file:
-            self.save_results(output_file)
+            if keep_results:
+                self.results.append(result)
+            if writer is not None:
+                with span('matcher.write'):
+                    writer.write(result)
+            self.processed_count += 1
+
+            logger.info("Обработано %d товаров", self.processed_count, extra=SAMPLED)
+
+        if writer is not None:
+            writer.close(self.build_metadata())
 
-        logger.info(f"Обработка завершена. Обработано {self.processed_count} товаров")
         return self.results
 
-    def save_results(self, output_file: str):
+    def process_chunks(self, chunks: Iterable[pd.DataFrame], writer: Optional[ResultWriter] = None,
+                       keep_results: bool = True) -> List[Dict]:
         """
-        Сохраняет результаты в файл
+        Обрабатывает файл, прочитанный чанками (см. file_reader.open_chunks)
         """
-        try:
-            # Создаем директорию если не существует
-            os.makedirs(os.path.dirname(output_file) if os.path.dirname(output_file) else '.', exist_ok=True)
-
-            # Добавляем метаданные
-            output_data = {
-                'metadata': {
-                    'processed_at': datetime.now().isoformat(),
-                    'total_products': self.total_count,
-                    'processed_products': self.processed_count,
-                    'success_rate': f"{(self.processed_count / self.total_count * 100):.1f}%" if self.total_count > 0 else "0%"
-                },
-                'results': self.results
-            }
+        logger.info("🔍 Начинаем потоковую обработку товаров")
+        self.process_prepared(self.prepare_chunks(chunks), writer, keep_results)
+        logger.info(f"Обработка завершена. Обработано {self.processed_count} товаров, "
+                    f"из контрольных точек: {self.resumed_count}, из прошлых загрузок: {self.reused_count}")
+        return self.results
 
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(output_data, f, ensure_ascii=False, indent=2)
+    def process_file_in_memory(self, file_path: str) -> List[Dict]:
+        """
+        Обрабатывает весь файл и возвращает результаты в памяти без сохранения в файл.
+        Файл читается потоково, чанками по DEFAULT_CHUNK_SIZE строк.
+        """
+        logger.info(f"🔍 Начинаем обработку файла {file_path} в памяти")
+        return self.process_chunks(iter_chunks(file_path))
 
-            logger.info(f"Результаты сохранены в {output_file}")
+    def process_file(self, file_path: str, output_file: str = None, keep_results: bool = True) -> List[Dict]:
+        """
+        Обрабатывает весь файл и возвращает результаты.
+        С хранилищем контрольных точек заново ищутся только новые и измененные
+        строки (свежее reuse_max_age), остальные берутся из индекса строк.
+
+        Результаты пишутся в output_file по мере обработки (.ndjson/.jsonl или .json),
+        так что частичные результаты доступны во время длинных запусков.
+        """
+        if self.checkpoint is not None and self.job_id is None:
+            self.job_id = file_digest(file_path, ','.join(self.platforms))
+
+        logger.info(f"🔍 Начинаем обработку файла {file_path} с получением свежих данных")
+        if not output_file:
+            return self.process_chunks(iter_chunks(file_path), keep_results=keep_results)
+
+        with open_writer(output_file) as writer:
+            return self.process_chunks(iter_chunks(file_path), writer, keep_results)
+
+    def build_metadata(self) -> Dict:
+        """
+        Метаданные задания для файла результатов
+        """
+        return {
+            'processed_at': datetime.now().isoformat(),
+            'total_products': self.total_count,
+            'processed_products': self.processed_count,
+            'success_rate': f"{(self.processed_count / self.total_count * 100):.1f}%" if self.total_count > 0 else "0%",
+            'platform_calls': dict(self.platform_calls),
+            'skipped_calls': dict(self.skipped_calls),
+            'job_id': self.job_id,
+            'resumed_rows': self.resumed_count,
+            'reused_rows': self.reused_count,
+            'complete': True
+        }
+
+    def save_results(self, output_file: str):
+        """
+        Сохраняет уже накопленные результаты в файл (построчно, см. result_writer)
+        """
+        try:
+            with open_writer(output_file) as writer:
+                for result in self.results:
+                    writer.write(result)
+                writer.close(self.build_metadata())
 
         except Exception as e:
             logger.error(f"Ошибка сохранения результатов: {e}")
 
-    def export_to_excel(self, output_file: str):
+    def export_to_excel(self, output_file: str, results: Optional[Iterable[Dict]] = None,
+                        top_n: int = DEFAULT_TOP_N):
         """
-        Экспортирует результаты в Excel файл
+        Экспортирует результаты в Excel файл (потоково, top_n предложений каждой площадки).
+        results — любой итератор результатов, например iter_results(results_file)
+        для задания, обработанного с keep_results=False; по умолчанию self.results.
         """
         try:
-            # Подготавливаем данные для Excel
-            excel_data = []
-
-            for result in self.results:
-                row_data = {
-                    'Строка': result.get('row_index', ''),
-                    'Запрос': result.get('query', ''),
-                    'Характеристики': json.dumps(result.get('characteristics', {}), ensure_ascii=False),
-                    'Ошибка': result.get('error', '')
-                }
-
-                # Добавляем результаты по каждой площадке
-                for platform in ['amazon', 'aliexpress', 'allegro']:
-                    products = result.get(platform, [])
-                    if products:
-                        # Берем лучший результат
-                        best_product = products[0]
-                        row_data[f'{platform.title()}_Название'] = best_product.get('name', '')
-                        row_data[f'{platform.title()}_Цена'] = best_product.get('price', '')
-                        row_data[f'{platform.title()}_URL'] = best_product.get('url', '')
-                        row_data[f'{platform.title()}_Релевантность'] = f"{best_product.get('relevance_score', 0):.2f}"
-                    else:
-                        row_data[f'{platform.title()}_Название'] = ''
-                        row_data[f'{platform.title()}_Цена'] = ''
-                        row_data[f'{platform.title()}_URL'] = ''
-                        row_data[f'{platform.title()}_Релевантность'] = ''
-
-                excel_data.append(row_data)
-
-            # Создаем DataFrame и сохраняем в Excel
-            df = pd.DataFrame(excel_data)
-            df.to_excel(output_file, index=False, engine='openpyxl')
-
-            logger.info(f"Результаты экспортированы в Excel: {output_file}")
+            export_results(self.results if results is None else results, output_file, top_n)
 
         except Exception as e:
             logger.error(f"Ошибка экспорта в Excel: {e}")
@@ -406,6 +465,26 @@ class ProductMatcher:
             'percentage': (self.processed_count / self.total_count * 100) if self.total_count > 0 else 0
         }
 
+    def _reset_platform_counters(self):
+        self.platform_calls = {platform: 0 for platform in PLATFORMS}
+        self.skipped_calls = {platform: 0 for platform in PLATFORMS}
+
+    def get_summary(self) -> Dict:
+        """
+        Возвращает сводку задания, включая сэкономленные запросы к площадкам
+        """
+        return {
+            'total': self.total_count,
+            'processed': self.processed_count,
+            'platforms': list(self.platforms),
+            'platform_calls': dict(self.platform_calls),
+            'skipped_calls': dict(self.skipped_calls),
+            'skipped_calls_total': sum(self.skipped_calls.values()),
+            'job_id': self.job_id,
+            'resumed_rows': self.resumed_count,
+            'reused_rows': self.reused_count
+        }
+
 
 def create_sample_csv(filename: str = "sample_products.csv"):
     """
@@ -443,8 +522,8 @@ def create_sample_csv(filename: str = "sample_products.csv"):
 
 
 if __name__ == "__main__":
-    # Пример использования
-    matcher = ProductMatcher()
+    # Пример использования: неизмененные строки при повторном запуске берутся из индекса
+    matcher = ProductMatcher(checkpoint=CheckpointStore())
 
     # Создаем пример файла
     create_sample_csv()
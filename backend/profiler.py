@@ -0,0 +1,280 @@
+import asyncio
+import contextvars
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from flask import g, request
+
+DEFAULT_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', 10)) / 1000
+MIN_INTERVAL = 0.001
+MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 60))
+
+# Запросы дольше порога сохраняют свой профиль (0 — выключено)
+SLOW_REQUEST_SECONDS = float(os.getenv('PROFILE_SLOW_MS', 0)) / 1000
+KEEP_SLOW_PROFILES = int(os.getenv('PROFILE_KEEP', 20))
+
+# Профиль текущего HTTP запроса; копируется в потоки поиска через metrics.bind_context
+_current_profile: contextvars.ContextVar[Optional['Profile']] = contextvars.ContextVar('profile', default=None)
+
+
+class ProfilerBusy(Exception):
+    """Профилирование по запросу уже идет"""
+
+
+def check_token(token: Optional[str]) -> bool:
+    """Доступ к профилированию только с PROFILER_TOKEN (заголовок X-Profiler-Token); без него выключено"""
+    expected = os.getenv('PROFILER_TOKEN', '')
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def _frame_name(code) -> str:
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return name.replace(';', ':')
+
+
+def _frame_stack(frame) -> List[str]:
+    """Имена функций стека от внешней к внутренней"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _event_loop(frame) -> Optional[asyncio.AbstractEventLoop]:
+    """Event loop, если поток сейчас ждет событий в _run_once (select)"""
+    child = None
+    while frame is not None:
+        if frame.f_code.co_name == '_run_once':
+            if child is None or child.f_code.co_name != 'select':
+                return None
+            loop = frame.f_locals.get('self')
+            return loop if isinstance(loop, asyncio.AbstractEventLoop) else None
+        child, frame = frame, frame.f_back
+    return None
+
+
+def _task_stacks(loop: asyncio.AbstractEventLoop) -> List[List[str]]:
+    """Цепочки await для задач loop: где стоит каждая корутина (goto, wait_for_load_state и т.д.)"""
+    try:
+        tasks = asyncio.all_tasks(loop)
+    except RuntimeError:
+        return []
+    stacks = []
+    for task in tasks:
+        chain = [f"task:{task.get_name()}"]
+        coro = task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+            if frame is None:
+                break
+            chain.append(_frame_name(frame.f_code))
+            coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+        stacks.append(chain)
+    return stacks
+
+
+class Profile:
+    """Счетчики стеков (collapsed stacks) за время профилирования"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, label: str, interval: float):
+        self.id = next(self._ids)
+        self.label = label
+        self.interval = interval
+        self.started = time.time()
+        self.duration: Optional[float] = None
+        self.samples = 0
+        self.counts: Counter = Counter()
+        # Потоки, стеки которых собираются (None — все потоки процесса)
+        self.threads: Optional[set] = None
+
+    def collapsed(self) -> str:
+        """Формат flamegraph.pl / speedscope / inferno: 'a;b;c <число выборок>'"""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def info(self) -> Dict:
+        return {
+            'id': self.id,
+            'label': self.label,
+            'started': self.started,
+            'duration_ms': round(self.duration * 1000, 1) if self.duration is not None else None,
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+        }
+
+
+class Profiler:
+    """
+    Сэмплирующий профилировщик по настенному времени (sys._current_frames).
+
+    Фоновый поток работает только пока есть активные профили: профилирование
+    всех потоков по запросу (profile) или профили отдельных HTTP запросов при
+    включенном PROFILE_SLOW_MS. Для потоков, ждущих в event loop (Allegro,
+    Playwright), добавляются цепочки await каждой задачи.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, slow_threshold: float = SLOW_REQUEST_SECONDS,
+                 keep: int = KEEP_SLOW_PROFILES):
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self.slow_profiles: deque = deque(maxlen=keep)
+        self._global: Optional[Profile] = None
+        self._requests: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = self._global is not None or bool(self._requests)
+                interval = self._global.interval if self._global is not None else self.interval
+            if not active:
+                self._wakeup.wait(1.0)
+                self._wakeup.clear()
+                continue
+            self._sample()
+            time.sleep(interval)
+
+    def _sample(self):
+        frames = sys._current_frames()
+        me = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        with self._lock:
+            profiles = ([self._global] if self._global is not None else []) + list(self._requests.values())
+            targets = [(profile, None if profile.threads is None else set(profile.threads)) for profile in profiles]
+
+        stacks: Dict[int, List[str]] = {}
+
+        def thread_stacks(ident: int) -> List[str]:
+            if ident not in stacks:
+                frame = frames.get(ident)
+                if frame is None:
+                    stacks[ident] = []
+                    return stacks[ident]
+                prefix = f"thread:{names.get(ident, ident)}".replace(';', ':')
+                stack = [prefix] + _frame_stack(frame)
+                loop = _event_loop(frame)
+                tasks = _task_stacks(loop) if loop is not None else []
+                if tasks:
+                    # Поток простаивает в select: показываем, чего ждет каждая задача
+                    base = stack[:next(i for i, name in enumerate(stack) if name.startswith('_run_once')) + 1]
+                    stacks[ident] = [';'.join(base + task) for task in tasks]
+                else:
+                    stacks[ident] = [';'.join(stack)]
+            return stacks[ident]
+
+        samples = []
+        for profile, threads in targets:
+            idents = [ident for ident in frames if ident != me] if threads is None else threads
+            samples.append((profile, [stack for ident in idents for stack in thread_stacks(ident)]))
+
+        with self._lock:
+            for profile, profile_stacks in samples:
+                # Профиль мог завершиться, пока собирались стеки
+                if profile is not self._global and profile.id not in self._requests:
+                    continue
+                profile.counts.update(profile_stacks)
+                profile.samples += 1
+
+    def profile(self, seconds: float, interval: Optional[float] = None) -> Profile:
+        """Профиль всех потоков процесса за seconds секунд (блокирует вызывающий поток)"""
+        if not self._profile_lock.acquire(blocking=False):
+            raise ProfilerBusy('A profile is already running')
+        try:
+            profile = Profile('process', max(MIN_INTERVAL, interval or self.interval))
+            with self._lock:
+                self._global = profile
+            self._ensure_thread()
+            started = time.perf_counter()
+            try:
+                time.sleep(min(seconds, MAX_SECONDS))
+            finally:
+                # Иначе после ошибки поток сэмплирования продолжил бы писать в этот профиль
+                with self._lock:
+                    self._global = None
+            profile.duration = time.perf_counter() - started
+            return profile
+        finally:
+            self._profile_lock.release()
+
+    def start_request(self, label: str) -> Optional[Profile]:
+        """Начинает профиль текущего запроса (если включен PROFILE_SLOW_MS)"""
+        if self.slow_threshold <= 0:
+            return None
+        profile = Profile(label, self.interval)
+        profile.threads = {threading.get_ident()}
+        with self._lock:
+            self._requests[profile.id] = profile
+        _current_profile.set(profile)
+        self._ensure_thread()
+        return profile
+
+    def finish_request(self, profile: Profile, duration: float):
+        """Сохраняет профиль, если запрос оказался медленным"""
+        with self._lock:
+            self._requests.pop(profile.id, None)
+        profile.duration = duration
+        if duration >= self.slow_threshold and profile.samples:
+            self.slow_profiles.append(profile)
+
+    @contextmanager
+    def track_thread(self):
+        """Добавляет текущий поток (например, поток поиска) к профилю запроса"""
+        profile = _current_profile.get()
+        if profile is None:
+            yield
+            return
+        ident = threading.get_ident()
+        with self._lock:
+            profile.threads.add(ident)
+        try:
+            yield
+        finally:
+            with self._lock:
+                profile.threads.discard(ident)
+
+    def get_slow_profile(self, profile_id: int) -> Optional[Profile]:
+        for profile in self.slow_profiles:
+            if profile.id == profile_id:
+                return profile
+        return None
+
+
+def init_profiler(app, profiler: Profiler):
+    """Подключает профили медленных запросов (PROFILE_SLOW_MS) к приложению"""
+
+    @app.before_request
+    def start_request_profile():
+        # Запросы самого профилировщика не профилируем
+        if request.path.startswith('/api/debug/'):
+            return
+        g.profile = profiler.start_request(f"{request.method} {request.path}")
+        g.profile_started = time.perf_counter()
+
+    @app.teardown_request
+    def finish_request_profile(exc=None):
+        profile = g.pop('profile', None)
+        _current_profile.set(None)
+        if profile is not None:
+            profiler.finish_request(profile, time.perf_counter() - g.pop('profile_started'))
+
+    return app
@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Быстрый сериализатор (необязательная зависимость): pip install orjson
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Сериализатор по умолчанию: 'orjson' (если установлен) или 'json'
+DEFAULT_SERIALIZER = os.getenv('RESULTS_SERIALIZER', 'orjson' if orjson is not None else 'json')
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+JSON_ARRAY_HEADER = b'{"results": [\n'
+
+
+def _default(value):
+    """Значения, которые стандартный JSON не сериализует (numpy, Decimal, даты)"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def dumps(obj, serializer: Optional[str] = None) -> bytes:
+    """Сериализует объект в одну строку JSON (UTF-8, без отступов)"""
+    serializer = serializer or DEFAULT_SERIALIZER
+    if serializer == 'orjson':
+        if orjson is None:
+            raise ValueError("Сериализатор orjson не установлен. Установите: pip install orjson")
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(obj, ensure_ascii=False, default=_default).encode('utf-8')
+
+
+class ResultWriter(ABC):
+    """
+    Потоковая запись результатов: каждая строка пишется на диск сразу после
+    обработки, поэтому в памяти ничего не накапливается, а частичные
+    результаты можно прочитать (read_results) до завершения задания.
+    """
+
+    def __init__(self, path: str, serializer: Optional[str] = None):
+        self.path = path
+        self.serializer = serializer or DEFAULT_SERIALIZER
+        self.count = 0
+        self.closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'wb')
+        self._start()
+
+    def _start(self):
+        pass
+
+    @abstractmethod
+    def write(self, result: Dict):
+        """Записывает результат одной строки"""
+
+    @abstractmethod
+    def _finish(self, metadata: Dict):
+        """Дописывает метаданные в конец файла"""
+
+    def close(self, metadata: Optional[Dict] = None):
+        """Дописывает метаданные и закрывает файл"""
+        if self.closed:
+            return
+        self._finish(metadata or {})
+        self._file.close()
+        self.closed = True
+        logger.info(f"Результаты сохранены в {self.path}: {self.count} строк")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.closed:
+            metadata = {'complete': exc_type is None}
+            if exc is not None:
+                metadata['error'] = str(exc)
+            self.close(metadata)
+        return False
+
+
+class NDJSONWriter(ResultWriter):
+    """
+    NDJSON: одна строка результата на линию, последняя линия —
+    запись {"metadata": {...}}
+    """
+
+    def write(self, result: Dict):
+        self._file.write(dumps(result, self.serializer) + b'\n')
+        self._file.flush()
+        self.count += 1
+
+    def _finish(self, metadata: Dict):
+        self._file.write(dumps({'metadata': metadata}, self.serializer) + b'\n')
+
+
+class JSONArrayWriter(ResultWriter):
+    """
+    Обычный JSON {"results": [...], "metadata": {...}}, который пишется
+    постепенно: каждый элемент массива на своей линии. Незавершенный файл
+    не является валидным JSON, но читается построчно (read_results).
+    """
+
+    def _start(self):
+        self._file.write(JSON_ARRAY_HEADER)
+        self._file.flush()
+
+    def write(self, result: Dict):
+        if self.count:
+            self._file.write(b',\n')
+        self._file.write(dumps(result, self.serializer))
+        self._file.flush()
+        self.count += 1
+
+    def _finish(self, metadata: Dict):
+        self._file.write(b'\n], "metadata": ' + dumps(metadata, self.serializer) + b'}\n')
+
+
+def open_writer(path: str, serializer: Optional[str] = None) -> ResultWriter:
+    """Создает writer по расширению файла: .ndjson/.jsonl или .json"""
+    if path.lower().endswith(NDJSON_EXTENSIONS):
+        return NDJSONWriter(path, serializer)
+    return JSONArrayWriter(path, serializer)
+
+
+def _iter_lines(path: str) -> Iterator[bytes]:
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield line
+
+
+def _iter_records(path: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    Записи файла результатов в виде ('result', {...}) или ('metadata', {...}).
+    Файл читается построчно; недописанная последняя строка пропускается.
+    """
+    if path.lower().endswith(NDJSON_EXTENSIONS):
+        for line in _iter_lines(path):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and set(record) == {'metadata'}:
+                yield 'metadata', record['metadata']
+            else:
+                yield 'result', record
+        return
+
+    lines = _iter_lines(path)
+    first = next(lines, None)
+    if first is None:
+        return
+    if first != JSON_ARRAY_HEADER.strip():
+        # Файл старого формата (json.dump с отступами) читаем целиком
+        with open(path, 'rb') as f:
+            data = json.load(f)
+        for result in data.get('results', []):
+            yield 'result', result
+        if 'metadata' in data:
+            yield 'metadata', data['metadata']
+        return
+
+    for line in lines:
+        if line.startswith(b']'):
+            # Последняя строка: ], "metadata": {...}}
+            try:
+                yield 'metadata', json.loads(b'{' + line[line.index(b',') + 1:])['metadata']
+            except ValueError:
+                pass
+            return
+        try:
+            yield 'result', json.loads(line.rstrip(b','))
+        except ValueError:
+            continue
+
+
+def iter_results(path: str) -> Iterator[Dict]:
+    """Результаты из файла по одному, без загрузки всего файла в память"""
+    for kind, record in _iter_records(path):
+        if kind == 'result':
+            yield record
+
+
+def read_results(path: str) -> Dict:
+    """
+    Читает файл результатов, в том числе записываемый прямо сейчас.
+
+    Возвращает {'metadata': {...}, 'results': [...], 'complete': bool};
+    у незавершенного файла metadata пустая, а последняя недописанная
+    строка пропускается. Файл, закрытый после ошибки, содержит metadata
+    с complete=False и тоже считается незавершенным.
+    """
+    results = []
+    metadata = None
+    for kind, record in _iter_records(path):
+        if kind == 'metadata':
+            metadata = record
+        else:
+            results.append(record)
+
+    return {
+        'metadata': metadata or {},
+        'results': results,
+        'complete': bool((metadata or {}).get('complete', False))
+    }
@@ -0,0 +1,178 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional
+
+import requests
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Ответы, после которых повтор может помочь: перегрузка, лимиты, таймауты шлюза.
+# 403 и другие 4xx — блокировка или ошибка запроса, повтор их не исправит
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Повторов за окно не больше доли от числа поисков (плюс небольшой запас):
+# во время сбоя повторы не умножают нагрузку на площадку
+BUDGET_RATIO = float(os.getenv('RETRY_BUDGET_RATIO', 0.2))
+BUDGET_MIN_RETRIES = int(os.getenv('RETRY_BUDGET_MIN', 3))
+BUDGET_WINDOW = float(os.getenv('RETRY_BUDGET_WINDOW', 60))
+
+RETRIES_METRIC = 'product_search_retries_total'
+RETRIES_DENIED_METRIC = 'product_search_retries_denied_total'
+
+# Крайний срок текущего запроса (time.monotonic); копируется в потоки поиска через metrics.bind_context
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('deadline', default=None)
+
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code in RETRYABLE_STATUSES
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Сетевые ошибки и таймауты повторяем, ошибки в данных запроса — нет"""
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Retry-After в секундах (формат даты не поддерживается площадками, которые мы опрашиваем)"""
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return None
+
+
+@contextmanager
+def deadline(seconds: float):
+    """
+    Крайний срок для всех поисков внутри блока: with deadline(60): ...
+    Вложенный срок не может быть позже внешнего
+    """
+    expires = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(expires if outer is None else min(outer, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+class RetryBudget:
+    """Скользящее окно поисков и повторов площадки"""
+
+    def __init__(self, ratio: float = BUDGET_RATIO, min_retries: int = BUDGET_MIN_RETRIES,
+                 window: float = BUDGET_WINDOW):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: deque = deque()
+        self._retries: deque = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float):
+        for events in (self._requests, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_request(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_spend(self) -> bool:
+        """Забирает один повтор из бюджета, если он еще есть"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                return False
+            self._retries.append(now)
+            return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            return {'requests': len(self._requests), 'retries': len(self._retries)}
+
+
+class RetryPolicy:
+    """
+    Политика повторов площадки: экспоненциальная пауза с декоррелированным
+    джиттером (каждая пауза случайна между base_delay и тройной предыдущей,
+    но не больше max_delay), общий для процесса бюджет повторов и крайний срок.
+
+    Повтор не выполняется, если попытки закончились, бюджет исчерпан или
+    после паузы до крайнего срока не останется min_attempt_seconds на попытку.
+    Крайний срок берется из deadline() запроса, иначе — default_deadline.
+    """
+
+    def __init__(self, name: str, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 20.0,
+                 min_attempt_seconds: float = 5.0, default_deadline: float = 60.0,
+                 budget: Optional[RetryBudget] = None):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_attempt_seconds = min_attempt_seconds
+        self.default_deadline = default_deadline
+        self.budget = budget or RetryBudget()
+
+    def start(self, max_attempts: Optional[int] = None) -> 'RetryState':
+        """Новый поиск: учитывается в бюджете, получает крайний срок"""
+        self.budget.record_request()
+        expires = _deadline.get()
+        if expires is None:
+            expires = time.monotonic() + self.default_deadline
+        return RetryState(self, max_attempts or self.max_attempts, expires)
+
+
+class RetryState:
+    """Попытки одного поиска по RetryPolicy"""
+
+    def __init__(self, policy: RetryPolicy, max_attempts: int, expires: float):
+        self.policy = policy
+        self.max_attempts = max_attempts
+        self.expires = expires
+        self.attempt = 1
+        self._delay = policy.base_delay
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, default: float) -> float:
+        """Таймаут попытки: не дольше, чем осталось до крайнего срока"""
+        return max(1.0, min(default, self.remaining()))
+
+    def next_delay(self, reason: str, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Пауза перед следующей попыткой или None, если повторять нельзя.
+        retry_after (заголовок Retry-After) задает минимальную паузу
+        """
+        policy = self.policy
+        if self.attempt >= self.max_attempts:
+            return self._deny('attempts', reason)
+
+        self._delay = min(policy.max_delay, random.uniform(policy.base_delay, self._delay * 3))
+        delay = max(self._delay, retry_after or 0.0)
+        if delay + policy.min_attempt_seconds > self.remaining():
+            return self._deny('deadline', reason)
+        if not policy.budget.try_spend():
+            return self._deny('budget', reason)
+
+        self.attempt += 1
+        registry.inc(RETRIES_METRIC, platform=policy.name)
+        return delay
+
+    def _deny(self, cause: str, reason: str) -> None:
+        if self.attempt < self.max_attempts:
+            registry.inc(RETRIES_DENIED_METRIC, platform=self.policy.name, cause=cause)
+            logger.warning(f"⏹️ {self.policy.name}: повтор после '{reason}' отменен ({cause}), "
+                           f"до крайнего срока {self.remaining():.1f} сек")
+        return None
@@ -0,0 +1,197 @@
+import logging
+import math
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+from pricing import base_currency, comparable_amount
+
+logger = logging.getLogger(__name__)
+
+PLATFORMS = ('allegro', 'amazon', 'aliexpress')
+SORT_KEYS = ('relevance', 'price', 'price_desc')
+
+# Колонки файла, в которых строка может ограничить список площадок
+PLATFORM_COLUMNS = ['platforms', 'платформы', 'площадки']
+
+
+def parse_platforms(value) -> Tuple[str, ...]:
+    """
+    Разбирает список площадок: ['amazon', 'allegro'] или 'amazon,allegro'.
+    Пустое значение означает все площадки.
+    """
+    if value is None or value == '' or value == []:
+        return PLATFORMS
+
+    if isinstance(value, str):
+        items = value.replace(';', ',').split(',')
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        raise ValueError('platforms must be a list or a comma-separated string')
+
+    platforms = []
+    for item in items:
+        name = str(item).strip().lower()
+        if not name:
+            continue
+        if name not in PLATFORMS:
+            raise ValueError(f"Unknown platform '{name}'. Allowed: {', '.join(PLATFORMS)}")
+        if name not in platforms:
+            platforms.append(name)
+
+    return tuple(platforms) or PLATFORMS
+
+
+def narrow_platforms(job_platforms: Tuple[str, ...], value) -> Tuple[str, ...]:
+    """
+    Сужает площадки задания значением из строки файла (пересечение списков).
+    Строка не может добавить площадку, исключенную для всего задания.
+    """
+    row_platforms = parse_platforms(value)
+    return tuple(platform for platform in job_platforms if platform in row_platforms)
+
+
+def _parse_decimal(data: Dict, key: str) -> Optional[Decimal]:
+    value = data.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        value = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f'{key} must be a number')
+    # NaN и Infinity не сравниваются с ценами (InvalidOperation при сравнении с NaN),
+    # а числа вне диапазона float стали бы Infinity в JSON ответа (to_dict)
+    if not value.is_finite() or not math.isfinite(float(value)):
+        raise ValueError(f'{key} must be a finite number')
+    return value
+
+
+def _parse_positive_int(data: Dict, key: str) -> Optional[int]:
+    value = data.get(key)
+    if value is None or value == '':
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be an integer')
+    if value <= 0:
+        raise ValueError(f'{key} must be positive')
+    return value
+
+
+class SearchOptions:
+    """
+    Параметры фильтрации и сортировки для /api/search
+    """
+
+    def __init__(self, platforms: Tuple[str, ...] = PLATFORMS, min_price: Optional[Decimal] = None,
+                 max_price: Optional[Decimal] = None, currency: Optional[str] = None,
+                 min_relevance: Optional[float] = None, sort: str = 'relevance',
+                 limit: Optional[int] = None):
+        self.platforms = platforms
+        self.min_price = min_price
+        self.max_price = max_price
+        self.currency = currency or base_currency()
+        self.min_relevance = min_relevance
+        self.sort = sort
+        self.limit = limit
+
+    @classmethod
+    def from_request(cls, data: Dict) -> 'SearchOptions':
+        """Создает параметры из тела запроса; ValueError при некорректных значениях"""
+        min_relevance = data.get('min_relevance')
+        if min_relevance is not None and min_relevance != '':
+            try:
+                min_relevance = float(min_relevance)
+            except (TypeError, ValueError):
+                raise ValueError('min_relevance must be a number')
+            if not math.isfinite(min_relevance):
+                raise ValueError('min_relevance must be a finite number')
+        else:
+            min_relevance = None
+
+        sort = str(data.get('sort') or 'relevance').lower()
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort '{sort}'. Allowed: {', '.join(SORT_KEYS)}")
+
+        min_price = _parse_decimal(data, 'min_price')
+        max_price = _parse_decimal(data, 'max_price')
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise ValueError('min_price must not exceed max_price')
+
+        currency = data.get('currency')
+        if currency is not None and not isinstance(currency, str):
+            raise ValueError('currency must be a string')
+
+        return cls(
+            platforms=parse_platforms(data.get('platforms')),
+            min_price=min_price,
+            max_price=max_price,
+            currency=(currency or '').strip().upper() or None,
+            min_relevance=min_relevance,
+            sort=sort,
+            limit=_parse_positive_int(data, 'limit'),
+        )
+
+    @property
+    def has_price_filter(self) -> bool:
+        return self.min_price is not None or self.max_price is not None
+
+    def to_dict(self) -> Dict:
+        return {
+            'platforms': list(self.platforms),
+            'min_price': float(self.min_price) if self.min_price is not None else None,
+            'max_price': float(self.max_price) if self.max_price is not None else None,
+            'currency': self.currency,
+            'min_relevance': self.min_relevance,
+            'sort': self.sort,
+            'limit': self.limit
+        }
+
+
+def _relevance(item: Dict) -> float:
+    try:
+        return float(item.get('relevance_score') or 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def apply_search_options(results: List[Dict], options: SearchOptions) -> List[Dict]:
+    """
+    Фильтрует и сортирует результаты одной площадки до сериализации.
+
+    Фильтр по цене сравнивает цены в валюте options.currency; товары,
+    цену которых нельзя сравнить, при активном фильтре отбрасываются.
+    Порог релевантности применяется к relevance_score площадки как есть.
+    """
+    amounts = {}
+    if options.has_price_filter or options.sort != 'relevance':
+        amounts = {id(item): comparable_amount(item, options.currency) for item in results}
+
+    filtered = []
+    for item in results:
+        if options.min_relevance is not None and _relevance(item) < options.min_relevance:
+            continue
+        if options.has_price_filter:
+            amount = amounts[id(item)]
+            if amount is None:
+                continue
+            if options.min_price is not None and amount < options.min_price:
+                continue
+            if options.max_price is not None and amount > options.max_price:
+                continue
+        filtered.append(item)
+
+    if options.sort == 'relevance':
+        filtered.sort(key=_relevance, reverse=True)
+    else:
+        # Товары без сравнимой цены всегда в конце списка
+        priced = [item for item in filtered if amounts[id(item)] is not None]
+        unpriced = [item for item in filtered if amounts[id(item)] is None]
+        priced.sort(key=lambda item: amounts[id(item)], reverse=options.sort == 'price_desc')
+        filtered = priced + unpriced
+
+    if options.limit is not None:
+        filtered = filtered[:options.limit]
+
+    return filtered